@@ -1,8 +1,7 @@
 export const maxDuration = 30;
 import { NextResponse } from 'next/server';
 import { trackApiCall } from '@/lib/api-stats';
-import fs from 'fs';
-import path from 'path';
+import { loadUSPriceSource } from '@/lib/price-store';
 
 const FMP_API_KEY = process.env.FMP_API_KEY;
 const FMP_BASE_URL = 'https://financialmodelingprep.com';
@@ -23,19 +22,15 @@ export async function GET() {
 
     const sp500Data = await sp500Response.json();
 
-    // Load EOD prices from price_cache.json (updated daily by scripts/update_slope_cache.py)
+    // Load EOD prices from price_store.bin (updated daily by scripts/update_slope_cache.py)
     type PriceEntry = { close: number; changesPercentage: number };
     const priceMap: Record<string, PriceEntry> = {};
     try {
-      const cachePath = path.join(process.cwd(), 'data', 'price_cache.json');
-      const cacheData = JSON.parse(fs.readFileSync(cachePath, 'utf-8')) as {
-        prices: Record<string, Array<{ date: string; close: number }>>;
-      };
-      for (const [sym, records] of Object.entries(cacheData.prices)) {
-        if (records && records.length >= 2) {
-          const sorted = [...records].sort((a, b) => b.date.localeCompare(a.date));
-          const latest = sorted[0];
-          const prev = sorted[1];
+      const priceSource = loadUSPriceSource();
+      for (const sym of priceSource?.symbols ?? []) {
+        const recent = priceSource!.latest(sym, 2);
+        if (recent.length >= 2) {
+          const [latest, prev] = recent;
           priceMap[sym] = {
             close: latest.close,
             changesPercentage:
@@ -46,7 +41,7 @@ export async function GET() {
         }
       }
     } catch {
-      // price_cache not available — prices remain 0
+      // price store not available — prices remain 0
     }
 
     const stocks = (Array.isArray(sp500Data) ? sp500Data : []).map((stock: any) => ({
@@ -2,6 +2,7 @@ import { NextRequest, NextResponse } from 'next/server';
 import supplyChainDB from '@/data/supply-chain';
 
 // Build TW suppliers map: US symbol -> TW codes
+// (fallback for when scripts/supply_chain_join.py's indexed copy is missing)
 const TW_SUPPLY_MAP: Record<string, string[]> = {};
 for (const [usSymbol, suppliers] of Object.entries(supplyChainDB)) {
   const twList = (suppliers as Array<{market:string;ticker?:string;name:string}>)
@@ -11,20 +12,10 @@ for (const [usSymbol, suppliers] of Object.entries(supplyChainDB)) {
 }
 import fs from 'fs';
 import path from 'path';
+import { loadBenchmarks, loadSlopeMatrix, loadSupplyChainJoin, loadUSPriceSource, toPrice } from '@/lib/price-store';
 
 export const maxDuration = 30;
 
-interface PriceRecord {
-  date: string;
-  close: number;
-}
-
-interface PriceCacheData {
-  updated_at: string;
-  symbols: string[];
-  prices: Record<string, PriceRecord[]>;
-}
-
 interface SlopeCacheData {
   updated_at: string;
   bench_slope: number;
@@ -38,6 +29,27 @@ interface SlopeCacheData {
   }>;
 }
 
+// data/slope_scans.json, written by scripts/slope_scan.py
+interface SlopeScansData {
+  updated_at: string;
+  data_updated_at: string;
+  benchmark: string;
+  scans: Record<string, SlopeCacheData>;
+}
+
+let residentScans: { key: string; scans: SlopeScansData } | null = null;
+
+/** Precomputed scans, kept resident; null when the file is missing. */
+function loadSlopeScans(dataDir: string): SlopeScansData | null {
+  const scansPath = path.join(dataDir, 'slope_scans.json');
+  if (!fs.existsSync(scansPath)) return null;
+  const key = `${scansPath}:${fs.statSync(scansPath).mtimeMs}`;
+  if (residentScans?.key !== key) {
+    residentScans = { key, scans: JSON.parse(fs.readFileSync(scansPath, 'utf-8')) };
+  }
+  return residentScans.scans;
+}
+
 interface ShortInterestData {
   updated_at: string;
   data: Record<string, { shortPct: number; shortRatio: number }>;
@@ -56,31 +68,37 @@ interface SlopeResult {
   tw_suppliers?: string[]; // Taiwan supply chain tickers
 }
 
-function findClosestPrice(prices: PriceRecord[], targetDate: string): number | null {
-  if (!prices || prices.length === 0) return null;
-
-  // Find all records on or before targetDate, sorted most-recent-first
-  const candidates = prices
-    .filter(p => p.date <= targetDate)
-    .sort((a, b) => b.date.localeCompare(a.date));
-
-  if (candidates.length === 0) return null;
-
-  const best = candidates[0];
-  const diffDays =
-    (new Date(targetDate).getTime() - new Date(best.date).getTime()) / 86400000;
-
-  // Normal case: within 10 days (covers weekends and holidays)
-  if (diffDays <= 10) return best.close;
-
-  // Stale cache: target date is beyond all available data — use latest available.
-  // This avoids a hard error when the cache hasn't been refreshed yet;
-  // the slope will use the most recent real trading day in cache.
-  const maxDate = prices.reduce((a, b) => (a.date > b.date ? a : b)).date;
-  if (targetDate > maxDate) return best.close;
+// One (date1, date2) scan over a symbol list; closes are NaN/null where missing
+interface ScanInput {
+  updatedAt: string;
+  symbols: string[];
+  p1(i: number): number | null;
+  p2(i: number): number | null;
+  latest(i: number): number;
+}
 
-  // Large gap within cache range (genuine missing data) — do not interpolate
-  return null;
+// Stored slope/post_return with the current short interest applied
+function toSlopeResult(
+  r: { symbol: string; slope: number; post_return: number },
+  benchSlope: number,
+  shortInterest: ShortInterestData,
+  twSupplyMap: Record<string, string[]>
+): SlopeResult {
+  const si = shortInterest.data[r.symbol];
+  const shortPct = si?.shortPct ?? 0;
+  const shortRatio = si?.shortRatio ?? 0;
+  return {
+    symbol: r.symbol,
+    slope: Math.round(r.slope * 100) / 100,
+    post_return: Math.round(r.post_return * 100) / 100,
+    group: assignGroup(r.slope, benchSlope),
+    short_pct: shortPct,
+    short_ratio: shortRatio,
+    sector: '',
+    industry: '',
+    triple_filter: r.slope > 50 && shortPct >= 5 && shortPct <= 15,
+    tw_suppliers: twSupplyMap[r.symbol] || [],
+  };
 }
 
 function assignGroup(slope: number, benchSlope: number): string {
@@ -110,26 +128,75 @@ export async function POST(request: NextRequest) {
       shortInterest = JSON.parse(fs.readFileSync(siPath, 'utf-8'));
     }
 
-    // Mode 1: Dynamic calculation with price_cache.json
-    const priceCachePath = path.join(dataDir, 'price_cache.json');
-    if (fs.existsSync(priceCachePath) && date1 && date2) {
-      const priceCache: PriceCacheData = JSON.parse(
-        fs.readFileSync(priceCachePath, 'utf-8')
-      );
-
-      // Calculate benchmark slope
-      const benchPrices = priceCache.prices[benchmark];
-      if (!benchPrices) {
+    // US symbol -> TW supplier codes, indexed by the supply-chain join stage
+    const twSupplyMap = loadSupplyChainJoin(dataDir)?.twSuppliers ?? TW_SUPPLY_MAP;
+
+    // Mode 1: Dynamic calculation — slope_matrix.bin (three column reads) when it is
+    // current, else price_store.bin (or legacy price_cache.json) per-symbol lookups
+    const matrix = date1 && date2 ? loadSlopeMatrix(dataDir) : null;
+
+    // Precomputed by scripts/slope_scan.py from this same matrix: serve it as is
+    const scans = matrix ? loadSlopeScans(dataDir) : null;
+    const precomputed =
+      scans && scans.benchmark === benchmark && scans.data_updated_at === matrix!.updatedAt
+        ? scans.scans[`${date1}:${date2}`]
+        : undefined;
+    if (precomputed) {
+      const benchSlope = precomputed.bench_slope;
+      const results = precomputed.results.map((r) => toSlopeResult(r, benchSlope, shortInterest, twSupplyMap));
+      results.sort((a, b) => b.slope - a.slope);
+      return NextResponse.json({
+        bench_slope: Math.round(benchSlope * 100) / 100,
+        bench_post: Math.round(precomputed.bench_post * 100) / 100,
+        explosive_threshold: Math.round(benchSlope * 10 * 100) / 100,
+        data_updated_at: matrix!.updatedAt,
+        mode: 'precomputed',
+        results,
+      });
+    }
+    const priceSource = date1 && date2 && !matrix ? loadUSPriceSource(dataDir) : null;
+    let scan: ScanInput | null = null;
+    if (matrix && date1 && date2) {
+      const c1 = matrix.column(date1);
+      const c2 = matrix.column(date2);
+      scan = {
+        updatedAt: matrix.updatedAt,
+        symbols: matrix.symbols,
+        p1: (i) => toPrice(c1[i]),
+        p2: (i) => toPrice(c2[i]),
+        latest: (i) => toPrice(matrix.latest[i]),
+      };
+    } else if (priceSource && date1 && date2) {
+      const syms = priceSource.symbols;
+      scan = {
+        updatedAt: priceSource.updatedAt,
+        symbols: syms,
+        p1: (i) => priceSource.closeOn(syms[i], date1),
+        p2: (i) => priceSource.closeOn(syms[i], date2),
+        latest: (i) => priceSource.latest(syms[i])[0]?.close ?? NaN,
+      };
+    }
+    if (scan) {
+      // Benchmark slope: data/benchmarks.json lookups, else the benchmark as a symbol in the scan
+      const bench = loadBenchmarks(dataDir);
+      const benchIdx = scan.symbols.indexOf(benchmark);
+      let benchP1: number | null;
+      let benchP2: number | null;
+      let benchLatest: number;
+      if (bench?.has(benchmark)) {
+        benchP1 = bench.closeOn(benchmark, date1!);
+        benchP2 = bench.closeOn(benchmark, date2!);
+        benchLatest = bench.latest(benchmark) ?? NaN;
+      } else if (benchIdx >= 0) {
+        benchP1 = scan.p1(benchIdx);
+        benchP2 = scan.p2(benchIdx);
+        benchLatest = scan.latest(benchIdx);
+      } else {
         return NextResponse.json(
           { error: 'benchmark_not_found', message: `找不到 ${benchmark} 的價格數據` },
           { status: 400 }
         );
       }
-      const benchP1 = findClosestPrice(benchPrices, date1);
-      const benchP2 = findClosestPrice(benchPrices, date2);
-      const benchLatest = benchPrices.reduce((a, b) =>
-        a.date > b.date ? a : b
-      ).close;
 
       if (!benchP1 || !benchP2) {
         return NextResponse.json(
@@ -142,18 +209,15 @@ export async function POST(request: NextRequest) {
       const benchPost = ((benchLatest - benchP2) / benchP2) * 100;
 
       const results: SlopeResult[] = [];
-      for (const sym of priceCache.symbols) {
+      for (let i = 0; i < scan.symbols.length; i++) {
+        const sym = scan.symbols[i];
         if (sym === benchmark) continue;
-        const prices = priceCache.prices[sym];
-        if (!prices || prices.length === 0) continue;
 
-        const p1 = findClosestPrice(prices, date1);
-        const p2 = findClosestPrice(prices, date2);
-        if (!p1 || !p2) continue;
+        const p1 = scan.p1(i);
+        const p2 = scan.p2(i);
+        if (!p1 || !p2) continue; // null or NaN: no price near that date
 
-        const latestPrice = prices.reduce((a, b) =>
-          a.date > b.date ? a : b
-        ).close;
+        const latestPrice = scan.latest(i);
         const slope = ((p2 - p1) / p1) * 100;
         const postReturn = ((latestPrice - p2) / p2) * 100;
         const si = shortInterest.data[sym];
@@ -171,7 +235,7 @@ export async function POST(request: NextRequest) {
           sector: '',
           industry: '',
           triple_filter: slope > 50 && shortPct >= 5 && shortPct <= 15,
-          tw_suppliers: TW_SUPPLY_MAP[sym] || [],
+          tw_suppliers: twSupplyMap[sym] || [],
         });
       }
 
@@ -181,7 +245,7 @@ export async function POST(request: NextRequest) {
         bench_slope: Math.round(benchSlope * 100) / 100,
         bench_post: Math.round(benchPost * 100) / 100,
         explosive_threshold: Math.round(benchSlope * 10 * 100) / 100,
-        data_updated_at: priceCache.updated_at,
+        data_updated_at: scan.updatedAt,
         mode: 'dynamic',
         results,
       });
@@ -195,25 +259,7 @@ export async function POST(request: NextRequest) {
       );
 
       const benchSlope = slopeCache.bench_slope;
-      const results: SlopeResult[] = slopeCache.results.map((r) => {
-        const si = shortInterest.data[r.symbol];
-        const shortPct = si?.shortPct ?? 0;
-        const shortRatio = si?.shortRatio ?? 0;
-        const group = assignGroup(r.slope, benchSlope);
-
-        return {
-          symbol: r.symbol,
-          slope: Math.round(r.slope * 100) / 100,
-          post_return: Math.round(r.post_return * 100) / 100,
-          group,
-          short_pct: shortPct,
-          short_ratio: shortRatio,
-          sector: '',
-          industry: '',
-          triple_filter: r.slope > 50 && shortPct >= 5 && shortPct <= 15,
-          tw_suppliers: TW_SUPPLY_MAP[r.symbol] || [],
-        };
-      });
+      const results = slopeCache.results.map((r) => toSlopeResult(r, benchSlope, shortInterest, twSupplyMap));
 
       results.sort((a, b) => b.slope - a.slope);
 
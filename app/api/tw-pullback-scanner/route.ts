@@ -1,5 +1,8 @@
 import { NextRequest, NextResponse } from 'next/server';
+import fs from 'fs';
+import path from 'path';
 import getClientPromise from '@/lib/mongodb';
+import { twCacheUpdatedAt } from '@/lib/price-store';
 
 export const maxDuration = 30;
 
@@ -32,7 +35,44 @@ export interface ScanResult {
 let cache: { data: ScanResult; timestamp: number } | null = null;
 const CACHE_MS = 10 * 60 * 1000; // 10 minutes
 
+// Precomputed by scripts/tw_pullback_scan.py at the end of each TW cache update.
+// Same response shape, symbols (full 2330.TW / 6488.TWO codes) and scope as the
+// MongoDB path: only stocks with a bar on the latest trading day are scanned and
+// counted in totalScanned. The drawdown is computePullback()'s segment drawdown
+// (as the detail route shows) rather than ridingwave's vs_high_pct, so bucket
+// membership can differ from the MongoDB buckets near their edges.
+let resident: { key: string; data: ScanResult; sourceUpdatedAt: string } | null = null;
+// Older than this (calendar days) means the TW updater has stalled: query MongoDB instead
+const MAX_STALE_DAYS = 5;
+
+function loadPrecomputed(): ScanResult | null {
+  const dataDir = path.join(process.cwd(), 'data');
+  const filePath = path.join(dataDir, 'tw_pullback_scan.json');
+  const cachePath = path.join(dataDir, 'tw_price_cache.json');
+  if (!fs.existsSync(filePath)) return null;
+  const key = `${filePath}:${fs.statSync(filePath).mtimeMs}`;
+  if (resident?.key !== key) {
+    const raw = JSON.parse(fs.readFileSync(filePath, 'utf-8')) as ScanResult & { source_updated_at?: string };
+    resident = {
+      key,
+      data: { date: raw.date, totalScanned: raw.totalScanned, buckets: raw.buckets },
+      sourceUpdatedAt: raw.source_updated_at ?? '',
+    };
+  }
+  // Only the scan of the cache on disk: a cache rewritten since (another updated_at) was not scanned
+  if (!resident.sourceUpdatedAt) return null;
+  if (fs.existsSync(cachePath) && twCacheUpdatedAt(cachePath) !== resident.sourceUpdatedAt) return null;
+  const ageDays = (Date.now() - Date.parse(resident.data.date)) / 86400000;
+  if (!(ageDays <= MAX_STALE_DAYS)) return null;
+  return resident.data;
+}
+
 export async function GET(req: NextRequest) {
+  const precomputed = loadPrecomputed();
+  if (precomputed) {
+    return NextResponse.json(precomputed);
+  }
+
   if (cache && Date.now() - cache.timestamp < CACHE_MS) {
     return NextResponse.json(cache.data);
   }
@@ -5,6 +5,20 @@ import supplyChainDB from '@/data/supply-chain';
 import { twStocks } from '@/data/tw-stocks';
 import twSectorMapRaw from '@/data/tw_sector_map.json';
 import usSectorMapRaw from '@/data/us_sector_map.json';
+import {
+  applyAdjustments,
+  loadBenchmarks,
+  loadIndicators,
+  loadSupplyChainJoin,
+  loadUSPriceSource,
+  twCacheUpdatedAt,
+  type AdjustmentEvent,
+  type SupplyChainJoin,
+  type SupplyChainPair,
+  type Type1Edge,
+  type Type2Row,
+  type USPriceSource,
+} from '@/lib/price-store';
 
 const US_SECTOR_MAP: Record<string, { sector_en: string; sector_zh: string; industry: string }> =
   usSectorMapRaw as Record<string, { sector_en: string; sector_zh: string; industry: string }>;
@@ -55,12 +69,10 @@ interface TWPriceCacheData {
   symbols: string[];
   prices: Record<string, PriceRecord[]>;
   metadata: Record<string, { name: string; sector: string; exchange: string }>;
-}
-
-interface USPriceCacheData {
-  updated_at: string;
-  symbols: string[];
-  prices: Record<string, PriceRecord[]>;
+  adjustments?: Record<string, AdjustmentEvent[]>;
+  data_source?: string;
+  /** Where the newest bars came from (TWSE/TPEx listing quotes and/or yfinance). */
+  latest_bar_source?: string;
 }
 
 interface Type1Supplier {
@@ -137,6 +149,193 @@ function calcSlope(prices: PriceRecord[], date1: string, date2: string): number
   return ((p2 - p1) / p1) * 100;
 }
 
+function latestDate(prices: PriceRecord[] | undefined): string | null {
+  return prices?.length ? prices.reduce((a, b) => (a.date > b.date ? a : b)).date : null;
+}
+
+function calcUSSlope(source: USPriceSource, symbol: string, date1: string, date2: string): number | null {
+  const p1 = source.closeOn(symbol, date1);
+  const p2 = source.closeOn(symbol, date2);
+  if (p1 === null || p2 === null || p1 === 0) return null;
+  return ((p2 - p1) / p1) * 100;
+}
+
+/** One date pair's cross-market join plus the TW cache fields the response shows. */
+interface CrossMarketScan {
+  taiexSlope: number | null;
+  benchSlopeUS: number;
+  explosiveThreshold: number;
+  type1Edges: Type1Edge[];
+  type2Rows: Type2Row[];
+  dataUpdatedAt: string;
+  taiexLatestDate: string | null;
+  stocksLatestDate: string | null;
+  dataSource: unknown;
+  latestBarSource: unknown;
+  nameOf(twTicker: string): string | null;
+  sectorOf(twTicker: string): string | null;
+  ma60Of(twTicker: string): { ma60: number; currentPrice: number } | null;
+}
+
+// Served straight from data/supply_chain_join.json — the TW cache is not read
+function precomputedScan(join: SupplyChainJoin, pre: SupplyChainPair): CrossMarketScan {
+  return {
+    taiexSlope: pre.taiexSlope,
+    benchSlopeUS: pre.benchSlopeUS,
+    explosiveThreshold: pre.explosiveThreshold,
+    type1Edges: pre.type1,
+    type2Rows: pre.type2,
+    dataUpdatedAt: join.twUpdatedAt,
+    taiexLatestDate: join.taiexLatestDate,
+    stocksLatestDate: join.stocksLatestDate,
+    dataSource: join.twDataSource,
+    latestBarSource: join.twLatestBarSource,
+    nameOf: sym => join.twSymbol(sym)?.name ?? null,
+    sectorOf: sym => join.twSymbol(sym)?.sector ?? null,
+    ma60Of: sym => join.twSymbol(sym)?.ma60 ?? null,
+  };
+}
+
+function loadTWCache(twCachePath: string): TWPriceCacheData {
+  const twCache: TWPriceCacheData = JSON.parse(fs.readFileSync(twCachePath, 'utf-8'));
+  // Cache keeps raw closes; apply 除權息 factors for the symbols that have them
+  for (const [sym, events] of Object.entries(twCache.adjustments ?? {})) {
+    if (twCache.prices[sym]) twCache.prices[sym] = applyAdjustments(twCache.prices[sym], events);
+  }
+  return twCache;
+}
+
+function dynamicScan(
+  twCache: TWPriceCacheData,
+  usSource: USPriceSource | null,
+  dataDir: string,
+  date1: string,
+  date2: string,
+): CrossMarketScan {
+  // Calculate TAIEX slope — benchmark store lookup, else scan the cache's taiex bars
+  const bench = loadBenchmarks(dataDir);
+  const taiexSlope = bench?.has('^TWII')
+    ? bench.slope('^TWII', date1, date2)
+    : calcSlope(twCache.taiex, date1, date2);
+
+  // US price store for explosive stocks
+  let benchSlopeUS = 0;
+  let explosiveThreshold = 0;
+  const explosiveUSStocks: Map<string, number> = new Map(); // symbol -> slope
+
+  if (usSource) {
+    // Calculate QQQ benchmark slope
+    if (bench?.has('QQQ') || usSource.has('QQQ')) {
+      const qqSlope = bench?.has('QQQ')
+        ? bench.slope('QQQ', date1, date2)
+        : calcUSSlope(usSource, 'QQQ', date1, date2);
+      if (qqSlope !== null) {
+        benchSlopeUS = Math.round(qqSlope * 100) / 100;
+      }
+    }
+
+    explosiveThreshold = benchSlopeUS * 10;
+
+    // Find explosive US stocks (slope >= benchSlope * 10)
+    for (const sym of usSource.symbols) {
+      if (sym === 'QQQ' || sym === 'SPY' || sym === 'IWM') continue;
+      const slope = calcUSSlope(usSource, sym, date1, date2);
+      if (slope !== null && slope >= explosiveThreshold) {
+        explosiveUSStocks.set(sym, Math.round(slope * 100) / 100);
+      }
+    }
+  }
+
+  // Pre-compute TW stock slopes
+  const twSlopeMap: Map<string, number> = new Map();
+  for (const sym of twCache.symbols) {
+    const prices = twCache.prices[sym];
+    if (!prices || prices.length === 0) continue;
+    const slope = calcSlope(prices, date1, date2);
+    if (slope !== null) {
+      twSlopeMap.set(sym, Math.round(slope * 100) / 100);
+    }
+  }
+
+  // Type 1 edges: explosive US parent → TW supplier that pulled back 15%+
+  const type1Edges: Type1Edge[] = [];
+  const seenType1: Set<string> = new Set();
+  for (const [usSymbol, usSlope] of explosiveUSStocks) {
+    const suppliers = supplyChainDB[usSymbol];
+    if (!suppliers) continue;
+
+    for (const supplier of suppliers) {
+      if (supplier.market !== 'TW' || !supplier.ticker) continue;
+
+      const twTicker = supplier.ticker; // e.g. "2330.TW"
+      const twSlope = twSlopeMap.get(twTicker);
+
+      // Filter: TW slope <= -15% (回檔15%以上)
+      if (twSlope === undefined || twSlope > -15) continue;
+
+      const key = `${twTicker}-${usSymbol}`;
+      if (seenType1.has(key)) continue;
+      seenType1.add(key);
+      type1Edges.push({ usSymbol, usSlope, twTicker, twSlope, supplierName: supplier.name, role: supplier.role });
+    }
+  }
+
+  // Build reverse supply chain: TW ticker -> US parents
+  const twToUSParents: Map<string, string[]> = new Map();
+  for (const [usSymbol, suppliers] of Object.entries(supplyChainDB)) {
+    if (!Array.isArray(suppliers)) continue;
+    for (const supplier of suppliers as Array<{market: string; ticker?: string}>) {
+      if (supplier.market !== 'TW' || !supplier.ticker) continue;
+      const twTicker = supplier.ticker;
+      if (!twToUSParents.has(twTicker)) twToUSParents.set(twTicker, []);
+      twToUSParents.get(twTicker)!.push(usSymbol);
+    }
+  }
+
+  // Type 2 rows: TW slope >= TAIEX slope, with their explosive US parents
+  const type2Rows: Type2Row[] = [];
+  const taiexFloor = taiexSlope === null ? 0 : Math.round(taiexSlope * 100) / 100;
+  for (const [twTicker, twSlope] of twSlopeMap) {
+    if (twSlope < taiexFloor) continue;
+    const allParents = twToUSParents.get(twTicker) || [];
+    type2Rows.push({ twTicker, twSlope, explosiveParents: allParents.filter(us => explosiveUSStocks.has(us)) });
+  }
+
+  // Freshness metadata (the MA60 cutoff is the stocks' latest date)
+  const taiexLatestDate = latestDate(twCache.taiex);
+  const stockSampleDates = twCache.symbols.slice(0, 50)
+    .map(sym => latestDate(twCache.prices[sym]))
+    .filter(Boolean) as string[];
+  const stocksLatestDate = stockSampleDates.length ? stockSampleDates.sort().at(-1)! : null;
+
+  // Precomputed SMA60 from the TW updater's indicator table, when built from this cache
+  const indicators = loadIndicators('TW', dataDir);
+  const twIndicators = indicators?.sourceUpdatedAt === twCache.updated_at ? indicators : null;
+  const ma60Cutoff = stocksLatestDate || date2;
+
+  return {
+    taiexSlope,
+    benchSlopeUS,
+    explosiveThreshold,
+    type1Edges,
+    type2Rows,
+    dataUpdatedAt: twCache.updated_at,
+    taiexLatestDate,
+    stocksLatestDate,
+    dataSource: twCache.data_source ?? 'yfinance [temporary]',
+    latestBarSource: twCache.latest_bar_source ?? twCache.data_source ?? 'yfinance [temporary]',
+    nameOf: sym => twCache.metadata[sym]?.name || null,
+    sectorOf: sym => twCache.metadata[sym]?.sector || null,
+    // MA60: table row when it is at or before the cutoff, else scan the bars
+    ma60Of: sym => {
+      const ind = twIndicators?.get(sym);
+      return ind && ind.sma60 !== null && ind.asof <= ma60Cutoff
+        ? { ma60: Math.round(ind.sma60 * 100) / 100, currentPrice: ind.close }
+        : calcMA60(twCache.prices[sym] || [], ma60Cutoff);
+    },
+  };
+}
+
 export async function POST(request: NextRequest) {
   try {
     const body = await request.json();
@@ -151,7 +350,7 @@ export async function POST(request: NextRequest) {
 
     const dataDir = path.join(process.cwd(), 'data');
 
-    // Load TW price cache
+    // TW price cache (parsed below only when the precomputed join cannot serve the pair)
     const twCachePath = path.join(dataDir, 'tw_price_cache.json');
     if (!fs.existsSync(twCachePath)) {
       return NextResponse.json(
@@ -160,10 +359,23 @@ export async function POST(request: NextRequest) {
       );
     }
 
-    const twCache: TWPriceCacheData = JSON.parse(fs.readFileSync(twCachePath, 'utf-8'));
+    // Cross-market join precomputed by scripts/supply_chain_join.py for this date pair,
+    // when it was built from the US store loaded here and the TW cache on disk; only
+    // otherwise is the full TW cache parsed and the join computed here
+    const usSource = loadUSPriceSource(dataDir);
+    const join = loadSupplyChainJoin(dataDir);
+    const pre =
+      join &&
+      join.usUpdatedAt === (usSource?.updatedAt ?? '') &&
+      join.twUpdatedAt !== '' &&
+      join.twUpdatedAt === twCacheUpdatedAt(twCachePath)
+        ? join.pair(date1, date2)
+        : null;
+    const scan = pre
+      ? precomputedScan(join!, pre)
+      : dynamicScan(loadTWCache(twCachePath), usSource, dataDir, date1, date2);
+    const { taiexSlope } = scan;
 
-    // Calculate TAIEX slope
-    const taiexSlope = calcSlope(twCache.taiex, date1, date2);
     if (taiexSlope === null) {
       return NextResponse.json(
         { error: 'date_range_error', message: '找不到指定日期的 TAIEX 價格' },
@@ -171,90 +383,27 @@ export async function POST(request: NextRequest) {
       );
     }
 
-    // Load US price cache for explosive stocks
-    const usCachePath = path.join(dataDir, 'price_cache.json');
-    let benchSlopeUS = 0;
-    let explosiveThreshold = 0;
-    const explosiveUSStocks: Map<string, number> = new Map(); // symbol -> slope
-
-    if (fs.existsSync(usCachePath)) {
-      const usCache: USPriceCacheData = JSON.parse(fs.readFileSync(usCachePath, 'utf-8'));
-
-      // Calculate QQQ benchmark slope
-      const qqPrices = usCache.prices['QQQ'];
-      if (qqPrices) {
-        const qqSlope = calcSlope(qqPrices, date1, date2);
-        if (qqSlope !== null) {
-          benchSlopeUS = Math.round(qqSlope * 100) / 100;
-        }
-      }
-
-      explosiveThreshold = benchSlopeUS * 10;
-
-      // Find explosive US stocks (slope >= benchSlope * 10)
-      for (const sym of usCache.symbols) {
-        if (sym === 'QQQ' || sym === 'SPY' || sym === 'IWM') continue;
-        const prices = usCache.prices[sym];
-        if (!prices || prices.length === 0) continue;
-        const slope = calcSlope(prices, date1, date2);
-        if (slope !== null && slope >= explosiveThreshold) {
-          explosiveUSStocks.set(sym, Math.round(slope * 100) / 100);
-        }
-      }
-    }
-
-    // Pre-compute TW stock slopes
-    const twSlopeMap: Map<string, number> = new Map();
-    for (const sym of twCache.symbols) {
-      const prices = twCache.prices[sym];
-      if (!prices || prices.length === 0) continue;
-      const slope = calcSlope(prices, date1, date2);
-      if (slope !== null) {
-        twSlopeMap.set(sym, Math.round(slope * 100) / 100);
-      }
-    }
-
     // ===== Type 1: 供應鏈補漲型 =====
     const type1Groups: Map<string, Type1Group> = new Map();
-    const seenType1: Set<string> = new Set();
-
-    for (const [usSymbol, usSlope] of explosiveUSStocks) {
-      const suppliers = supplyChainDB[usSymbol];
-      if (!suppliers) continue;
-
-      for (const supplier of suppliers) {
-        if (supplier.market !== 'TW' || !supplier.ticker) continue;
-
-        const twTicker = supplier.ticker; // e.g. "2330.TW"
-        const twSlope = twSlopeMap.get(twTicker);
-
-        // Filter: TW slope <= -15% (回檔15%以上)
-        if (twSlope === undefined || twSlope > -15) continue;
-
-        const key = `${twTicker}-${usSymbol}`;
-        if (seenType1.has(key)) continue;
-        seenType1.add(key);
-
-        const meta = twCache.metadata[twTicker];
-        const industry = getIndustryZh(usSymbol);
-
-        if (!type1Groups.has(industry)) {
-          type1Groups.set(industry, { industry, usStocks: [], usSlopes: [], suppliers: [] });
-        }
-        const group = type1Groups.get(industry)!;
-        if (!group.usStocks.includes(usSymbol)) {
-          group.usStocks.push(usSymbol);
-          group.usSlopes.push(usSlope);
-        }
-        group.suppliers.push({
-          twSymbol: twTicker,
-          twName: meta?.name || supplier.name,
-          usParent: usSymbol,
-          usSlope,
-          role: supplier.role,
-          twSlope,
-        });
+    for (const edge of scan.type1Edges) {
+      const industry = getIndustryZh(edge.usSymbol);
+
+      if (!type1Groups.has(industry)) {
+        type1Groups.set(industry, { industry, usStocks: [], usSlopes: [], suppliers: [] });
       }
+      const group = type1Groups.get(industry)!;
+      if (!group.usStocks.includes(edge.usSymbol)) {
+        group.usStocks.push(edge.usSymbol);
+        group.usSlopes.push(edge.usSlope);
+      }
+      group.suppliers.push({
+        twSymbol: edge.twTicker,
+        twName: scan.nameOf(edge.twTicker) || edge.supplierName,
+        usParent: edge.usSymbol,
+        usSlope: edge.usSlope,
+        role: edge.role,
+        twSlope: edge.twSlope,
+      });
     }
 
     // Convert groups map to array, sort each group's suppliers
@@ -265,48 +414,16 @@ export async function POST(request: NextRequest) {
     // Sort groups by number of suppliers desc
     type1.sort((a, b) => b.suppliers.length - a.suppliers.length);
 
-    // Build reverse supply chain: TW ticker -> US parents
-    const twToUSParents: Map<string, string[]> = new Map();
-    for (const [usSymbol, suppliers] of Object.entries(supplyChainDB)) {
-      if (!Array.isArray(suppliers)) continue;
-      for (const supplier of suppliers as Array<{market: string; ticker?: string}>) {
-        if (supplier.market !== 'TW' || !supplier.ticker) continue;
-        const twTicker = supplier.ticker;
-        if (!twToUSParents.has(twTicker)) twToUSParents.set(twTicker, []);
-        twToUSParents.get(twTicker)!.push(usSymbol);
-      }
-    }
-
-    // Compute freshness metadata (needed for MA60 calc)
-    const taiexLatestDate = twCache.taiex?.length
-      ? twCache.taiex.reduce((a: PriceRecord, b: PriceRecord) => (a.date > b.date ? a : b)).date
-      : null;
-    const stockSampleDates = twCache.symbols.slice(0, 50).map((sym: string) => {
-      const p = twCache.prices[sym];
-      return p?.length ? p.reduce((a: PriceRecord, b: PriceRecord) => (a.date > b.date ? a : b)).date : null;
-    }).filter(Boolean) as string[];
-    const stocksLatestDate = stockSampleDates.length
-      ? stockSampleDates.sort().at(-1)!
-      : null;
-
     // ===== Type 2: 跟盤型 =====
     const type2: Type2Result[] = [];
     const roundedTaiex = Math.round(taiexSlope * 100) / 100;
 
-    for (const [twTicker, twSlope] of twSlopeMap) {
-      // TW slope >= TAIEX slope
-      if (twSlope < roundedTaiex) continue;
-
-      const meta = twCache.metadata[twTicker];
+    for (const { twTicker, twSlope, explosiveParents } of scan.type2Rows) {
       // Look up sector from tw-stocks.ts static map
       const code = twTicker.replace('.TW', '').replace('.TWO', '');
-      const sector = SECTOR_MAP[code] || meta?.sector || '';
-      // Find explosive US parents for this TW stock
-      const allParents = twToUSParents.get(twTicker) || [];
-      const explosiveParents = allParents.filter(us => explosiveUSStocks.has(us));
+      const sector = SECTOR_MAP[code] || scan.sectorOf(twTicker) || '';
 
-      // MA60 calculation
-      const ma60Result = calcMA60(twCache.prices[twTicker] || [], stocksLatestDate || date2);
+      const ma60Result = scan.ma60Of(twTicker);
       const ma60Data = ma60Result ? {
         ma60: ma60Result.ma60,
         currentPrice: ma60Result.currentPrice,
@@ -317,7 +434,7 @@ export async function POST(request: NextRequest) {
 
       type2.push({
         twSymbol: twTicker,
-        twName: meta?.name || twTicker,
+        twName: scan.nameOf(twTicker) || twTicker,
         sector,
         twSlope,
         taiexSlope: roundedTaiex,
@@ -331,12 +448,13 @@ export async function POST(request: NextRequest) {
 
     return NextResponse.json({
       taiex_slope: roundedTaiex,
-      bench_slope_us: benchSlopeUS,
-      explosive_threshold: explosiveThreshold,
-      data_updated_at: twCache.updated_at,
-      taiex_latest_date: taiexLatestDate,
-      stocks_latest_date: stocksLatestDate,
-      data_source: (twCache as unknown as Record<string, unknown>).data_source ?? 'yfinance [temporary]',
+      bench_slope_us: scan.benchSlopeUS,
+      explosive_threshold: scan.explosiveThreshold,
+      data_updated_at: scan.dataUpdatedAt,
+      taiex_latest_date: scan.taiexLatestDate,
+      stocks_latest_date: scan.stocksLatestDate,
+      data_source: scan.dataSource,
+      latest_bar_source: scan.latestBarSource,
       type1,
       type2,
     });
@@ -40,6 +40,7 @@ interface TWScanResponse {
   taiex_latest_date?: string;
   stocks_latest_date?: string;
   data_source?: string;
+  latest_bar_source?: string;
   type1: Type1Group[];
   type2: Type2Result[];
   error?: string;
@@ -586,7 +587,10 @@ export default function TWSlopeScanner() {
                 ｜ TAIEX {fmtDate(taiexDate)}
                 ｜ 最後更新 {fmtTime(updatedAt)}
               </span>
-              <span className="text-gray-300">資料來源：{data.data_source ?? 'yfinance [temporary]'}</span>
+              <span className="text-gray-300">
+                資料來源：{data.data_source ?? 'yfinance [temporary]'}
+                {data.latest_bar_source && data.latest_bar_source !== data.data_source && `（最新 bar：${data.latest_bar_source}）`}
+              </span>
             </div>
           </div>
         );
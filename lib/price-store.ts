@@ -0,0 +1,611 @@
+// Reader for data/price_store.bin, the columnar price store written by
+// scripts/update_slope_cache.py (format documented in scripts/price_store.py).
+// Loaded once per process and kept resident; reloaded when the file changes.
+// Falls back to the legacy data/price_cache.json layout when no store exists.
+// Also reads data/slope_matrix.bin (scripts/slope_matrix.py): closes already
+// forward-filled onto a calendar-day axis, so a date lookup is one column.
+// Caches store closes as first recorded plus corporate-action factors
+// ("adjustments", scripts/corporate_actions.py); they are applied here, on read.
+// Benchmarks (^TWII, QQQ/SPY/IWM) come from data/benchmarks.json, whose
+// per-calendar-day closes make a benchmark slope two array reads.
+// Per-symbol indicators (SMA/ATR/range/drawdown at the latest bar) come from
+// data/indicators_{us,tw}.json, written at the end of each updater run.
+// The US → TW supply-chain join (scripts/supply_chain_join.py) comes from
+// data/supply_chain_join.json: per date pair, /api/tw-slope's Type 1 edges and
+// Type 2 rows, already filtered and in the order the route's own join yields,
+// plus the TW cache fields the route shows (names, sectors, MA60, dates).
+
+import fs from 'fs';
+import path from 'path';
+
+export interface PriceRecord {
+  date: string;
+  close: number;
+}
+
+export interface USPriceSource {
+  updatedAt: string;
+  symbols: string[];
+  has(symbol: string): boolean;
+  /** Close on or before targetDate (same rules as the scanners' findClosestPrice). */
+  closeOn(symbol: string, targetDate: string): number | null;
+  /** Most recent `n` bars, newest first. */
+  latest(symbol: string, n?: number): PriceRecord[];
+}
+
+const MAGIC = 'PXSTORE\0';
+const SUPPORTED_VERSION = 1;
+const DATA_ALIGN = 64;
+const MAX_GAP_DAYS = 10;
+
+// Stored closes are float32; trim the representation noise (412.3699951 → 412.37)
+export const toPrice = (v: number): number => Math.round(v * 10000) / 10000;
+
+/** One corporate-action event: closes dated before ex_date are multiplied by factor. */
+export type AdjustmentEvent = [exDate: string, factor: number];
+
+/** Cumulative factor for a bar dated `date` (product of the events after it). */
+export function adjustmentFactor(events: AdjustmentEvent[] | undefined, date: string): number {
+  let factor = 1;
+  if (!events) return factor;
+  for (let k = events.length - 1; k >= 0 && events[k][0] > date; k--) factor *= events[k][1];
+  return factor;
+}
+
+/** Adjusted copy of `records` (the records themselves when there are no events). */
+export function applyAdjustments(records: PriceRecord[], events?: AdjustmentEvent[]): PriceRecord[] {
+  if (!events || events.length === 0) return records;
+  return records.map((r) => ({ date: r.date, close: toPrice(r.close * adjustmentFactor(events, r.date)) }));
+}
+
+function daysBetween(from: string, to: string): number {
+  return (new Date(to).getTime() - new Date(from).getTime()) / 86400000;
+}
+
+export function findClosestPrice(prices: PriceRecord[], targetDate: string): number | null {
+  if (!prices || prices.length === 0) return null;
+
+  // Find all records on or before targetDate, sorted most-recent-first
+  const candidates = prices
+    .filter(p => p.date <= targetDate)
+    .sort((a, b) => b.date.localeCompare(a.date));
+
+  if (candidates.length === 0) return null;
+
+  const best = candidates[0];
+
+  // Normal case: within 10 days (covers weekends and holidays)
+  if (daysBetween(best.date, targetDate) <= MAX_GAP_DAYS) return best.close;
+
+  // Stale cache: target date is beyond all available data — use latest available.
+  const maxDate = prices.reduce((a, b) => (a.date > b.date ? a : b)).date;
+  if (targetDate > maxDate) return best.close;
+
+  // Large gap within cache range (genuine missing data) — do not interpolate
+  return null;
+}
+
+interface MatrixFile {
+  header: Record<string, unknown> & { dates: string[]; symbols: string[] };
+  data: Float32Array;
+}
+
+/** Parse a PXSTORE container (header JSON + row-major float32 matrix). */
+export function readMatrixFile(filePath: string): MatrixFile {
+  const buf = fs.readFileSync(filePath);
+  if (buf.toString('latin1', 0, 8) !== MAGIC) throw new Error(`${filePath}: not a price store file`);
+  const version = buf.readUInt32LE(8);
+  if (version > SUPPORTED_VERSION) throw new Error(`${filePath}: unsupported store version ${version}`);
+  const hdrLen = buf.readUInt32LE(12);
+  const header = JSON.parse(buf.toString('utf-8', 16, 16 + hdrLen)) as MatrixFile['header'];
+  let offset = 16 + hdrLen;
+  offset += (DATA_ALIGN - (offset % DATA_ALIGN)) % DATA_ALIGN;
+  const fields = Array.isArray(header.fields) ? header.fields.length : 1;
+  const length = header.symbols.length * header.dates.length * fields;
+  const start = buf.byteOffset + offset;
+  const data =
+    start % 4 === 0
+      ? new Float32Array(buf.buffer, start, length)
+      : new Float32Array(buf.buffer.slice(start, start + length * 4));
+  return { header, data };
+}
+
+function storeSource(filePath: string): USPriceSource {
+  const { header, data } = readMatrixFile(filePath);
+  const { dates, symbols } = header;
+  const n = dates.length;
+  const rowOf = new Map<string, number>();
+  symbols.forEach((sym, i) => rowOf.set(sym, i));
+
+  // Last column holding a real bar, per row (-1 when the row is empty)
+  const lastCol = new Int32Array(symbols.length).fill(-1);
+  for (let i = 0; i < symbols.length; i++) {
+    for (let j = n - 1; j >= 0; j--) {
+      if (!Number.isNaN(data[i * n + j])) {
+        lastCol[i] = j;
+        break;
+      }
+    }
+  }
+
+  // Index of the last axis date <= target, or -1
+  const colOnOrBefore = (target: string): number => {
+    let lo = 0;
+    let hi = n - 1;
+    let ans = -1;
+    while (lo <= hi) {
+      const mid = (lo + hi) >> 1;
+      if (dates[mid] <= target) {
+        ans = mid;
+        lo = mid + 1;
+      } else {
+        hi = mid - 1;
+      }
+    }
+    return ans;
+  };
+
+  const meta = (header.meta ?? {}) as Record<string, unknown>;
+  const adjustments = (meta.adjustments ?? {}) as Record<string, AdjustmentEvent[]>;
+  const closeAt = (symbol: string, base: number, j: number) =>
+    toPrice(data[base + j] * adjustmentFactor(adjustments[symbol], dates[j]));
+  return {
+    updatedAt: String(meta.updated_at ?? ''),
+    symbols: symbols.filter((_, i) => lastCol[i] >= 0),
+    has: (symbol) => (rowOf.has(symbol) ? lastCol[rowOf.get(symbol)!] >= 0 : false),
+    closeOn(symbol, targetDate) {
+      const row = rowOf.get(symbol);
+      if (row === undefined || lastCol[row] < 0) return null;
+      const base = row * n;
+      let j = Math.min(colOnOrBefore(targetDate), lastCol[row]);
+      while (j >= 0 && Number.isNaN(data[base + j])) j--;
+      if (j < 0) return null;
+      if (daysBetween(dates[j], targetDate) <= MAX_GAP_DAYS) return closeAt(symbol, base, j);
+      // Target beyond this symbol's data: use its latest bar
+      if (targetDate > dates[lastCol[row]]) return closeAt(symbol, base, j);
+      return null;
+    },
+    latest(symbol, count = 1) {
+      const row = rowOf.get(symbol);
+      const out: PriceRecord[] = [];
+      if (row === undefined) return out;
+      const base = row * n;
+      for (let j = lastCol[row]; j >= 0 && out.length < count; j--) {
+        const v = data[base + j];
+        if (!Number.isNaN(v)) out.push({ date: dates[j], close: closeAt(symbol, base, j) });
+      }
+      return out;
+    },
+  };
+}
+
+function jsonSource(filePath: string): USPriceSource {
+  const cache = JSON.parse(fs.readFileSync(filePath, 'utf-8')) as {
+    updated_at?: string;
+    symbols: string[];
+    prices: Record<string, PriceRecord[]>;
+    adjustments?: Record<string, AdjustmentEvent[]>;
+  };
+  const adjusted = new Map<string, PriceRecord[]>();
+  const recordsOf = (symbol: string): PriceRecord[] => {
+    let recs = adjusted.get(symbol);
+    if (!recs) {
+      recs = applyAdjustments(cache.prices[symbol] ?? [], cache.adjustments?.[symbol]);
+      adjusted.set(symbol, recs);
+    }
+    return recs;
+  };
+  const sortedDesc = new Map<string, PriceRecord[]>();
+  const desc = (symbol: string): PriceRecord[] => {
+    let recs = sortedDesc.get(symbol);
+    if (!recs) {
+      recs = [...recordsOf(symbol)].sort((a, b) => b.date.localeCompare(a.date));
+      sortedDesc.set(symbol, recs);
+    }
+    return recs;
+  };
+  return {
+    updatedAt: cache.updated_at ?? '',
+    symbols: cache.symbols,
+    has: (symbol) => (cache.prices[symbol]?.length ?? 0) > 0,
+    closeOn: (symbol, targetDate) => findClosestPrice(recordsOf(symbol), targetDate),
+    latest: (symbol, count = 1) => desc(symbol).slice(0, count),
+  };
+}
+
+let resident: { key: string; source: USPriceSource } | null = null;
+
+/** US price data from price_store.bin (preferred) or price_cache.json; null when neither exists. */
+export function loadUSPriceSource(dataDir: string = path.join(process.cwd(), 'data')): USPriceSource | null {
+  const storePath = path.join(dataDir, 'price_store.bin');
+  const jsonPath = path.join(dataDir, 'price_cache.json');
+  const filePath = fs.existsSync(storePath) ? storePath : fs.existsSync(jsonPath) ? jsonPath : null;
+  if (!filePath) return null;
+
+  const key = `${filePath}:${fs.statSync(filePath).mtimeMs}`;
+  if (resident?.key !== key) {
+    const source = filePath === storePath ? storeSource(filePath) : jsonSource(filePath);
+    resident = { key, source };
+  }
+  return resident.source;
+}
+
+export interface SlopeMatrix {
+  updatedAt: string;
+  symbols: string[];
+  /** Row of `symbol` in every column, or -1. */
+  indexOf(symbol: string): number;
+  /** Close on or before targetDate for every symbol (NaN where findClosestPrice gives null). */
+  column(targetDate: string): Float32Array;
+  /** Latest close of every symbol. */
+  latest: Float32Array;
+}
+
+function slopeMatrix(filePath: string): SlopeMatrix {
+  const { header, data } = readMatrixFile(filePath);
+  if (header.layout !== 'date-major') throw new Error(`${filePath}: expected a date-major matrix`);
+  const { dates, symbols } = header;
+  const width = symbols.length;
+  const rowOf = new Map<string, number>();
+  symbols.forEach((sym, i) => rowOf.set(sym, i));
+  const columnAt = (j: number) => data.subarray(j * width, (j + 1) * width);
+  const empty = new Float32Array(width).fill(NaN);
+  const start = dates.length > 0 ? Date.parse(dates[0]) : NaN;
+  const meta = (header.meta ?? {}) as Record<string, unknown>;
+
+  return {
+    updatedAt: String(meta.updated_at ?? ''),
+    symbols,
+    indexOf: (symbol) => rowOf.get(symbol) ?? -1,
+    column(targetDate) {
+      const j = Math.round((Date.parse(targetDate) - start) / 86400000);
+      if (!(j >= 0)) return empty; // before the axis, or unparseable
+      // Past the axis end every symbol is on its last bar, which the final column holds
+      return columnAt(Math.min(j, dates.length - 1));
+    },
+    latest: dates.length > 0 ? columnAt(dates.length - 1) : empty,
+  };
+}
+
+let residentMatrix: { key: string; matrix: SlopeMatrix } | null = null;
+let residentStoreStamp: { key: string; updatedAt: string } | null = null;
+
+/** meta.updated_at from price_store.bin's header, read without touching the price data. */
+function readStoreUpdatedAt(storePath: string): string {
+  const fd = fs.openSync(storePath, 'r');
+  try {
+    const prefix = Buffer.alloc(16);
+    fs.readSync(fd, prefix, 0, prefix.length, 0);
+    if (prefix.toString('latin1', 0, 8) !== MAGIC) throw new Error(`${storePath}: not a price store file`);
+    const hdr = Buffer.alloc(prefix.readUInt32LE(12));
+    fs.readSync(fd, hdr, 0, hdr.length, prefix.length);
+    const header = JSON.parse(hdr.toString('utf-8')) as { meta?: { updated_at?: string } };
+    return String(header.meta?.updated_at ?? '');
+  } finally {
+    fs.closeSync(fd);
+  }
+}
+
+function storeUpdatedAt(storePath: string): string {
+  const key = `${storePath}:${fs.statSync(storePath).mtimeMs}`;
+  if (residentStoreStamp?.key !== key) {
+    residentStoreStamp = { key, updatedAt: readStoreUpdatedAt(storePath) };
+  }
+  return residentStoreStamp.updatedAt;
+}
+
+/**
+ * The slope matrix, kept resident; null when it is missing or was built from
+ * another price_store.bin than the one on disk (its updated_at differs from
+ * the store header's), and callers then fall back to loadUSPriceSource.
+ */
+export function loadSlopeMatrix(dataDir: string = path.join(process.cwd(), 'data')): SlopeMatrix | null {
+  const matrixPath = path.join(dataDir, 'slope_matrix.bin');
+  const storePath = path.join(dataDir, 'price_store.bin');
+  if (!fs.existsSync(matrixPath)) return null;
+
+  const key = `${matrixPath}:${fs.statSync(matrixPath).mtimeMs}`;
+  if (residentMatrix?.key !== key) {
+    residentMatrix = { key, matrix: slopeMatrix(matrixPath) };
+  }
+  if (fs.existsSync(storePath) && storeUpdatedAt(storePath) !== residentMatrix.matrix.updatedAt) return null;
+  return residentMatrix.matrix;
+}
+
+export interface BenchmarkStore {
+  updatedAt: string;
+  /** Trailing-return windows, in trading days. */
+  windows: number[];
+  has(symbol: string): boolean;
+  /** Close on or before targetDate (findClosestPrice rules) — one array read. */
+  closeOn(symbol: string, targetDate: string): number | null;
+  /** % change between the closes on or before date1 and date2. */
+  slope(symbol: string, date1: string, date2: string): number | null;
+  /** Latest close. */
+  latest(symbol: string): number | null;
+  /** Precomputed trailing % returns at the latest bar, keyed by window. */
+  returns(symbol: string): Record<string, number | null>;
+  /** Adjusted bars, ascending. */
+  records(symbol: string): PriceRecord[];
+}
+
+interface BenchmarkEntry {
+  dates: string[];
+  closes: number[];
+  adjustments?: AdjustmentEvent[];
+  calendar: { start: string; closes: (number | null)[] };
+  latest_returns: Record<string, number | null>;
+}
+
+function benchmarkStore(filePath: string): BenchmarkStore {
+  const store = JSON.parse(fs.readFileSync(filePath, 'utf-8')) as {
+    updated_at?: string;
+    windows?: number[];
+    series: Record<string, BenchmarkEntry>;
+  };
+  const closeOn = (symbol: string, targetDate: string): number | null => {
+    const cal = store.series[symbol]?.calendar;
+    if (!cal || cal.closes.length === 0) return null;
+    const j = Math.round((Date.parse(targetDate) - Date.parse(cal.start)) / 86400000);
+    if (!(j >= 0)) return null;
+    // Past the calendar end the last bar carries forward (findClosestPrice's stale-cache rule)
+    return cal.closes[Math.min(j, cal.closes.length - 1)];
+  };
+  return {
+    updatedAt: store.updated_at ?? '',
+    windows: store.windows ?? [],
+    has: (symbol) => (store.series[symbol]?.dates.length ?? 0) > 0,
+    closeOn,
+    slope(symbol, date1, date2) {
+      const p1 = closeOn(symbol, date1);
+      const p2 = closeOn(symbol, date2);
+      if (!p1 || p2 === null) return null;
+      return ((p2 - p1) / p1) * 100;
+    },
+    latest(symbol) {
+      const closes = store.series[symbol]?.calendar.closes;
+      return closes?.length ? closes[closes.length - 1] : null;
+    },
+    returns: (symbol) => store.series[symbol]?.latest_returns ?? {},
+    records(symbol) {
+      const entry = store.series[symbol];
+      if (!entry) return [];
+      const raw = entry.dates.map((date, i) => ({ date, close: entry.closes[i] }));
+      return applyAdjustments(raw, entry.adjustments);
+    },
+  };
+}
+
+let residentBenchmarks: { key: string; store: BenchmarkStore } | null = null;
+
+/** data/benchmarks.json (scripts/benchmark_store.py), kept resident; null when missing. */
+export function loadBenchmarks(dataDir: string = path.join(process.cwd(), 'data')): BenchmarkStore | null {
+  const filePath = path.join(dataDir, 'benchmarks.json');
+  if (!fs.existsSync(filePath)) return null;
+  const key = `${filePath}:${fs.statSync(filePath).mtimeMs}`;
+  if (residentBenchmarks?.key !== key) {
+    residentBenchmarks = { key, store: benchmarkStore(filePath) };
+  }
+  return residentBenchmarks.store;
+}
+
+/** One row of data/indicators_{us,tw}.json (scripts/indicators.py), at the symbol's latest bar. */
+export interface Indicators {
+  asof: string;
+  close: number;
+  sma20: number | null;
+  sma60: number | null;
+  atr14: number | null;
+  high20: number | null;
+  low20: number | null;
+  high60: number | null;
+  low60: number | null;
+  high250: number | null;
+  low250: number | null;
+  drawdown: number | null;
+}
+
+export interface IndicatorTable {
+  updatedAt: string;
+  /** updated_at of the cache the table was computed from. */
+  sourceUpdatedAt: string;
+  /** 'close' (mean |Δclose|, closes only) or 'true_range' (high/low true range). */
+  atrBasis: string;
+  symbols: string[];
+  get(symbol: string): Indicators | null;
+}
+
+function indicatorTable(filePath: string): IndicatorTable {
+  const table = JSON.parse(fs.readFileSync(filePath, 'utf-8')) as {
+    updated_at?: string;
+    source_updated_at?: string;
+    atr_basis?: string;
+    fields: (keyof Indicators)[];
+    rows: Record<string, (string | number | null)[]>;
+  };
+  const memo = new Map<string, Indicators>();
+  return {
+    updatedAt: table.updated_at ?? '',
+    sourceUpdatedAt: table.source_updated_at ?? '',
+    atrBasis: table.atr_basis ?? 'close',
+    symbols: Object.keys(table.rows),
+    get(symbol) {
+      const row = table.rows[symbol];
+      if (!row) return null;
+      let out = memo.get(symbol);
+      if (!out) {
+        out = Object.fromEntries(table.fields.map((f, i) => [f, row[i]])) as unknown as Indicators;
+        memo.set(symbol, out);
+      }
+      return out;
+    },
+  };
+}
+
+const residentIndicators = new Map<string, { key: string; table: IndicatorTable }>();
+
+/** The market's indicator table, kept resident; null when missing. */
+export function loadIndicators(
+  market: 'US' | 'TW',
+  dataDir: string = path.join(process.cwd(), 'data')
+): IndicatorTable | null {
+  const filePath = path.join(dataDir, `indicators_${market.toLowerCase()}.json`);
+  if (!fs.existsSync(filePath)) return null;
+  const key = `${filePath}:${fs.statSync(filePath).mtimeMs}`;
+  let entry = residentIndicators.get(market);
+  if (entry?.key !== key) {
+    entry = { key, table: indicatorTable(filePath) };
+    residentIndicators.set(market, entry);
+  }
+  return entry.table;
+}
+
+/** Type 1 candidate: explosive US parent → TW supplier down 15%+ (slopes rounded to 2 decimals). */
+export interface Type1Edge {
+  usSymbol: string;
+  usSlope: number;
+  twTicker: string;
+  twSlope: number;
+  supplierName: string;
+  role: string;
+}
+
+/** Type 2 candidate: TW slope at or above TAIEX's, with its explosive US parents. */
+export interface Type2Row {
+  twTicker: string;
+  twSlope: number;
+  explosiveParents: string[];
+}
+
+export interface SupplyChainPair {
+  taiexSlope: number;
+  benchSlopeUS: number;
+  explosiveThreshold: number;
+  type1: Type1Edge[];
+  type2: Type2Row[];
+}
+
+/** What the TW cache says about a symbol shown in a precomputed pair. */
+export interface SupplyChainTWSymbol {
+  name: string | null;
+  sector: string | null;
+  /** calcMA60() of the route at stocksLatestDate; null with fewer than 20 bars. */
+  ma60: { ma60: number; currentPrice: number } | null;
+}
+
+export interface SupplyChainJoin {
+  updatedAt: string;
+  /** updated_at of the US price store / TW cache the join was computed from. */
+  usUpdatedAt: string;
+  twUpdatedAt: string;
+  /** US symbol → TW supplier codes (no .TW/.TWO suffix). */
+  twSuppliers: Record<string, string[]>;
+  twDataSource: string;
+  twLatestBarSource: string;
+  taiexLatestDate: string | null;
+  stocksLatestDate: string | null;
+  /** Precomputed join for (date1, date2); null when the pair was not precomputed. */
+  pair(date1: string, date2: string): SupplyChainPair | null;
+  /** Name, sector and MA60 of a TW symbol in any precomputed pair. */
+  twSymbol(symbol: string): SupplyChainTWSymbol | null;
+}
+
+interface SupplyChainPairEntry {
+  taiex_slope: number;
+  bench_slope_us: number;
+  explosive_threshold: number;
+  edge_slopes: [number | null, number | null][];
+  type1: number[];
+  type2: [string, number, string[]][];
+}
+
+function supplyChainJoin(filePath: string): SupplyChainJoin {
+  const join = JSON.parse(fs.readFileSync(filePath, 'utf-8')) as {
+    updated_at?: string;
+    us_updated_at?: string;
+    tw_updated_at?: string;
+    edges: [us: string, tw: string, name: string, role: string][];
+    tw_suppliers: Record<string, string[]>;
+    pairs: Record<string, SupplyChainPairEntry>;
+    tw?: {
+      data_source?: string;
+      latest_bar_source?: string;
+      taiex_latest_date?: string | null;
+      stocks_latest_date?: string | null;
+      symbols: Record<string, [string | null, string | null, number | null, number | null]>;
+    };
+  };
+  const memo = new Map<string, SupplyChainPair>();
+  return {
+    updatedAt: join.updated_at ?? '',
+    usUpdatedAt: join.us_updated_at ?? '',
+    twUpdatedAt: join.tw_updated_at ?? '',
+    twSuppliers: join.tw_suppliers ?? {},
+    twDataSource: join.tw?.data_source ?? 'yfinance [temporary]',
+    twLatestBarSource: join.tw?.latest_bar_source ?? join.tw?.data_source ?? 'yfinance [temporary]',
+    taiexLatestDate: join.tw?.taiex_latest_date ?? null,
+    stocksLatestDate: join.tw?.stocks_latest_date ?? null,
+    pair(date1, date2) {
+      const key = `${date1}:${date2}`;
+      const entry = join.pairs[key];
+      if (!entry) return null;
+      let out = memo.get(key);
+      if (!out) {
+        out = {
+          taiexSlope: entry.taiex_slope,
+          benchSlopeUS: entry.bench_slope_us,
+          explosiveThreshold: entry.explosive_threshold,
+          type1: entry.type1.map((k) => {
+            const [usSymbol, twTicker, supplierName, role] = join.edges[k];
+            const [usSlope, twSlope] = entry.edge_slopes[k];
+            return { usSymbol, usSlope: usSlope!, twTicker, twSlope: twSlope!, supplierName, role };
+          }),
+          type2: entry.type2.map(([twTicker, twSlope, explosiveParents]) => ({ twTicker, twSlope, explosiveParents })),
+        };
+        memo.set(key, out);
+      }
+      return out;
+    },
+    twSymbol(symbol) {
+      const row = join.tw?.symbols[symbol];
+      if (!row) return null;
+      const [name, sector, ma60, currentPrice] = row;
+      return { name, sector, ma60: ma60 !== null && currentPrice !== null ? { ma60, currentPrice } : null };
+    },
+  };
+}
+
+let residentJoin: { key: string; join: SupplyChainJoin } | null = null;
+let residentTWStamp: { key: string; updatedAt: string } | null = null;
+
+/**
+ * updated_at of tw_price_cache.json, read from the first bytes of the file:
+ * the TW updater writes it as the leading field, so the (large) cache is never
+ * parsed. '' when the file does not start with it.
+ */
+export function twCacheUpdatedAt(cachePath: string): string {
+  const key = `${cachePath}:${fs.statSync(cachePath).mtimeMs}`;
+  if (residentTWStamp?.key !== key) {
+    const fd = fs.openSync(cachePath, 'r');
+    try {
+      const head = Buffer.alloc(128);
+      const n = fs.readSync(fd, head, 0, head.length, 0);
+      const match = /^\{"updated_at":"([^"]*)"/.exec(head.toString('utf-8', 0, n));
+      residentTWStamp = { key, updatedAt: match ? match[1] : '' };
+    } finally {
+      fs.closeSync(fd);
+    }
+  }
+  return residentTWStamp.updatedAt;
+}
+
+/** data/supply_chain_join.json, kept resident; null when missing. */
+export function loadSupplyChainJoin(dataDir: string = path.join(process.cwd(), 'data')): SupplyChainJoin | null {
+  const filePath = path.join(dataDir, 'supply_chain_join.json');
+  if (!fs.existsSync(filePath)) return null;
+  const key = `${filePath}:${fs.statSync(filePath).mtimeMs}`;
+  if (residentJoin?.key !== key) {
+    residentJoin = { key, join: supplyChainJoin(filePath) };
+  }
+  return residentJoin.join;
+}
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Benchmark / index store (data/benchmarks.json) — ^TWII for the TW scanner,
+QQQ / SPY / IWM for the US scanner, kept apart from the stock caches.
+
+Each updater refreshes its own benchmarks incrementally: a symbol is fetched
+from OVERLAP_DAYS before its last bar (HISTORY_START the first time), merged
+with merge_records(), and checked for rebased history the same way as the
+stock caches (corporate_actions.py). Both caches reference the store in
+their metadata ("benchmarks") instead of carrying their own copy of it.
+
+Per symbol the store keeps:
+  dates / closes / adjustments   raw closes plus corporate-action factors
+  index                          {first, last, rows, last_close, hash}
+  calendar                       {"start", "closes"}: adjusted close forward-filled
+                                 onto every calendar day with the scanners'
+                                 findClosestPrice rules (null inside a gap longer
+                                 than MAX_GAP_DAYS), so the close on or before any
+                                 date — and a (date1, date2) benchmark slope — is
+                                 two array reads
+  returns                        {window: [% return over `window` trading days,
+                                 one per bar]} for WINDOWS
+  latest_returns                 {window: % return at the last bar}
+
+CLI:
+  python scripts/benchmark_store.py                       # summary
+  python scripts/benchmark_store.py slope QQQ 2026-01-02 2026-06-30
+"""
+
+import argparse
+import json
+import os
+from bisect import bisect_right
+from datetime import date, datetime, timedelta
+
+from corporate_actions import add_event, adjust, detect_rebase, to_raw_basis
+from price_store import DATA_DIR, Series, index_entry, merge_records
+from slope_matrix import MAX_GAP_DAYS
+
+BENCH_PATH = os.path.join(DATA_DIR, "benchmarks.json")
+TW_BENCHMARKS = ("^TWII",)
+US_BENCHMARKS = ("QQQ", "SPY", "IWM")
+WINDOWS = (5, 20, 60, 120, 250)  # trading days: 1 week, 1 / 3 / 6 months, 1 year
+HISTORY_START = "2024-01-01"     # first fetch of a benchmark
+OVERLAP_DAYS = 7                 # re-read this many days of known bars on each update
+
+
+def load_benchmarks(path: str = BENCH_PATH) -> dict:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"updated_at": "", "windows": list(WINDOWS), "series": {}}
+
+
+def save_benchmarks(store: dict, path: str = BENCH_PATH) -> None:
+    """Atomic write (the store is small; compact JSON)."""
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(store, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+def fetch_start(store: dict, symbol: str) -> str:
+    entry = store["series"].get(symbol)
+    if not entry:
+        return HISTORY_START
+    return (date.fromisoformat(entry["index"]["last"]) - timedelta(days=OVERLAP_DAYS)).isoformat()
+
+
+def derive(entry: dict) -> None:
+    """Rebuild the calendar and rolling returns from the entry's adjusted closes."""
+    series = adjust(Series(entry["dates"], entry["closes"]), entry.get("adjustments"))
+    dates, closes = series.dates, series.closes
+
+    start = date.fromisoformat(dates[0])
+    n = (date.fromisoformat(dates[-1]) - start).days + 1
+    calendar: list[float | None] = [None] * n
+    for k, (d, c) in enumerate(zip(dates, closes)):
+        i = (date.fromisoformat(d) - start).days
+        stop = n if k == len(dates) - 1 else min(
+            i + MAX_GAP_DAYS + 1, (date.fromisoformat(dates[k + 1]) - start).days)
+        calendar[i:stop] = [round(c, 4)] * (stop - i)
+    entry["calendar"] = {"start": dates[0], "closes": calendar}
+
+    returns = {}
+    for w in WINDOWS:
+        returns[str(w)] = [None] * min(w, len(closes)) + [
+            round((closes[i] / closes[i - w] - 1) * 100, 4) for i in range(w, len(closes))
+        ]
+    entry["returns"] = returns
+    entry["latest_returns"] = {w: r[-1] for w, r in returns.items()}
+
+
+def update_series(store: dict, symbol: str, market: str, new: Series) -> str:
+    """Merge freshly fetched bars; returns "new", "updated", "rebased" or "unchanged"."""
+    entry = store["series"].get(symbol)
+    if not entry:
+        entry = {"market": market, "dates": new.dates, "closes": new.closes, "adjustments": []}
+        status = "new"
+    else:
+        old = Series(entry["dates"], entry["closes"])
+        table = {symbol: entry.get("adjustments", [])}
+        status = "updated"
+        rebase = detect_rebase(old, table[symbol], new)
+        if rebase and add_event(table, symbol, *rebase, old.closes[-1]):
+            # Keep the bars we hold; append only the unseen ones
+            k = bisect_right(new.dates, old.dates[-1])
+            new = Series(new.dates[k:], new.closes[k:])
+            status = "rebased"
+        merged = merge_records(old, to_raw_basis(old, table.get(symbol), new))
+        if status == "updated" and merged.dates == old.dates and merged.closes == old.closes:
+            status = "unchanged"
+        entry.update(dates=merged.dates, closes=merged.closes, adjustments=table.get(symbol, []))
+    entry["index"] = index_entry(entry["dates"], entry["closes"])
+    derive(entry)
+    store["series"][symbol] = entry
+    return status
+
+
+def update_benchmarks(router, symbols, market: str, path: str = BENCH_PATH) -> dict:
+    """
+    Incrementally refresh `symbols` through a ProviderRouter and save the store.
+    The file is re-read right before saving and only these symbols replaced,
+    so the TW and US updaters can each maintain their own benchmarks in it.
+    """
+    store = load_benchmarks(path)
+    fetched: dict[str, Series] = {}
+    for sym in symbols:
+        start = fetch_start(store, sym)
+        try:
+            series = router.fetch([sym], start).get(sym)
+        except Exception as e:
+            print(f"  Benchmark {sym}: fetch failed ({e}); keeping stored bars", flush=True)
+            continue
+        if series:
+            fetched[sym] = series
+        else:
+            print(f"  Benchmark {sym}: no bars since {start}", flush=True)
+
+    store = load_benchmarks(path)
+    for sym, series in fetched.items():
+        status = update_series(store, sym, market, series)
+        entry = store["series"][sym]
+        print(f"  Benchmark {sym}: {status}, {entry['index']['rows']} bars through {entry['index']['last']}, "
+              f"20d {entry['latest_returns']['20']}%", flush=True)
+    store["updated_at"] = datetime.now().isoformat()
+    store["windows"] = list(WINDOWS)
+    save_benchmarks(store, path)
+    return store
+
+
+def reference(store: dict, symbols) -> dict:
+    """What a cache records about the benchmarks it was built against."""
+    return {
+        "path": os.path.basename(BENCH_PATH),
+        "updated_at": store.get("updated_at", ""),
+        "last": {sym: store["series"][sym]["index"]["last"] for sym in symbols if sym in store["series"]},
+    }
+
+
+def records(store: dict, symbol: str) -> list[dict]:
+    """Adjusted [{"date", "close"}] bars (the TW cache's legacy "taiex" layout)."""
+    entry = store["series"].get(symbol)
+    if not entry:
+        return []
+    series = adjust(Series(entry["dates"], entry["closes"]), entry.get("adjustments"))
+    return [{"date": d, "close": round(c, 4)} for d, c in zip(series.dates, series.closes)]
+
+
+def close_on(entry: dict, day: str) -> float | None:
+    """Close on or before `day` from the calendar (findClosestPrice rules)."""
+    cal = entry["calendar"]
+    i = (date.fromisoformat(day) - date.fromisoformat(cal["start"])).days
+    if i < 0:
+        return None
+    return cal["closes"][min(i, len(cal["closes"]) - 1)]
+
+
+def slope(store: dict, symbol: str, date1: str, date2: str) -> float | None:
+    """% change between the closes on or before date1 and date2."""
+    entry = store["series"].get(symbol)
+    if not entry:
+        return None
+    p1, p2 = close_on(entry, date1), close_on(entry, date2)
+    if not p1 or p2 is None:
+        return None
+    return (p2 - p1) / p1 * 100
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect the benchmark store")
+    parser.add_argument("cmd", nargs="?", default="info", choices=["info", "slope"])
+    parser.add_argument("args", nargs="*")
+    args = parser.parse_args()
+
+    store = load_benchmarks()
+    if args.cmd == "slope":
+        sym, d1, d2 = args.args
+        print(f"{sym} {d1} → {d2}: {slope(store, sym, d1, d2)}")
+        return
+    print(f"{BENCH_PATH} (updated {store.get('updated_at') or '-'})")
+    for sym, entry in sorted(store["series"].items()):
+        idx = entry["index"]
+        rets = ", ".join(f"{w}d {r}%" for w, r in entry["latest_returns"].items())
+        print(f"  {sym:6} {entry['market']:3} {idx['first']} → {idx['last']} ({idx['rows']} bars, "
+              f"{len(entry.get('adjustments', []))} adj) | {rets}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Corporate-action adjustment factors, applied lazily at read time.
+
+The caches keep every close as it was first recorded. When a split or a
+dividend later shifts a provider's history, the shift is stored as one
+event instead of rewriting every earlier bar:
+
+  adjustments = {symbol: [[ex_date, factor], …]}   ascending by ex_date
+
+An event multiplies every close dated before ex_date by factor, so the
+adjusted close on day d is raw(d) × the product of the factors of all
+events after d (adjust(); adjustmentFactor() in lib/price-store.ts). An
+incremental refresh therefore appends new bars and at most one event per
+symbol — it never has to re-download history because an ex-date passed.
+
+Providers deliver raw closes (yfinance with auto_adjust=False, FMP's
+close); every adjustment is recorded here. Events come from:
+  - the provider's own adjusted closes (ProviderSeries.events, from
+    price_providers.close_frame_to_series()): where adjusted / raw steps
+    between two bars, the bars before it were scaled by the step — how
+    yfinance's dividends reach the table (add_provider_events()).
+  - re-read overlap bars (detect_rebase()): when a provider's closes for
+    bars we already hold differ from our adjusted closes by one uniform
+    ratio, the provider rebased its history (a split); the ratio becomes
+    an event.
+  - TWSE / TPEx daily quotes (reference_factor()): close − change is the
+    exchange's ex-rights reference price, so reference / previous close is
+    the factor on an ex-date.
+
+Ratios within factor_tolerance() of 1 are treated as price rounding, not
+events: FACTOR_TOL, or a price tick over the price for cheap stocks, where
+two-decimal rounding alone moves a ratio by more than FACTOR_TOL.
+After a rebase the provider keeps returning the bars before its ex_date on
+the new basis; to_raw_basis() turns re-read bars back into raw closes
+before they are merged, so the factor is never applied twice.
+"""
+
+from bisect import bisect_left, bisect_right
+
+from price_store import Series
+
+FACTOR_TOL = 1e-3
+PRICE_TICK = 0.01  # closes carry two decimals
+RESTATE_TOL = 0.005  # providers round adjusted closes to the cent: within half a cent is the same bar
+
+
+def factor_tolerance(price: float | None) -> float:
+    """How far from 1 a ratio of closes near `price` can sit from rounding alone."""
+    if not price or price <= 0:
+        return FACTOR_TOL
+    return max(FACTOR_TOL, PRICE_TICK / price)
+
+
+def add_event(table: dict[str, list], symbol: str, ex_date: str, factor: float, price: float | None = None) -> bool:
+    """Record (ex_date, factor) for symbol; returns False when the factor is noise at `price`."""
+    tol = factor_tolerance(price)
+    if abs(factor - 1) <= tol:
+        return False
+    events = table.setdefault(symbol, [])
+    i = bisect_left([e[0] for e in events], ex_date)
+    if i < len(events) and events[i][0] == ex_date:
+        events[i][1] = round(events[i][1] * factor, 8)
+        if abs(events[i][1] - 1) <= tol:
+            # The provider undid an event we had recorded
+            del events[i]
+            if not events:
+                del table[symbol]
+    else:
+        events.insert(i, [ex_date, round(factor, 8)])
+    return True
+
+
+def prune_events(table: dict[str, list], symbol: str, first_date: str) -> None:
+    """Drop events that no longer touch a stored bar (ex_date on or before the first one)."""
+    events = table.get(symbol)
+    if not events:
+        return
+    kept = [e for e in events if e[0] > first_date]
+    if kept:
+        table[symbol] = kept
+    else:
+        del table[symbol]
+
+
+def factor_on(events: list | None, day: str) -> float:
+    """Cumulative factor for a bar dated `day`: product of the events after it."""
+    factor = 1.0
+    for ex_date, f in reversed(events or []):
+        if ex_date <= day:
+            break
+        factor *= f
+    return factor
+
+
+def adjust(series: Series, events: list | None) -> Series:
+    """Adjusted copy of series (the series itself when there are no events)."""
+    if not events:
+        return series
+    closes = list(series.closes)
+    k, factor = len(events) - 1, 1.0
+    for i in range(len(closes) - 1, -1, -1):
+        while k >= 0 and events[k][0] > series.dates[i]:
+            factor *= events[k][1]
+            k -= 1
+        if factor != 1.0:
+            closes[i] *= factor
+    return Series(series.dates, closes)
+
+
+def to_raw_basis(old: Series, events: list | None, new: Series) -> Series:
+    """
+    new's closes on old's raw basis. Re-read bars dated before an ex_date come
+    back raw, or × factor when the provider rebased its history (a split). A
+    bar that matches its held close on either basis keeps the held close
+    exactly; any other (a restatement, or a bar we never held) is read on the
+    basis the matching bars showed.
+    """
+    if not events or not new.dates:
+        return new
+    start = bisect_left(old.dates, new.dates[0])
+    held = dict(zip(old.dates[start:], old.closes[start:]))
+    factors = [factor_on(events, d) for d in new.dates]
+    rebased = any(
+        f != 1.0 and d in held and abs(c - held[d] * f) <= RESTATE_TOL < abs(c - held[d])
+        for d, c, f in zip(new.dates, new.closes, factors)
+    )
+    closes = []
+    for d, c, f in zip(new.dates, new.closes, factors):
+        prev = held.get(d)
+        if f == 1.0:
+            closes.append(c)
+        elif prev is not None and min(abs(c - prev), abs(c - prev * f)) <= RESTATE_TOL:
+            closes.append(prev)
+        else:
+            closes.append(c / f if rebased else c)
+    return Series(new.dates, closes)
+
+
+def detect_rebase(old: Series, events: list | None, new: Series) -> tuple[str, float] | None:
+    """
+    Compare the bars `new` re-reads (dated up to old's last bar) with old's
+    adjusted closes. A rebase shows as ratios f, …, f followed by 1, …, 1:
+    returns (ex_date, f), ex_date being the first re-read bar already on the
+    new basis, or new's first unseen bar. None when the re-read bars agree,
+    when they differ non-uniformly (a restatement), or when there is no bar
+    to anchor the event on yet.
+    """
+    n = bisect_right(new.dates, old.dates[-1])
+    start = bisect_left(old.dates, new.dates[0]) if n else 0
+    held = dict(zip(old.dates[start:], old.closes[start:]))
+    ratios = []
+    for d, c in zip(new.dates[:n], new.closes[:n]):
+        prev = held.get(d)
+        if prev:
+            tol = factor_tolerance(c)
+            # A raw re-read (the usual case) agrees with the held close itself
+            ratio = 1.0 if abs(c / prev - 1) <= tol else c / (prev * factor_on(events, d))
+            ratios.append((d, ratio, tol))
+    if not ratios or abs(ratios[0][1] - 1) <= ratios[0][2]:
+        return None
+
+    f = ratios[0][1]
+    s = 0
+    while s < len(ratios) and abs(ratios[s][1] / f - 1) <= ratios[s][2]:
+        s += 1
+    if any(abs(r - 1) > tol for _, r, tol in ratios[s:]):
+        return None
+    if s < len(ratios):
+        return ratios[s][0], f
+    if n < len(new):
+        return new.dates[n], f
+    return None
+
+
+def add_provider_events(table: dict[str, list], symbol: str, series: Series, after: str | None = None) -> int:
+    """
+    Record the events a provider reported with `series` (ProviderSeries.events)
+    whose ex_date is after `after` — older ones are already in the table.
+    Returns how many were recorded.
+    """
+    added = 0
+    for ex_date, factor in getattr(series, "events", None) or []:
+        if after is not None and ex_date <= after:
+            continue
+        i = bisect_left(series.dates, ex_date)
+        price = series.closes[i - 1] if i else None
+        added += add_event(table, symbol, ex_date, factor, price)
+    return added
+
+
+def reference_factor(prev_close: float, reference: float) -> float:
+    """Factor implied by an exchange reference price (1.0 when either side is unknown)."""
+    if prev_close > 0 and reference > 0:
+        return reference / prev_close
+    return 1.0
@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""
+Shared FMP HTTP client for the cache updaters.
+
+One pooled requests.Session per process: keep-alive connections (so a
+1,500-symbol run reuses a handful of TCP+TLS connections instead of opening
+one per symbol), gzip negotiation, and a configurable pool size.
+
+429s, 5xx responses and connection errors are retried in place (up to
+`retries` times, honouring Retry-After but never waiting less than a
+backoff step, otherwise jittered exponential backoff). With an AdaptiveThrottle attached, every outcome also feeds its
+AIMD concurrency window, so the client settles just under the real limit.
+
+Environment:
+  FMP_API_KEY    API key
+  FMP_BASE_URL   override the API host (e.g. the local stub below)
+  FMP_POOL_SIZE  max pooled connections per host (default 16)
+
+Offline benchmarking:
+  python scripts/fmp_client.py stub  --port 8765 --latency-ms 40 [--rps 100 --error-rate 0.01]
+  python scripts/fmp_client.py bench --base-url http://127.0.0.1:8765 -n 500
+"""
+
+import argparse
+import csv
+import gzip
+import io
+import json
+import os
+import random
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from price_store import synthetic_close
+from rate_limit import AdaptiveThrottle, TokenBucket, backoff_delay, retry_after_seconds
+
+API_KEY = os.environ.get("FMP_API_KEY", "3c03eZvjdPpKONYydbgoAT9chCaQDnsp")
+BASE_URL = os.environ.get("FMP_BASE_URL", "https://financialmodelingprep.com")
+POOL_SIZE = int(os.environ.get("FMP_POOL_SIZE", "16"))
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class FMPClient:
+    """Thin wrapper over a pooled keep-alive session; optionally rate limited."""
+
+    def __init__(
+        self,
+        api_key: str = API_KEY,
+        base_url: str = BASE_URL,
+        pool_size: int = POOL_SIZE,
+        limiter: TokenBucket | None = None,
+        timeout: float = 30,
+        throttle: AdaptiveThrottle | None = None,
+        retries: int = 3,
+    ):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.limiter = limiter
+        self.timeout = timeout
+        self.throttle = throttle
+        self.retries = retries
+        self.retried = 0  # requests re-sent after a 429 / 5xx / connection error
+        self.session = requests.Session()
+        # pool_block: extra threads wait for a free connection instead of
+        # opening throwaway ones that are discarded after a single request.
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size, pool_block=True)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "Accept-Encoding": "gzip, deflate",
+            "Connection": "keep-alive",
+            "User-Agent": "13f-tracker-cache-updater",
+        })
+
+    def _get(self, path: str, params: dict, headers: dict | None = None) -> requests.Response:
+        params["apikey"] = self.api_key
+        url = f"{self.base_url}{path}"
+        attempt = 0
+        while True:
+            if self.limiter is not None:
+                self.limiter.acquire()
+            if self.throttle is not None:
+                self.throttle.acquire()
+            resp, retry_after = None, None
+            try:
+                resp = self.session.get(url, params=params, headers=headers, timeout=self.timeout)
+                retry_after = retry_after_seconds(resp.headers.get("Retry-After"))
+                if retry_after is not None and resp.status_code in RETRY_STATUS:
+                    # Retry-After: 0 (or a past date) must not mean an immediate retry
+                    retry_after = max(retry_after, backoff_delay(attempt + 1))
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= self.retries:
+                    raise
+            finally:
+                # Exactly one release per acquire, whatever the request raised
+                if self.throttle is not None:
+                    self.throttle.release(resp is not None and resp.status_code not in RETRY_STATUS, retry_after)
+            retryable = resp is None or resp.status_code in RETRY_STATUS
+            if not retryable or attempt >= self.retries:
+                resp.raise_for_status()
+                return resp
+            attempt += 1
+            self.retried += 1
+            # With a throttle, Retry-After already pauses every caller in acquire()
+            if retry_after is None or self.throttle is None:
+                time.sleep(retry_after if retry_after is not None else backoff_delay(attempt))
+
+    def get_json(self, path: str, **params) -> list | dict:
+        """GET {base_url}{path}?{params}&apikey=… and decode JSON."""
+        return self._get(path, params).json()
+
+    def get_json_conditional(self, path: str, validators: dict | None, **params) -> tuple[list | dict | None, dict]:
+        """
+        Conditional GET: sends If-None-Match / If-Modified-Since from `validators`
+        ({"etag", "last_modified"} saved from an earlier response). Returns
+        (None, validators) on 304, else (payload, the response's validators).
+        """
+        validators = validators or {}
+        headers = {}
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+        resp = self._get(path, params, headers)
+        if resp.status_code == 304:
+            return None, validators
+        fresh = {"etag": resp.headers.get("ETag"), "last_modified": resp.headers.get("Last-Modified")}
+        return resp.json(), {k: v for k, v in fresh.items() if v}
+
+    def historical_eod(self, symbol: str, from_date: str) -> list:
+        """Daily EOD bars for `symbol` since `from_date` (newest first, as FMP returns them)."""
+        data = self.get_json("/stable/historical-price-eod/full", symbol=symbol, **{"from": from_date})
+        return data if isinstance(data, list) else []
+
+    def eod_bulk(self, day: str, symbols: set[str] | None = None) -> dict[str, dict]:
+        """
+        One day's EOD bar for every listed symbol in a single request
+        (/stable/eod-bulk, served as CSV). Returns {symbol: row}, optionally
+        restricted to `symbols`; empty when the day has no bars (holiday, or
+        not yet published).
+        """
+        resp = self._get("/stable/eod-bulk", {"date": day})
+        if "json" in resp.headers.get("Content-Type", ""):
+            rows = resp.json()
+            rows = rows if isinstance(rows, list) else []
+        else:
+            rows = csv.DictReader(io.StringIO(resp.text))
+        out: dict[str, dict] = {}
+        for r in rows:
+            sym = r.get("symbol")
+            if sym and r.get("close") not in (None, "") and (symbols is None or sym in symbols):
+                out[sym] = {"date": r.get("date") or day, "close": float(r["close"])}
+        return out
+
+    def close(self) -> None:
+        self.session.close()
+
+
+# ─────────────────────────────────────────────────────────
+# Local stub server — serves synthetic FMP-shaped payloads for offline benchmarks
+# ─────────────────────────────────────────────────────────
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+    disable_nagle_algorithm = True  # headers and body go out as separate writes
+    latency = 0.0
+    rps = 0          # per-second request cap; 0 = unlimited
+    error_rate = 0.0  # fraction of requests answered with a 503
+    connections = 0
+    _window = [0, 0]  # [second, requests served in it]
+    _lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        with _StubHandler._lock:
+            _StubHandler.connections += 1
+
+    def log_message(self, format, *args):  # noqa: A002 — silence per-request logging
+        pass
+
+    def _reject(self) -> bool:
+        """Simulate plan limits: 429 + Retry-After past `rps`, random 503s at `error_rate`."""
+        if self.error_rate and random.random() < self.error_rate:
+            self._send_status(503)
+            return True
+        if self.rps:
+            now = int(time.time())
+            with _StubHandler._lock:
+                if self._window[0] != now:
+                    self._window[:] = [now, 0]
+                self._window[1] += 1
+                over = self._window[1] > self.rps
+            if over:
+                self._send_status(429, {"Retry-After": "1"})
+                return True
+        return False
+
+    def _send_status(self, code: int, headers: dict | None = None) -> None:
+        self.send_response(code)
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        qs = {k: v[0] for k, v in parse_qs(url.query).items()}
+        if self.latency:
+            time.sleep(self.latency)
+        if url.path != "/stub/stats" and self._reject():
+            return
+
+        if url.path == "/stub/stats":
+            payload = {"connections": _StubHandler.connections}
+        elif url.path == "/stable/sp500-constituent":
+            payload = [{"symbol": f"S{i:03d}"} for i in range(500)]
+        elif url.path == "/stable/company-screener":
+            payload = [
+                {"symbol": f"N{i:04d}", "country": "US", "sector": "Technology", "isEtf": False, "isFund": False}
+                for i in range(1000)
+            ]
+        elif url.path == "/stable/historical-price-eod/full":
+            payload = _stub_bars(qs.get("symbol", "X"), qs.get("from"))
+        elif url.path == "/stable/eod-bulk":
+            payload = _stub_bulk_csv(qs.get("date", date.today().isoformat()))
+        else:
+            self.send_error(404)
+            return
+
+        if isinstance(payload, str):
+            body, content_type = payload.encode(), "text/csv"
+        else:
+            body, content_type = json.dumps(payload).encode(), "application/json"
+        etag = f'"{zlib.crc32(body):08x}"'
+        if self.headers.get("If-None-Match") == etag:
+            self._send_status(304, {"ETag": etag})
+            return
+        encoding = None
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            body, encoding = gzip.compress(body, compresslevel=5), "gzip"
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        if encoding:
+            self.send_header("Content-Encoding", encoding)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+_STUB_UNIVERSE = (
+    [f"S{i:03d}" for i in range(500)] + [f"N{i:04d}" for i in range(1000)] + ["QQQ", "SPY", "IWM"]
+)
+
+
+def _stub_bars(symbol: str, from_date: str | None) -> list[dict]:
+    """Weekday bars for `symbol`, newest first."""
+    end = date.today()
+    start = date.fromisoformat(from_date) if from_date else end - timedelta(days=550)
+    bars = []
+    d = start
+    while d <= end:
+        if d.weekday() < 5:
+            bars.append({"symbol": symbol, "date": d.isoformat(), "close": synthetic_close(symbol, d)})
+        d += timedelta(days=1)
+    bars.reverse()
+    return bars
+
+
+def _stub_bulk_csv(day: str) -> str:
+    """One day's bars for the stub universe; ~2% of symbols are missing to exercise gap fallback."""
+    d = date.fromisoformat(day)
+    lines = ["symbol,date,open,low,high,close,adjClose,volume"]
+    if d.weekday() < 5 and d <= date.today():
+        for sym in _STUB_UNIVERSE:
+            if zlib.crc32(f"{sym}{day}".encode()) % 50:
+                c = synthetic_close(sym, d)
+                lines.append(f"{sym},{day},{c},{c},{c},{c},{c},1000")
+    return "\n".join(lines) + "\n"
+
+
+def run_stub(port: int, latency_ms: float, rps: int = 0, error_rate: float = 0.0) -> None:
+    _StubHandler.latency = latency_ms / 1000
+    _StubHandler.rps = rps
+    _StubHandler.error_rate = error_rate
+    server = ThreadingHTTPServer(("127.0.0.1", port), _StubHandler)
+    limits = f", {rps} req/s cap" if rps else ""
+    limits += f", {error_rate:.0%} 503s" if error_rate else ""
+    print(f"FMP stub listening on http://127.0.0.1:{port} (latency {latency_ms:.0f} ms{limits})", flush=True)
+    print(f"  FMP_BASE_URL=http://127.0.0.1:{port} python scripts/update_slope_cache.py", flush=True)
+    server.serve_forever()
+
+
+def run_bench(base_url: str, n: int, workers: int) -> None:
+    """Time n symbol fetches with bare requests.get vs the pooled client."""
+    from_date = (date.today() - timedelta(days=30)).isoformat()
+    symbols = [f"B{i:04d}" for i in range(n)]
+
+    def stub_connections() -> int:
+        return requests.get(f"{base_url}/stub/stats", timeout=10).json()["connections"]
+
+    def bare(sym: str) -> None:
+        url = f"{base_url}/stable/historical-price-eod/full?symbol={sym}&from={from_date}&apikey=x"
+        requests.get(url, timeout=30).json()
+
+    client = FMPClient(api_key="x", base_url=base_url, pool_size=workers)
+    runs = [("bare requests.get", bare), ("pooled FMPClient", lambda s: client.historical_eod(s, from_date))]
+    for label, fn in runs:
+        before = stub_connections()
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(fn, symbols))
+        elapsed = time.perf_counter() - t0
+        opened = stub_connections() - before - 1  # minus the stats probe itself
+        print(f"  {label:<18} {n} req in {elapsed:6.2f}s ({n / elapsed:7.1f} req/s), {opened} connections", flush=True)
+    client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FMP client utilities")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    stub = sub.add_parser("stub", help="run a local FMP stub server")
+    stub.add_argument("--port", type=int, default=8765)
+    stub.add_argument("--latency-ms", type=float, default=40)
+    stub.add_argument("--rps", type=int, default=0, help="answer 429 above this many requests/second")
+    stub.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered 503")
+    bench = sub.add_parser("bench", help="benchmark bare vs pooled requests against a base URL")
+    bench.add_argument("--base-url", default="http://127.0.0.1:8765")
+    bench.add_argument("-n", type=int, default=500)
+    bench.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+
+    if args.cmd == "stub":
+        run_stub(args.port, args.latency_ms, args.rps, args.error_rate)
+    else:
+        run_bench(args.base_url, args.n, args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+"""
+Rolling indicator tables (data/indicators_us.json, data/indicators_tw.json) —
+the last stage of both cache updaters.
+
+One compact row per symbol, the values at its latest bar:
+
+  asof, close            date and adjusted close of the latest bar
+  sma20, sma60           simple moving averages
+  atr14                  mean absolute close-to-close move over 14 bars
+  high20 … low250        rolling highest / lowest close (RANGE_WINDOWS)
+  drawdown               % below the 250-bar high (≤ 0)
+
+A value is null while the symbol has fewer bars than its window. The caches
+hold closes only (no high/low), so ATR14 is the close-only range
+|close − previous close|, which runs smaller than a high/low true range.
+The table says so in "atr_basis" (ATR_BASIS); readers whose signal is
+defined on the high/low true range (the oversold scanner) must not use it.
+
+Stateful engine: next to each table, data/indicator_state_{us,tw}.json
+keeps per symbol the running window sums, the running ATR sum, a monotonic
+deque per rolling high / low (entries [seq, close], front = extreme of the
+window) and a ring of the last RING_BARS closes (what the sums drop as the
+windows slide). A run that appends bars pushes each one through
+IndicatorState.push() — O(1) amortised per bar, whatever the history length.
+The state is rebuilt from the symbol's last RING_BARS bars only when its
+adjustment events changed or its last VERIFY_BARS held bars no longer match
+(a restatement in the re-read overlap).
+
+Closes are kept as integer ticks (1/TICK of a price unit), so the running
+sums are exact and a row derived from the state is bit-for-bit the row
+computed from scratch (scratch_row()); --replay checks exactly that for
+every symbol.
+
+CLI:
+  python scripts/indicators.py us              # summary
+  python scripts/indicators.py tw 2330.TW      # one row
+  python scripts/indicators.py tw --replay     # recompute from scratch, compare with the state
+"""
+
+import argparse
+import json
+import os
+from bisect import bisect_right
+from collections import deque
+from datetime import datetime
+
+from corporate_actions import adjust
+from price_store import DATA_DIR, Series
+
+INDICATOR_PATHS = {
+    "US": os.path.join(DATA_DIR, "indicators_us.json"),
+    "TW": os.path.join(DATA_DIR, "indicators_tw.json"),
+}
+STATE_PATHS = {
+    "US": os.path.join(DATA_DIR, "indicator_state_us.json"),
+    "TW": os.path.join(DATA_DIR, "indicator_state_tw.json"),
+}
+SMA_WINDOWS = (20, 60)
+ATR_WINDOW = 14
+RANGE_WINDOWS = (20, 60, 250)
+DRAWDOWN_WINDOW = 250  # one of RANGE_WINDOWS: drawdown reads that window's high
+RING_BARS = max(SMA_WINDOWS + RANGE_WINDOWS + (ATR_WINDOW + 1,)) + 1
+VERIFY_BARS = 10       # held bars re-checked before appending (covers the updaters' re-read overlap)
+TICK = 10_000          # closes in 1/10000 units: integer sums are exact
+ATR_BASIS = "close"    # atr14 from closes only; "true_range" once the caches carry high/low
+FIELDS = (
+    ["asof", "close"]
+    + [f"sma{w}" for w in SMA_WINDOWS]
+    + [f"atr{ATR_WINDOW}"]
+    + [f"{side}{w}" for w in RANGE_WINDOWS for side in ("high", "low")]
+    + ["drawdown"]
+)
+
+
+def to_ticks(close: float) -> int:
+    return round(close * TICK)
+
+
+def _price(ticks: int) -> float:
+    return round(ticks / TICK, 4)
+
+
+def _mean(total: int, n: int) -> float:
+    return round(total / n / TICK, 4)
+
+
+def _drawdown(close: int, high: int) -> float | None:
+    return round((close / high - 1) * 100, 4) if high > 0 else None
+
+
+# ─────────────────────────────────────────────────────────
+# Stateful engine
+# ─────────────────────────────────────────────────────────
+class IndicatorState:
+    """Running sums and monotonic deques for one symbol; push() is O(1) amortised."""
+
+    def __init__(self, events: list | None = None):
+        self.events = events or []
+        self.asof = ""
+        self.seq = -1  # sequence number of the last pushed bar
+        self.ring: deque[int] = deque(maxlen=RING_BARS)
+        self.sums = {w: 0 for w in SMA_WINDOWS}
+        self.atr_sum = 0
+        self.highs: dict[int, deque] = {w: deque() for w in RANGE_WINDOWS}
+        self.lows: dict[int, deque] = {w: deque() for w in RANGE_WINDOWS}
+
+    def push(self, day: str, close: float) -> None:
+        t = to_ticks(close)
+        ring = self.ring
+        if ring:
+            self.atr_sum += abs(t - ring[-1])
+        self.seq += 1
+        ring.append(t)
+        n = self.seq + 1
+        for w in SMA_WINDOWS:
+            self.sums[w] += t
+            if n > w:
+                self.sums[w] -= ring[-w - 1]
+        if n > ATR_WINDOW + 1:
+            # The move leaving the window: bar seq−ATR_WINDOW against the one before it
+            self.atr_sum -= abs(ring[-ATR_WINDOW - 1] - ring[-ATR_WINDOW - 2])
+        for w in RANGE_WINDOWS:
+            highs, lows = self.highs[w], self.lows[w]
+            while highs and highs[-1][1] <= t:
+                highs.pop()
+            while lows and lows[-1][1] >= t:
+                lows.pop()
+            highs.append((self.seq, t))
+            lows.append((self.seq, t))
+            if highs[0][0] <= self.seq - w:
+                highs.popleft()
+            if lows[0][0] <= self.seq - w:
+                lows.popleft()
+        self.asof = day
+
+    def row(self) -> list:
+        n = self.seq + 1
+        t = self.ring[-1]
+        row = [self.asof, _price(t)]
+        row += [_mean(self.sums[w], w) if n >= w else None for w in SMA_WINDOWS]
+        row.append(_mean(self.atr_sum, ATR_WINDOW) if n > ATR_WINDOW else None)
+        for w in RANGE_WINDOWS:
+            row += [_price(self.highs[w][0][1]), _price(self.lows[w][0][1])] if n >= w else [None, None]
+        row.append(_drawdown(t, self.highs[DRAWDOWN_WINDOW][0][1]) if n >= DRAWDOWN_WINDOW else None)
+        return row
+
+    def matches(self, series: Series) -> bool:
+        """True when `series` still holds our last VERIFY_BARS bars, unchanged after adjustment."""
+        k = bisect_right(series.dates, self.asof)
+        if k == 0 or series.dates[k - 1] != self.asof:
+            return False
+        m = min(VERIFY_BARS, len(self.ring), k)
+        held = adjust(Series(series.dates[k - m:k], series.closes[k - m:k]), self.events)
+        return [to_ticks(c) for c in held.closes] == list(self.ring)[-m:]
+
+    def to_dict(self) -> dict:
+        return {
+            "events": self.events,
+            "asof": self.asof,
+            "seq": self.seq,
+            "ring": list(self.ring),
+            "sums": {str(w): s for w, s in self.sums.items()},
+            "atr_sum": self.atr_sum,
+            "highs": {str(w): [list(e) for e in dq] for w, dq in self.highs.items()},
+            "lows": {str(w): [list(e) for e in dq] for w, dq in self.lows.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "IndicatorState":
+        st = cls(d["events"])
+        st.asof, st.seq, st.atr_sum = d["asof"], d["seq"], d["atr_sum"]
+        st.ring.extend(d["ring"])
+        st.sums = {w: d["sums"][str(w)] for w in SMA_WINDOWS}
+        st.highs = {w: deque(tuple(e) for e in d["highs"][str(w)]) for w in RANGE_WINDOWS}
+        st.lows = {w: deque(tuple(e) for e in d["lows"][str(w)]) for w in RANGE_WINDOWS}
+        return st
+
+    @classmethod
+    def build(cls, series: Series, events: list | None) -> "IndicatorState":
+        """Fresh state from the last RING_BARS bars (anything older is outside every window)."""
+        st = cls(events)
+        tail = adjust(Series(series.dates[-RING_BARS:], series.closes[-RING_BARS:]), events)
+        for d, c in zip(tail.dates, tail.closes):
+            st.push(d, c)
+        return st
+
+
+def scratch_row(series: Series, events: list | None) -> list:
+    """The latest bar's row computed directly from the bars, without any state."""
+    tail = adjust(Series(series.dates[-RING_BARS:], series.closes[-RING_BARS:]), events)
+    ticks = [to_ticks(c) for c in tail.closes]
+    n = len(ticks)
+    row = [tail.dates[-1], _price(ticks[-1])]
+    row += [_mean(sum(ticks[-w:]), w) if n >= w else None for w in SMA_WINDOWS]
+    moves = [abs(ticks[i] - ticks[i - 1]) for i in range(max(1, n - ATR_WINDOW), n)]
+    row.append(_mean(sum(moves), ATR_WINDOW) if n > ATR_WINDOW else None)
+    for w in RANGE_WINDOWS:
+        row += [_price(max(ticks[-w:])), _price(min(ticks[-w:]))] if n >= w else [None, None]
+    row.append(_drawdown(ticks[-1], max(ticks[-DRAWDOWN_WINDOW:])) if n >= DRAWDOWN_WINDOW else None)
+    return row
+
+
+# ─────────────────────────────────────────────────────────
+# Tables
+# ─────────────────────────────────────────────────────────
+def _load_json(path: str) -> dict:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_json(payload: dict, path: str) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+def load_table(path: str) -> dict:
+    table = _load_json(path)
+    if table.get("fields") == FIELDS:
+        return table
+    return {"fields": FIELDS, "rows": {}}
+
+
+def load_states(path: str) -> dict[str, IndicatorState]:
+    saved = _load_json(path)
+    if saved.get("fields") != FIELDS or saved.get("tick") != TICK:
+        return {}  # missing or another layout: every symbol is rebuilt
+    return {sym: IndicatorState.from_dict(d) for sym, d in saved.get("states", {}).items()}
+
+
+def update_indicators(market: str, prices: dict[str, Series], adjustments: dict[str, list],
+                      source_updated_at: str = "") -> dict:
+    """
+    Bring the market's state and table in line with `prices`: push appended
+    bars, rebuild symbols whose events or held bars changed, drop symbols no
+    longer present, save both. Returns {"appended", "rebuilt", "unchanged",
+    "dropped", "bars"} (bars = bars pushed incrementally).
+    """
+    states = load_states(STATE_PATHS[market])
+    stats = {"appended": 0, "rebuilt": 0, "unchanged": 0, "dropped": 0, "bars": 0}
+    stats["dropped"] = sum(1 for sym in states if sym not in prices)
+
+    rows: dict[str, list] = {}
+    kept: dict[str, IndicatorState] = {}
+    for sym in sorted(prices):
+        series = prices[sym]
+        if not len(series):
+            continue
+        events = adjustments.get(sym) or []
+        st = states.get(sym)
+        if st is not None and st.events == events and st.matches(series):
+            k = bisect_right(series.dates, st.asof)
+            if k < len(series):
+                new = adjust(Series(series.dates[k:], series.closes[k:]), events)
+                for d, c in zip(new.dates, new.closes):
+                    st.push(d, c)
+                stats["appended"] += 1
+                stats["bars"] += len(new)
+            else:
+                stats["unchanged"] += 1
+        else:
+            st = IndicatorState.build(series, events)
+            stats["rebuilt"] += 1
+        kept[sym] = st
+        rows[sym] = st.row()
+
+    now = datetime.now().isoformat()
+    _save_json({
+        "updated_at": now, "market": market, "fields": FIELDS, "tick": TICK,
+        "states": {sym: st.to_dict() for sym, st in kept.items()},
+    }, STATE_PATHS[market])
+    _save_json({
+        "updated_at": now, "source_updated_at": source_updated_at, "market": market,
+        "atr_basis": ATR_BASIS, "fields": FIELDS, "rows": rows,
+    }, INDICATOR_PATHS[market])
+    return stats
+
+
+# ─────────────────────────────────────────────────────────
+# Replay — from-scratch recompute against the stored state
+# ─────────────────────────────────────────────────────────
+def load_market(market: str) -> tuple[dict[str, Series], dict[str, list]]:
+    """The market's current prices and adjustment events, as the updaters hold them."""
+    if market == "US":
+        from price_store import STORE_PATH, load_store
+        cache = load_store(STORE_PATH)
+        return cache.prices, cache.meta.get("adjustments", {})
+    with open(os.path.join(DATA_DIR, "tw_price_cache.json"), encoding="utf-8") as f:
+        cache = json.load(f)
+    prices = {
+        sym: Series([r["date"] for r in v], [r["close"] for r in v])
+        for sym, v in cache.get("prices", {}).items() if v
+    }
+    return prices, cache.get("adjustments") or {}
+
+
+def replay(market: str) -> list[str]:
+    """Symbols whose state row differs from a from-scratch recompute (should be none)."""
+    prices, adjustments = load_market(market)
+    states = load_states(STATE_PATHS[market])
+    mismatched = []
+    for sym, series in sorted(prices.items()):
+        st = states.get(sym)
+        if st is None or st.row() != scratch_row(series, adjustments.get(sym)):
+            mismatched.append(sym)
+    return mismatched
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or verify an indicator table")
+    parser.add_argument("market", choices=["us", "tw"])
+    parser.add_argument("symbol", nargs="?")
+    parser.add_argument("--replay", action="store_true",
+                        help="recompute every row from scratch and compare with the stored state")
+    args = parser.parse_args()
+
+    market = args.market.upper()
+    if args.replay:
+        mismatched = replay(market)
+        print(f"replay {market}: {len(load_states(STATE_PATHS[market]))} states, "
+              f"{len(mismatched)} mismatched {mismatched[:20]}")
+        raise SystemExit(1 if mismatched else 0)
+
+    path = INDICATOR_PATHS[market]
+    table = load_table(path)
+    if args.symbol:
+        row = table["rows"].get(args.symbol)
+        print(dict(zip(FIELDS, row)) if row else f"{args.symbol}: not in {path}")
+        return
+    rows = table["rows"].values()
+    filled = {f: sum(r[i] is not None for r in rows) for i, f in enumerate(FIELDS)}
+    print(f"{path} (updated {table.get('updated_at') or '-'}): {len(table['rows'])} symbols")
+    print("  non-null: " + ", ".join(f"{f} {n}" for f, n in filled.items() if f not in ("asof", "close")))
+
+
+if __name__ == "__main__":
+    main()
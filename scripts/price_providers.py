@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+"""
+Pluggable daily-close providers shared by both updaters.
+
+Each provider declares what it can do (Capabilities): which markets it
+covers, how many symbols one request can carry, how far back its history
+goes, its request rate, and a relative cost per symbol. ProviderRouter sends
+every symbol to the cheapest provider that can serve it, and when a
+provider raises or comes back without a symbol, the symbol fails over to
+the next capable provider.
+
+Providers:
+  fmp       FMP historical EOD (US stocks/ETFs, ^ indices), one symbol per request
+  yfinance  yfinance batch download (TW .TW/.TWO, US, ^ indices), per-ticker requests;
+            one download at a time per process, each on its own thread pool
+  fixture   deterministic offline bars, or a JSON fixture file (PRICE_FIXTURE_PATH)
+
+PRICE_PROVIDERS (comma-separated names) overrides the set an updater uses,
+e.g. PRICE_PROVIDERS=fixture for an offline run.
+
+All providers return {symbol: Series} with ascending, unquantized raw
+closes — no dividend adjustment; corporate_actions.py owns all of it.
+yfinance returns ProviderSeries, which also carry the dividend events its
+adjusted closes imply. Symbols a provider has no bars for are simply absent.
+"""
+
+import json
+import os
+import threading
+from abc import ABC, abstractmethod
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+
+from corporate_actions import FACTOR_TOL, PRICE_TICK
+from price_store import Series, synthetic_close
+from rate_limit import TokenBucket
+
+PROVIDER_ENV = "PRICE_PROVIDERS"
+
+
+def market_of(symbol: str) -> str:
+    if symbol.startswith("^"):
+        return "INDEX"
+    if symbol.endswith((".TW", ".TWO")):
+        return "TW"
+    return "US"
+
+
+@dataclass(slots=True)
+class ProviderSeries(Series):
+    """Series plus the corporate-action events the provider reported over its dates ([[ex_date, factor], …])."""
+    events: list = field(default_factory=list)
+
+
+@dataclass(frozen=True)
+class Capabilities:
+    markets: frozenset[str]
+    batch_size: int               # symbols per fetch() call
+    history_days: int             # oldest start date it can serve, in days back from today
+    requests_per_minute: float    # 0 = paced elsewhere (e.g. the FMP client's own limiter)
+    cost_per_symbol: float        # relative quota cost; the router prefers the lowest
+
+
+class PriceProvider(ABC):
+    name = "base"
+
+    def __init__(self, caps: Capabilities):
+        self.caps = caps
+
+    def can_serve(self, symbol: str, start: str) -> bool:
+        depth = (date.today() - date.fromisoformat(start)).days
+        return market_of(symbol) in self.caps.markets and depth <= self.caps.history_days
+
+    @abstractmethod
+    def fetch(self, symbols: list[str], start: str, end: str | None = None) -> dict[str, Series]:
+        """Bars in [start, end) for up to caps.batch_size symbols; raises if the request fails."""
+
+
+# ─────────────────────────────────────────────────────────
+# FMP
+# ─────────────────────────────────────────────────────────
+class FMPProvider(PriceProvider):
+    name = "fmp"
+
+    def __init__(self, client):
+        super().__init__(Capabilities(
+            markets=frozenset({"US", "INDEX"}),
+            batch_size=1,
+            history_days=365 * 30,
+            requests_per_minute=0,  # FMPClient carries the token bucket / adaptive throttle
+            cost_per_symbol=1.0,
+        ))
+        self.client = client
+
+    def fetch(self, symbols, start, end=None):
+        out = {}
+        for sym in symbols:
+            # FMP returns bars newest first
+            bars = [r for r in self.client.historical_eod(sym, start) if "date" in r and "close" in r]
+            bars.reverse()
+            if end:
+                bars = [r for r in bars if r["date"] < end]
+            if bars:
+                out[sym] = Series([r["date"] for r in bars], [float(r["close"]) for r in bars])
+        return out
+
+
+# ─────────────────────────────────────────────────────────
+# yfinance
+# ─────────────────────────────────────────────────────────
+def close_frame_to_series(close_df, adj_df=None) -> dict[str, Series]:
+    """
+    Whole Close frame (dates × tickers) in one pass: the shared date index is
+    formatted once, closes are rounded as one numpy array, and each ticker is
+    a single boolean-mask slice — no per-row strftime / round / dict.
+
+    With the matching Adj Close frame, each ticker becomes a ProviderSeries
+    whose events are the steps of adj / close between consecutive bars
+    (beyond rounding at that price, as corporate_actions.factor_tolerance()).
+    """
+    import numpy as np
+
+    index = close_df.index
+    if getattr(index, "tz", None) is not None:
+        index = index.tz_localize(None)
+    dates = np.asarray(index.strftime("%Y-%m-%d"), dtype=object)
+    raw = close_df.to_numpy(dtype="float64")
+    values = raw.round(2)
+    present = ~np.isnan(values)
+    adj = adj_df[list(close_df.columns)].to_numpy(dtype="float64") if adj_df is not None else None
+    out: dict[str, Series] = {}
+    for j in np.flatnonzero(present.any(axis=0)):
+        mask = present[:, j]
+        if adj is None:
+            out[close_df.columns[j]] = Series(dates[mask].tolist(), values[mask, j].tolist())
+            continue
+        with np.errstate(invalid="ignore"):
+            ok = mask & (adj[:, j] > 0) & (raw[:, j] > 0)
+        c, ratio = raw[ok, j], adj[ok, j] / raw[ok, j]
+        step = ratio[:-1] / ratio[1:]
+        hits = np.flatnonzero(np.abs(step - 1) > np.maximum(FACTOR_TOL, PRICE_TICK / c[:-1]))
+        ex_dates = dates[ok][hits + 1]
+        events = [[d, round(float(step[k]), 8)] for d, k in zip(ex_dates, hits)]
+        out[close_df.columns[j]] = ProviderSeries(dates[mask].tolist(), values[mask, j].tolist(), events)
+    return out
+
+
+# yf.download() resets and fills module-level state (yfinance.shared._DFS /
+# _ERRORS), so two overlapping calls overwrite each other's results. Calls are
+# serialized process-wide; the parallelism comes from download's own threads.
+_YF_DOWNLOAD_LOCK = threading.Lock()
+
+
+class YFinanceProvider(PriceProvider):
+    name = "yfinance"
+
+    def __init__(self, requests_per_minute: float = 2000, batch_size: int = 100, threads: int = 4):
+        import pandas as pd
+        import yfinance as yf
+
+        super().__init__(Capabilities(
+            markets=frozenset({"TW", "US", "INDEX"}),
+            batch_size=batch_size,
+            history_days=365 * 30,
+            requests_per_minute=requests_per_minute,
+            cost_per_symbol=1.5,  # unofficial source: only preferred where FMP can't serve
+        ))
+        self._yf, self._pd = yf, pd
+        self.threads = threads
+        # yfinance requests each ticker separately, so pace per ticker
+        self.limiter = TokenBucket(requests_per_minute, burst=batch_size)
+
+    def fetch(self, symbols, start, end=None):
+        self.limiter.acquire(len(symbols))
+        with _YF_DOWNLOAD_LOCK:
+            # Raw closes (Yahoo's are split- but not dividend-adjusted); the
+            # dividends come back as events from the Adj Close column
+            data = self._yf.download(symbols, start=start, end=end, auto_adjust=False, progress=False,
+                                     threads=self.threads)
+        if data is None or data.empty:
+            return {}
+        if isinstance(data.columns, self._pd.MultiIndex):
+            close_df, adj_df = data["Close"], data.get("Adj Close")
+        elif "Close" in data.columns:
+            close_df = data[["Close"]]
+            close_df.columns = symbols[:1]
+            adj_df = data[["Adj Close"]] if "Adj Close" in data.columns else None
+            if adj_df is not None:
+                adj_df.columns = symbols[:1]
+        else:
+            return {}
+        return close_frame_to_series(close_df, adj_df)
+
+
+# ─────────────────────────────────────────────────────────
+# Fixture — offline tests
+# ─────────────────────────────────────────────────────────
+class FixtureProvider(PriceProvider):
+    """
+    Bars from a JSON fixture ({symbol: [{"date", "close"}, …]}) when `path` is
+    given, otherwise synthetic weekday bars that are a pure function of
+    (symbol, date) — the FMP stub's closes — so repeated and incremental runs agree.
+    """
+    name = "fixture"
+
+    def __init__(self, path: str | None = None):
+        super().__init__(Capabilities(
+            markets=frozenset({"TW", "US", "INDEX"}),
+            batch_size=10_000,
+            history_days=365 * 100,
+            requests_per_minute=0,
+            cost_per_symbol=0.0,
+        ))
+        self.data: dict[str, list[dict]] | None = None
+        if path:
+            with open(path) as f:
+                self.data = json.load(f)
+
+    def fetch(self, symbols, start, end=None):
+        end = end or (date.today() + timedelta(days=1)).isoformat()
+        out = {}
+        for sym in symbols:
+            if self.data is not None:
+                bars = [r for r in self.data.get(sym, []) if start <= r["date"] < end]
+                series = Series([r["date"] for r in bars], [r["close"] for r in bars])
+            else:
+                d, stop = date.fromisoformat(start), min(date.fromisoformat(end), date.today() + timedelta(days=1))
+                series = Series([], [])
+                while d < stop:
+                    if d.weekday() < 5:
+                        series.dates.append(d.isoformat())
+                        series.closes.append(synthetic_close(sym, d))
+                    d += timedelta(days=1)
+            if len(series):
+                out[sym] = series
+        return out
+
+
+# ─────────────────────────────────────────────────────────
+# Router — cheapest capable provider, failover on error / missing symbols
+# ─────────────────────────────────────────────────────────
+class ProviderRouter:
+    def __init__(self, providers: list[PriceProvider]):
+        if not providers:
+            raise ValueError("no price providers configured")
+        self.providers = sorted(providers, key=lambda p: p.caps.cost_per_symbol)
+        self.served: Counter = Counter()  # provider name → symbols served
+        self.failovers = 0                # symbols handed to a later provider
+
+    @property
+    def names(self) -> list[str]:
+        return [p.name for p in self.providers]
+
+    def chain(self, symbol: str, start: str) -> tuple[PriceProvider, ...]:
+        """Capable providers for one symbol, cheapest first."""
+        return tuple(p for p in self.providers if p.can_serve(symbol, start))
+
+    def fetch(self, symbols: list[str], start: str, end: str | None = None) -> dict[str, Series]:
+        """
+        Fetch `symbols` through their provider chains. Symbols no provider
+        returned are absent from the result; if nothing at all came back and a
+        provider raised, the last error is re-raised so callers can retry.
+        """
+        routes: dict[tuple[PriceProvider, ...], list[str]] = {}
+        for sym in symbols:
+            routes.setdefault(self.chain(sym, start), []).append(sym)
+
+        out: dict[str, Series] = {}
+        last_error: Exception | None = None
+        for chain, group in routes.items():
+            pending = group
+            for i, provider in enumerate(chain):
+                if i:
+                    self.failovers += len(pending)
+                size = provider.caps.batch_size
+                for k in range(0, len(pending), size):
+                    try:
+                        got = provider.fetch(pending[k:k + size], start, end)
+                    except Exception as e:
+                        last_error = e
+                        continue
+                    out.update(got)
+                    self.served[provider.name] += len(got)
+                pending = [s for s in pending if s not in out]
+                if not pending:
+                    break
+        if not out and last_error is not None:
+            raise last_error
+        return out
+
+    def summary(self) -> str:
+        served = ", ".join(f"{name} {n}" for name, n in self.served.most_common()) or "none"
+        return f"served: {served}; failovers: {self.failovers}"
+
+
+def build_router(default: str, fmp_client=None, yf_requests_per_minute: float = 2000,
+                 yf_threads: int = 4) -> ProviderRouter:
+    """
+    Router over the comma-separated provider names in `default`, or in
+    $PRICE_PROVIDERS when set. fmp needs `fmp_client`; `yf_threads` is how
+    many tickers one yfinance download fetches at once.
+    """
+    names = [n.strip() for n in os.environ.get(PROVIDER_ENV, default).split(",") if n.strip()]
+    providers: list[PriceProvider] = []
+    for name in names:
+        if name == "fmp":
+            if fmp_client is None:
+                raise ValueError("fmp provider needs an FMPClient")
+            providers.append(FMPProvider(fmp_client))
+        elif name == "yfinance":
+            providers.append(YFinanceProvider(yf_requests_per_minute, threads=yf_threads))
+        elif name == "fixture":
+            providers.append(FixtureProvider(os.environ.get("PRICE_FIXTURE_PATH")))
+        else:
+            raise ValueError(f"unknown price provider: {name}")
+    return ProviderRouter(providers)
@@ -0,0 +1,475 @@
+#!/usr/bin/env python3
+"""
+Columnar on-disk price store (data/price_store.bin).
+
+Layout (little-endian):
+  magic    8 bytes   b"PXSTORE\\0"
+  version  uint32
+  hdr_len  uint32    length of the UTF-8 JSON header
+  header   JSON      {"dates", "symbols", "fields": ["close"], "index", "meta"}
+  padding            zero bytes up to a DATA_ALIGN boundary
+  data     float32   row-major [symbol][date]; NaN where a symbol has no bar
+
+All symbols share one date axis, so a symbol's history is a fixed-size slice
+of the file: Python maps it with mmap and decodes a symbol's row only when
+it is read (MappedPrices), Node wraps it in a Float32Array, and neither
+parses per-record JSON. Closes are quantized to float32 when they
+enter the cache (quantize()), so a save/load round trip is exact.
+
+The header's "index" maps each symbol to {first, last, rows, last_close,
+hash}, maintained as symbols change, so run planning and reporting read it
+instead of rescanning history (read_index() touches only the header).
+
+Between full saves, changes go to an append-only journal
+(data/price_store.journal): one JSON line per symbol delta, fsynced in
+batches. load_prices() replays it, so a run killed mid-way resumes from its
+last synced batch; the updater compacts it into the store at the end.
+
+CLI:
+  python scripts/price_store.py info
+  python scripts/price_store.py import-json   # price_cache.json → price_store.bin
+  python scripts/price_store.py export-json   # price_store.bin → price_cache.json
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import mmap
+import os
+import struct
+import sys
+import zlib
+from array import array
+from bisect import bisect_left
+from collections.abc import Iterator, MutableMapping
+from dataclasses import dataclass, field
+from datetime import date
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+STORE_PATH = os.path.join(DATA_DIR, "price_store.bin")
+JSON_PATH = os.path.join(DATA_DIR, "price_cache.json")
+JOURNAL_PATH = os.path.join(DATA_DIR, "price_store.journal")
+
+MAGIC = b"PXSTORE\0"
+VERSION = 1
+DATA_ALIGN = 64
+_PREFIX = struct.Struct("<8sII")
+NAN = float("nan")
+
+# Rows are written with array("f").tobytes(), i.e. native byte order.
+assert sys.byteorder == "little", "price store assumes a little-endian host"
+
+
+@dataclass(slots=True)
+class Series:
+    """One symbol's history: ascending dates with a parallel list of closes."""
+    dates: list[str]
+    closes: list[float]
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+
+def quantize(values) -> list[float]:
+    """Round closes to float32 precision, the precision the store keeps."""
+    return array("f", values).tolist()
+
+
+def records_to_series(records: list[dict]) -> Series:
+    """[{"date","close"}, …] in any order → Series (ascending, quantized)."""
+    ordered = sorted(records, key=lambda r: r["date"])
+    return Series([r["date"] for r in ordered], quantize(r["close"] for r in ordered))
+
+
+def synthetic_close(symbol: str, d: date) -> float:
+    """Deterministic close for (symbol, day): the FMP stub's bars and the fixture provider's agree."""
+    seed = zlib.crc32(symbol.encode())
+    return round((20 + seed % 400) * (1 + 0.3 * math.sin(seed % 97 + d.toordinal() / 20)), 2)
+
+
+def series_to_records(series: Series) -> list[dict]:
+    return [{"date": d, "close": round(c, 4)} for d, c in zip(series.dates, series.closes)]
+
+
+def merge_records(existing: Series, new: Series, restated: list | None = None) -> Series:
+    """
+    Merge new bars into existing, new wins on date collision. Both inputs are
+    ascending, so this is linear: a pure append (the usual daily case) is two
+    list concatenations, and an overlap is a two-pointer merge that starts at
+    the first date `new` touches. Bars whose close changed are appended to
+    `restated` as {"date", "old", "new"} when a list is given.
+    """
+    if not new.dates:
+        return existing
+    if not existing.dates or new.dates[0] > existing.dates[-1]:
+        return Series(existing.dates + new.dates, existing.closes + new.closes)
+
+    ed, ec, nd, nc = existing.dates, existing.closes, new.dates, new.closes
+    i = bisect_left(ed, nd[0])
+    dates, closes = ed[:i], ec[:i]
+    j = 0
+    while i < len(ed) and j < len(nd):
+        if ed[i] < nd[j]:
+            dates.append(ed[i])
+            closes.append(ec[i])
+            i += 1
+        else:
+            if ed[i] == nd[j]:
+                if restated is not None and ec[i] != nc[j]:
+                    restated.append({"date": nd[j], "old": round(ec[i], 4), "new": round(nc[j], 4)})
+                i += 1
+            dates.append(nd[j])
+            closes.append(nc[j])
+            j += 1
+    dates += ed[i:] + nd[j:]
+    closes += ec[i:] + nc[j:]
+    return Series(dates, closes)
+
+
+# ─────────────────────────────────────────────────────────
+# Matrix container — shared by the price store and derived matrices
+# ─────────────────────────────────────────────────────────
+def write_matrix_file(path: str, header: dict, rows) -> None:
+    """Atomic write of header + float32 rows (each an array('f') of equal length)."""
+    hdr = json.dumps(header, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    offset = _PREFIX.size + len(hdr)
+    pad = (-offset) % DATA_ALIGN
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(_PREFIX.pack(MAGIC, VERSION, len(hdr)))
+        f.write(hdr)
+        f.write(b"\0" * pad)
+        for row in rows:
+            f.write(row.tobytes())
+    os.replace(tmp, path)
+
+
+def read_matrix_file(path: str) -> tuple[dict, memoryview, mmap.mmap]:
+    """Map `path`; returns (header, flat float32 view, mmap). Release the view before closing the map."""
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, version, hdr_len = _PREFIX.unpack_from(mm, 0)
+    if magic != MAGIC:
+        mm.close()
+        raise ValueError(f"{path}: not a price store file")
+    if version > VERSION:
+        mm.close()
+        raise ValueError(f"{path}: store version {version} is newer than supported {VERSION}")
+    header = json.loads(mm[_PREFIX.size:_PREFIX.size + hdr_len])
+    offset = _PREFIX.size + hdr_len
+    offset += (-offset) % DATA_ALIGN
+    n = len(header["symbols"]) * len(header["dates"]) * len(header.get("fields", ["close"]))
+    view = memoryview(mm)[offset:offset + 4 * n].cast("f")
+    return header, view, mm
+
+
+# ─────────────────────────────────────────────────────────
+# Per-symbol index — planning/reporting reads this, never the history
+# ─────────────────────────────────────────────────────────
+def content_hash(dates, closes) -> str:
+    h = hashlib.blake2b(digest_size=8)
+    for d, c in zip(dates, closes):
+        h.update(f"{d}:{c:.4f};".encode())
+    return h.hexdigest()
+
+
+def index_entry(dates: list[str], closes: list[float]) -> dict:
+    """Metadata for one ascending history: first/last date, rows, last close, content hash."""
+    return {
+        "first": dates[0],
+        "last": dates[-1],
+        "rows": len(dates),
+        "last_close": round(closes[-1], 4),
+        "hash": content_hash(dates, closes),
+    }
+
+
+def records_index(records: list[dict]) -> dict:
+    """index_entry() for an ascending [{"date","close"}] list (the TW cache layout)."""
+    return index_entry([r["date"] for r in records], [r["close"] for r in records])
+
+
+class MappedPrices(MutableMapping):
+    """
+    {symbol: Series} over a mapped store. A symbol's row is sliced out of the
+    map and decoded each time it is read; only the series written back
+    (cache.put) are held in memory, and save_store() copies untouched rows
+    straight from the map.
+    """
+
+    def __init__(self, header: dict, view: memoryview, mm: mmap.mmap):
+        self.dates: list[str] = header["dates"]
+        self.rows = {sym: i for i, sym in enumerate(header["symbols"])}
+        self._view, self._mm = view, mm
+        self.changed: dict[str, Series] = {}
+
+    def row(self, sym: str) -> memoryview:
+        """The symbol's float32 row on self.dates, straight from the map."""
+        n = len(self.dates)
+        i = self.rows[sym]
+        return self._view[i * n:(i + 1) * n]
+
+    def __getitem__(self, sym: str) -> Series:
+        if sym in self.changed:
+            return self.changed[sym]
+        if sym not in self.rows:
+            raise KeyError(sym)
+        row = self.row(sym).tolist()
+        keep = [j for j, v in enumerate(row) if v == v]  # NaN != NaN
+        return Series([self.dates[j] for j in keep], [row[j] for j in keep])
+
+    def __setitem__(self, sym: str, series: Series) -> None:
+        self.changed[sym] = series
+
+    def __delitem__(self, sym: str) -> None:
+        if sym not in self.rows and sym not in self.changed:
+            raise KeyError(sym)
+        self.rows.pop(sym, None)
+        self.changed.pop(sym, None)
+
+    def __contains__(self, sym) -> bool:
+        return sym in self.changed or sym in self.rows
+
+    def __iter__(self) -> Iterator[str]:
+        yield from self.rows
+        yield from (sym for sym in self.changed if sym not in self.rows)
+
+    def __len__(self) -> int:
+        return len(self.rows) + sum(1 for sym in self.changed if sym not in self.rows)
+
+
+@dataclass
+class PriceCache:
+    """Prices plus the per-symbol index and run metadata saved alongside them."""
+    prices: MutableMapping[str, Series] = field(default_factory=dict)
+    meta: dict = field(default_factory=dict)
+    index: dict[str, dict] = field(default_factory=dict)
+
+    def put(self, sym: str, series: Series) -> None:
+        """Replace a symbol's history and refresh its index entry (O(rows) for this symbol only)."""
+        self.prices[sym] = series
+        self.index[sym] = index_entry(series.dates, series.closes)
+
+    def drop(self, sym: str) -> None:
+        """Remove a symbol (e.g. delisted from the universe), its index entry and adjustment events."""
+        self.prices.pop(sym, None)
+        self.index.pop(sym, None)
+        self.meta.get("adjustments", {}).pop(sym, None)
+
+    def latest_date(self, sym: str) -> str | None:
+        entry = self.index.get(sym)
+        return entry["last"] if entry else None
+
+
+def _with_index(prices: dict[str, Series], meta: dict, index: dict | None) -> PriceCache:
+    cache = PriceCache(prices, meta)
+    for sym, series in prices.items():
+        entry = (index or {}).get(sym)
+        cache.index[sym] = entry if entry and entry["rows"] == len(series) else index_entry(series.dates, series.closes)
+    return cache
+
+
+# ─────────────────────────────────────────────────────────
+# Price store
+# ─────────────────────────────────────────────────────────
+def save_store(path: str, cache: PriceCache) -> None:
+    """
+    Write all prices on a shared ascending date axis (union of all dates).
+    Over a MappedPrices only the changed series are walked: the axis is the
+    mapped one plus their dates, and an untouched row is copied from the map
+    (padded with NaN when the axis only grew at the end).
+    """
+    prices = cache.prices
+    mapped = prices if isinstance(prices, MappedPrices) else None
+    if mapped is not None:
+        dates = sorted(set(mapped.dates).union(*(s.dates for s in mapped.changed.values())))
+        grown = dates[:len(mapped.dates)] == mapped.dates
+    else:
+        dates = sorted({d for s in prices.values() for d in s.dates})
+    col = {d: i for i, d in enumerate(dates)}
+    symbols = sorted(prices)
+    blank = array("f", [NAN]) * len(dates)
+
+    def rows():
+        for sym in symbols:
+            if mapped is not None and grown and sym not in mapped.changed:
+                row = array("f", mapped.row(sym))
+                row.extend(blank[len(row):])
+                yield row
+                continue
+            row = array("f", blank)
+            s = prices[sym]
+            for d, c in zip(s.dates, s.closes):
+                row[col[d]] = c
+            yield row
+
+    header = {
+        "dates": dates,
+        "symbols": symbols,
+        "fields": ["close"],
+        "index": {sym: cache.index[sym] for sym in symbols},
+        "meta": cache.meta,
+    }
+    write_matrix_file(path, header, rows())
+
+
+def read_index(path: str = STORE_PATH) -> dict[str, dict]:
+    """Only the per-symbol index from the store header — no price data is touched."""
+    header, view, mm = read_matrix_file(path)
+    view.release()
+    mm.close()
+    return header.get("index", {})
+
+
+def load_store(path: str) -> PriceCache:
+    """Map the store; prices are decoded per symbol on read (MappedPrices), the index comes from the header."""
+    header, view, mm = read_matrix_file(path)
+    prices = MappedPrices(header, view, mm)
+    cache = PriceCache(prices, header.get("meta", {}), dict(header.get("index", {})))
+    for sym in prices:
+        if sym not in cache.index:  # stores written before the index existed
+            series = prices[sym]
+            cache.index[sym] = index_entry(series.dates, series.closes)
+    return cache
+
+
+def load_json_cache(path: str) -> PriceCache:
+    """Legacy price_cache.json → PriceCache."""
+    with open(path) as f:
+        raw = json.load(f)
+    prices = {sym: records_to_series(recs) for sym, recs in raw.pop("prices", {}).items() if recs}
+    raw.pop("symbols", None)
+    return _with_index(prices, raw, None)
+
+
+def export_json(path: str, cache: PriceCache) -> None:
+    """Write the legacy price_cache.json layout (atomic)."""
+    out = dict(cache.meta)
+    out["symbols"] = sorted(cache.prices)
+    out["prices"] = {sym: series_to_records(cache.prices[sym]) for sym in out["symbols"]}
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(out, f)
+    os.replace(tmp, path)
+
+
+# ─────────────────────────────────────────────────────────
+# Journal — append-only per-symbol deltas between full saves
+# ─────────────────────────────────────────────────────────
+class Journal:
+    """
+    Write-ahead log of per-symbol changes. Each line is
+    {"s": symbol, "m": "replace" | "merge", "d": [dates], "c": [closes],
+     "a": [[ex_date, factor], …]} — "a" is the symbol's full adjustments list
+    after the change, so a replayed tail never loses (or keeps a stale) event.
+    append() only buffers; sync() writes the batch and fsyncs it, so a
+    checkpoint costs the size of what changed, not the size of the cache.
+    """
+
+    def __init__(self, path: str = JOURNAL_PATH):
+        self.path = path
+        self._pending: list[str] = []
+        self._f = open(path, "a", encoding="utf-8")
+
+    def append(self, sym: str, mode: str, series: Series, adjustments: list | None = None) -> None:
+        entry = {"s": sym, "m": mode, "d": series.dates, "c": series.closes, "a": adjustments or []}
+        self._pending.append(json.dumps(entry, separators=(",", ":")) + "\n")
+
+    def sync(self) -> int:
+        """Flush buffered entries to disk; returns bytes written."""
+        if not self._pending:
+            return 0
+        chunk = "".join(self._pending)
+        self._pending.clear()
+        self._f.write(chunk)
+        self._f.flush()
+        os.fsync(self._f.fileno())
+        return len(chunk.encode("utf-8"))
+
+    def close(self) -> None:
+        self.sync()
+        self._f.close()
+
+    def discard(self) -> None:
+        """Drop the journal once its contents are compacted into the store."""
+        self._pending.clear()
+        self._f.close()
+        os.remove(self.path)
+
+
+def replay_journal(cache: PriceCache, path: str = JOURNAL_PATH) -> int:
+    """Apply journal entries to `cache` in order; returns the number applied."""
+    if not os.path.exists(path):
+        return 0
+    applied = 0
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                break  # torn tail from a kill mid-write; everything before it is intact
+            series = Series(entry["d"], entry["c"])
+            sym = entry["s"]
+            if entry["m"] == "merge" and sym in cache.prices:
+                cache.put(sym, merge_records(cache.prices[sym], series))
+            else:
+                cache.put(sym, series)
+            if "a" in entry:
+                table = cache.meta.setdefault("adjustments", {})
+                if entry["a"]:
+                    table[sym] = entry["a"]
+                else:
+                    table.pop(sym, None)
+            applied += 1
+    return applied
+
+
+def load_prices(
+    store_path: str = STORE_PATH,
+    json_path: str = JSON_PATH,
+    journal_path: str = JOURNAL_PATH,
+) -> tuple[PriceCache, int]:
+    """
+    Load the store (falling back to, and migrating from, the legacy JSON
+    cache) and replay any journal left by an interrupted run.
+    Returns (cache, replayed_entries).
+    """
+    if os.path.exists(store_path):
+        cache = load_store(store_path)
+    elif os.path.exists(json_path):
+        cache = load_json_cache(json_path)
+    else:
+        cache = PriceCache()
+    return cache, replay_journal(cache, journal_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Columnar price store utilities")
+    parser.add_argument("cmd", choices=["info", "import-json", "export-json"])
+    parser.add_argument("--store", default=STORE_PATH)
+    parser.add_argument("--json", default=JSON_PATH)
+    args = parser.parse_args()
+
+    if args.cmd == "import-json":
+        cache = load_json_cache(args.json)
+        save_store(args.store, cache)
+        print(f"Imported {len(cache.prices)} symbols: {args.json} → {args.store}")
+    elif args.cmd == "export-json":
+        cache = load_store(args.store)
+        export_json(args.json, cache)
+        print(f"Exported {len(cache.prices)} symbols: {args.store} → {args.json}")
+    else:
+        header, view, mm = read_matrix_file(args.store)
+        filled = sum(1 for v in view if not math.isnan(v))
+        view.release()
+        mm.close()
+        dates = header["dates"]
+        print(f"{args.store}: v{VERSION}, {len(header['symbols'])} symbols × {len(dates)} dates "
+              f"({dates[0] if dates else '-'} → {dates[-1] if dates else '-'}), "
+              f"{filled} bars, {os.path.getsize(args.store) / 1024 / 1024:.1f} MB")
+        print(f"  updated_at: {header.get('meta', {}).get('updated_at', 'N/A')}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Shared rate limiting for the cache updaters.
+
+TokenBucket: thread-safe token bucket sized to a plan's requests-per-minute.
+Every worker calls acquire() before a request, so N workers together never
+exceed the quota while still overlapping network round-trips.
+
+AdaptiveThrottle: AIMD concurrency window for when the real limit is unknown
+(plan tier, shared key). Each success widens the window a little, each 429 /
+5xx halves it, and a Retry-After pauses every caller until it expires.
+"""
+
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+
+class TokenBucket:
+    """Refills at `requests_per_minute / 60` tokens per second, bursts up to `burst`."""
+
+    def __init__(self, requests_per_minute: float, burst: int | None = None):
+        self.rate = requests_per_minute / 60.0
+        self.capacity = float(burst if burst is not None else max(1, int(self.rate)))
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def acquire(self, tokens: float = 1.0) -> None:
+        """Block until `tokens` are available, then consume them."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class AdaptiveThrottle:
+    """
+    Additive-increase / multiplicative-decrease limit on requests in flight.
+    Callers bracket each request with acquire() / release(ok, retry_after).
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        min_concurrency: int = 1,
+        increase_every: int = 10,
+        cooldown: float = 1.0,
+    ):
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.increase_every = increase_every
+        self.cooldown = cooldown
+        self.limit = float(max_concurrency)
+        self.in_flight = 0
+        self.throttled = 0  # 429 / 5xx responses seen
+        self._successes = 0
+        self._paused_until = 0.0
+        self._last_decrease = float("-inf")
+        self._cond = threading.Condition()
+
+    def acquire(self) -> None:
+        """Block until the window has a free slot and no Retry-After pause is active."""
+        with self._cond:
+            while True:
+                wait = self._paused_until - time.monotonic()
+                if wait <= 0 and self.in_flight < int(self.limit):
+                    self.in_flight += 1
+                    return
+                self._cond.wait(wait if wait > 0 else None)
+
+    def release(self, ok: bool, retry_after: float | None = None) -> None:
+        """Report the outcome: ok widens the window, a throttling response shrinks it."""
+        with self._cond:
+            self.in_flight -= 1
+            if ok:
+                self._successes += 1
+                if self._successes >= self.increase_every * int(self.limit):
+                    # +1 slot per window's worth of successes (≈ one per round trip of the window)
+                    self._successes = 0
+                    self.limit = min(self.max_concurrency, self.limit + 1)
+            else:
+                now = time.monotonic()
+                self.throttled += 1
+                self._successes = 0
+                # A burst of 429s from one overloaded window counts as a single signal
+                if now - self._last_decrease >= self.cooldown:
+                    self._last_decrease = now
+                    self.limit = max(self.min_concurrency, self.limit / 2)
+                if retry_after:
+                    self._paused_until = max(self._paused_until, now + retry_after)
+            self._cond.notify_all()
+
+
+def retry_after_seconds(value: str | None) -> float | None:
+    """Parse a Retry-After header (delta-seconds or HTTP-date)."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = 30.0) -> float:
+    """Exponential backoff with full jitter: uniform(0, min(cap, base * 2**attempt))."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Slope matrix (data/slope_matrix.bin) — derived from the price store after
+each US update.
+
+Every symbol's close is forward-filled onto a dense calendar-day axis using
+the scanners' findClosestPrice rules: a bar carries forward for up to
+MAX_GAP_DAYS calendar days, and a symbol's last bar carries forward to the
+end of the axis. A cell is NaN exactly where findClosestPrice returns null.
+So the close "on or before" any date for every symbol is one column, and a
+(date1, date2) slope/post-return scan is three column reads. Closes are
+written adjusted: the store's corporate-action factors (meta "adjustments")
+are applied here, at read time, so the matrix needs no further adjustment.
+
+Same PXSTORE container as price_store.bin, but stored date-major
+([date][symbol], header "layout": "date-major") so a column is one
+contiguous slice that Node can wrap without copying. The header also
+carries the trading calendar: "trading" lists the column of every day that
+has at least one real bar. Its meta "updated_at" is the store's: readers
+(lib/price-store.ts) use the matrix only while the store header still
+carries the same value, whatever order the two files' mtimes are in.
+
+CLI:
+  python scripts/slope_matrix.py            # rebuild from data/price_store.bin
+"""
+
+import argparse
+import os
+from array import array
+from datetime import date, timedelta
+
+from corporate_actions import adjust
+from price_store import DATA_DIR, NAN, STORE_PATH, PriceCache, load_store, write_matrix_file
+
+MATRIX_PATH = os.path.join(DATA_DIR, "slope_matrix.bin")
+MAX_GAP_DAYS = 10  # same window as findClosestPrice in lib/price-store.ts
+
+
+def calendar_axis(cache: PriceCache) -> list[str]:
+    """Every calendar day from the earliest first bar to the latest last bar."""
+    if not cache.index:
+        return []
+    start = date.fromisoformat(min(e["first"] for e in cache.index.values()))
+    end = date.fromisoformat(max(e["last"] for e in cache.index.values()))
+    return [(start + timedelta(days=i)).isoformat() for i in range((end - start).days + 1)]
+
+
+def filled_row(dates: list[str], closes: list[float], col: dict[str, int], n: int) -> array:
+    """One symbol's closes on the calendar axis, forward-filled per findClosestPrice."""
+    row = array("f", [NAN]) * n
+    last = len(dates) - 1
+    for k, (d, c) in enumerate(zip(dates, closes)):
+        start = col[d]
+        stop = n if k == last else min(start + MAX_GAP_DAYS + 1, col[dates[k + 1]])
+        row[start:stop] = array("f", [c]) * (stop - start)
+    return row
+
+
+def build_slope_matrix(cache: PriceCache) -> tuple[dict, list[array]]:
+    """Returns (header, date-major rows) ready for write_matrix_file()."""
+    days = calendar_axis(cache)
+    col = {d: i for i, d in enumerate(days)}
+    symbols = sorted(sym for sym, s in cache.prices.items() if len(s))
+    adjustments = cache.meta.get("adjustments", {})
+    by_symbol = []
+    for sym in symbols:
+        series = adjust(cache.prices[sym], adjustments.get(sym))
+        by_symbol.append(filled_row(series.dates, series.closes, col, len(days)))
+    # Transpose to date-major: a date's closes for all symbols become one contiguous row
+    by_date = [array("f", [r[j] for r in by_symbol]) for j in range(len(days))]
+    bar_days = {d for s in cache.prices.values() for d in s.dates}
+    header = {
+        "dates": days,
+        "symbols": symbols,
+        "fields": ["close_ffill"],
+        "layout": "date-major",
+        "max_gap_days": MAX_GAP_DAYS,
+        "trading": [i for i, d in enumerate(days) if d in bar_days],
+        "meta": {"updated_at": cache.meta.get("updated_at", "")},
+    }
+    return header, by_date
+
+
+def write_slope_matrix(cache: PriceCache, path: str = MATRIX_PATH) -> dict:
+    """Build and atomically write the matrix; returns its header."""
+    header, rows = build_slope_matrix(cache)
+    write_matrix_file(path, header, rows)
+    return header
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the slope matrix from the price store")
+    parser.add_argument("--store", default=STORE_PATH)
+    parser.add_argument("--out", default=MATRIX_PATH)
+    args = parser.parse_args()
+
+    header = write_slope_matrix(load_store(args.store), args.out)
+    days = header["dates"]
+    print(f"{args.out}: {len(header['symbols'])} symbols × {len(days)} calendar days "
+          f"({days[0] if days else '-'} → {days[-1] if days else '-'}, {len(header['trading'])} trading), "
+          f"{os.path.getsize(args.out) / 1024 / 1024:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
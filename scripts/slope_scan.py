@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Slope scan engine — regenerates data/slope_cache.json (and a batch of
+precomputed scans in data/slope_scans.json) from the slope matrix.
+
+The matrix (slope_matrix.py) is loaded once into a date × symbol NumPy
+array; every requested (date1, date2) pair is a row index into it, so a
+whole batch of pairs is one fancy-indexing gather plus array arithmetic —
+slope, post_return, group and triple_filter for the universe, for every
+pair, in one pass. The benchmark slope comes from the benchmark store's
+calendar (benchmark_store.py). Results match /api/slope-scanner's dynamic
+mode: same findClosestPrice semantics (the matrix's forward fill), same
+groups (GROUP_RULES mirrors assignGroup()), same short-interest filter.
+
+Outputs:
+  slope_cache.json   one scan, the route's static fallback
+                     {updated_at, bench_slope, bench_post, date1, date2, results[]}
+  slope_scans.json   {updated_at, data_updated_at, benchmark, pinned: ["date1:date2", …],
+                      scans: {"date1:date2": {bench_slope, bench_post, …, results[]}}}
+                     served by the route for exact (date1, date2) matches while
+                     data_updated_at matches the matrix it would otherwise scan
+
+The US updater refreshes both after writing the matrix: slope_cache.json
+for its own date pair (so post_return stays current), slope_scans.json for
+trailing windows ending at the latest trading day (benchmark_store.WINDOWS)
+plus every pair ever passed on the command line ("pinned").
+
+CLI:
+  python scripts/slope_scan.py                                 # refresh slope_cache.json's pair
+  python scripts/slope_scan.py 2025-11-20:2026-02-28 2026-01-02:2026-03-31
+  python scripts/slope_scan.py --windows 20 60 120             # trailing windows → slope_scans.json
+"""
+
+import argparse
+import json
+import os
+from datetime import date, datetime
+
+import numpy as np
+
+from benchmark_store import WINDOWS, close_on, load_benchmarks
+from price_store import DATA_DIR, read_matrix_file
+from slope_matrix import MATRIX_PATH
+
+SLOPE_CACHE_PATH = os.path.join(DATA_DIR, "slope_cache.json")
+SCANS_PATH = os.path.join(DATA_DIR, "slope_scans.json")
+SHORT_INTEREST_PATH = os.path.join(DATA_DIR, "short_interest.json")
+DEFAULT_BENCHMARK = "QQQ"
+
+# assignGroup() in app/api/slope-scanner/route.ts, first match wins;
+# the ⚡ threshold is bench_slope × EXPLOSIVE_MULTIPLE
+EXPLOSIVE_MULTIPLE = 10
+GROUP_RULES = ("⚡爆賺", "A超強", "B中強", "C死區", "D持平")
+GROUP_DEFAULT = "E極弱"
+TRIPLE_MIN_SLOPE = 50
+TRIPLE_SHORT_PCT = (5, 15)  # inclusive
+
+
+class Matrix:
+    """slope_matrix.bin as a (days × symbols) float32 array."""
+
+    def __init__(self, path: str = MATRIX_PATH):
+        header, view, mm = read_matrix_file(path)
+        try:
+            self.closes = np.frombuffer(view, dtype=np.float32).reshape(
+                len(header["dates"]), len(header["symbols"])).copy()
+        finally:
+            view.release()
+            mm.close()
+        self.dates: list[str] = header["dates"]
+        self.symbols: list[str] = header["symbols"]
+        self.trading: list[int] = header.get("trading", [])
+        self.updated_at: str = header.get("meta", {}).get("updated_at", "")
+        self.start = date.fromisoformat(self.dates[0]) if self.dates else None
+
+    def row(self, day: str) -> int:
+        """Row of the close on or before `day`; -1 before the axis (past its end: the last row)."""
+        if self.start is None:
+            return -1
+        j = (date.fromisoformat(day) - self.start).days
+        return -1 if j < 0 else min(j, len(self.dates) - 1)
+
+    def trailing_pairs(self, windows) -> list[tuple[str, str]]:
+        """(date1, date2) for each window of trading days ending at the latest trading day."""
+        pairs = []
+        for w in windows:
+            if w < len(self.trading):
+                pairs.append((self.dates[self.trading[-1 - w]], self.dates[self.trading[-1]]))
+        return pairs
+
+
+def load_short_interest(path: str = SHORT_INTEREST_PATH) -> dict:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f).get("data", {})
+    except (OSError, ValueError):
+        return {}
+
+
+def short_columns(symbols: list[str], short_interest: dict) -> tuple[np.ndarray, np.ndarray]:
+    """shortPct / shortRatio aligned with the matrix columns (0 where unknown, as in the route)."""
+    pct = np.array([short_interest.get(s, {}).get("shortPct") or 0 for s in symbols], dtype=np.float64)
+    ratio = np.array([short_interest.get(s, {}).get("shortRatio") or 0 for s in symbols], dtype=np.float64)
+    return pct, ratio
+
+
+def scan_pairs(matrix: Matrix, pairs: list[tuple[str, str]], benchmark: str = DEFAULT_BENCHMARK,
+               bench_store: dict | None = None, short_interest: dict | None = None) -> list[dict | None]:
+    """
+    Scan every (date1, date2) pair over the whole universe in one vectorized
+    pass. Returns one slope_cache-shaped dict per pair, or None where the
+    benchmark has no close for either date.
+    """
+    bench_store = bench_store if bench_store is not None else load_benchmarks()
+    short_interest = short_interest if short_interest is not None else load_short_interest()
+    bench = bench_store["series"].get(benchmark)
+    if bench is None:
+        raise KeyError(f"benchmark {benchmark} not in the benchmark store")
+    bench_latest = bench["calendar"]["closes"][-1]
+
+    rows1 = np.array([matrix.row(d1) for d1, _ in pairs], dtype=np.int64)
+    rows2 = np.array([matrix.row(d2) for _, d2 in pairs], dtype=np.int64)
+    # Row -1 (before the axis) reads an all-NaN row, like the route's empty column
+    padded = np.vstack([matrix.closes, np.full((1, len(matrix.symbols)), np.nan, dtype=np.float32)])
+    p1 = padded[rows1].astype(np.float64)  # (pairs × symbols)
+    p2 = padded[rows2].astype(np.float64)
+    latest = matrix.closes[-1].astype(np.float64) if len(matrix.dates) else np.empty(0)
+
+    b1 = np.array([close_on(bench, d1) or np.nan for d1, _ in pairs], dtype=np.float64)
+    b2 = np.array([close_on(bench, d2) or np.nan for _, d2 in pairs], dtype=np.float64)
+    bench_slope = (b2 - b1) / b1 * 100
+    bench_post = (bench_latest - b2) / b2 * 100
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slope = (p2 - p1) / p1 * 100
+        post = (latest - p2) / p2 * 100
+    # `!p1 || !p2` in the route: NaN or zero closes drop the symbol
+    valid = np.isfinite(slope) & (p1 != 0) & (p2 != 0)
+    valid &= np.array([s != benchmark for s in matrix.symbols])
+
+    bs = bench_slope[:, None]
+    group = np.select(
+        [slope >= bs * EXPLOSIVE_MULTIPLE, slope > 50, slope > 20, slope > bs, slope >= 0],
+        range(len(GROUP_RULES)), default=len(GROUP_RULES),
+    )
+    labels = GROUP_RULES + (GROUP_DEFAULT,)
+    short_pct, short_ratio = short_columns(matrix.symbols, short_interest)
+    triple = (slope > TRIPLE_MIN_SLOPE) & (short_pct >= TRIPLE_SHORT_PCT[0]) & (short_pct <= TRIPLE_SHORT_PCT[1])
+
+    out: list[dict | None] = []
+    for k, (d1, d2) in enumerate(pairs):
+        if not np.isfinite(bench_slope[k]):
+            out.append(None)
+            continue
+        idx = np.flatnonzero(valid[k])
+        idx = idx[np.argsort(-slope[k, idx], kind="stable")]
+        out.append({
+            "updated_at": datetime.now().isoformat(),
+            "data_updated_at": matrix.updated_at,
+            "benchmark": benchmark,
+            "bench_slope": float(bench_slope[k]),
+            "bench_post": float(bench_post[k]),
+            "date1": d1,
+            "date2": d2,
+            "results": [
+                {
+                    "symbol": matrix.symbols[i],
+                    "slope": round(float(slope[k, i]), 4),
+                    "post_return": round(float(post[k, i]), 4),
+                    "group": labels[group[k, i]],
+                    "short_pct": float(short_pct[i]),
+                    "short_ratio": float(short_ratio[i]),
+                    "triple_filter": bool(triple[k, i]),
+                }
+                for i in idx
+            ],
+        })
+    return out
+
+
+def write_json(path: str, payload: dict) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+def cached_pair(path: str = SLOPE_CACHE_PATH) -> tuple[str, str] | None:
+    """The (date1, date2) slope_cache.json was last built for."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            cache = json.load(f)
+        return cache["date1"], cache["date2"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def pinned_pairs(path: str = SCANS_PATH) -> list[tuple[str, str]]:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return [tuple(p.split(":", 1)) for p in json.load(f).get("pinned", [])]
+    except (OSError, ValueError):
+        return []
+
+
+def refresh(matrix_path: str = MATRIX_PATH, pairs: list[tuple[str, str]] | None = None,
+            windows=WINDOWS, benchmark: str = DEFAULT_BENCHMARK) -> dict:
+    """
+    Rebuild slope_cache.json for `pairs[0]` (default: its current pair) and
+    slope_scans.json for the pinned pairs, `pairs` (pinned from now on) and
+    the trailing `windows`. Returns {"cache": pair or None, "scans": count}.
+    """
+    matrix = Matrix(matrix_path)
+    pairs = list(pairs or [])
+    primary = pairs[0] if pairs else cached_pair()
+    pinned = list(dict.fromkeys(pinned_pairs() + pairs))
+    batch = list(dict.fromkeys(([primary] if primary else []) + pinned + matrix.trailing_pairs(windows)))
+    scans = scan_pairs(matrix, batch, benchmark) if batch else []
+    by_pair = {p: s for p, s in zip(batch, scans) if s is not None}
+
+    if primary in by_pair:
+        write_json(SLOPE_CACHE_PATH, by_pair[primary])
+    write_json(SCANS_PATH, {
+        "updated_at": datetime.now().isoformat(),
+        "data_updated_at": matrix.updated_at,
+        "benchmark": benchmark,
+        "pinned": [f"{d1}:{d2}" for d1, d2 in pinned],
+        "scans": {f"{d1}:{d2}": s for (d1, d2), s in by_pair.items()},
+    })
+    return {"cache": primary if primary in by_pair else None, "scans": len(by_pair)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute slope scans from the slope matrix")
+    parser.add_argument("pairs", nargs="*", metavar="DATE1:DATE2",
+                        help="date pairs; the first also becomes slope_cache.json")
+    parser.add_argument("--windows", type=int, nargs="*", default=list(WINDOWS),
+                        help="trailing trading-day windows ending at the latest bar")
+    parser.add_argument("--benchmark", default=DEFAULT_BENCHMARK)
+    parser.add_argument("--matrix", default=MATRIX_PATH)
+    args = parser.parse_args()
+
+    pairs = [tuple(p.split(":", 1)) for p in args.pairs]
+    t0 = datetime.now()
+    result = refresh(args.matrix, pairs, args.windows, args.benchmark)
+    elapsed = (datetime.now() - t0).total_seconds()
+    print(f"{result['scans']} scans → {SCANS_PATH} in {elapsed:.2f}s")
+    if result["cache"]:
+        print(f"slope_cache.json: {result['cache'][0]} → {result['cache'][1]}")
+
+
+if __name__ == "__main__":
+    main()
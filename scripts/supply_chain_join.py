@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""
+Supply-chain join — materializes the US → TW supplier graph of
+data/supply-chain.ts together with both markets' slopes into one indexed
+artifact, data/supply_chain_join.json, so /api/tw-slope's cross-market scan
+is a lookup instead of a per-request nested join.
+
+The graph is parsed once per run from data/supply-chain.ts (TW suppliers
+only, in file order) and stored as an edge list plus two indexes:
+
+  edges         [[us, tw, name, role], …]
+  tw_suppliers  {us: [tw code, …]}   (codes without .TW/.TWO — slope-scanner's TW_SUPPLY_MAP)
+  tw_parents    {tw: [us, …]}        (reverse map for Type 2's explosive parents)
+
+For every date pair (the same batch slope_scan.py precomputes: slope_cache's
+pair, the pinned pairs and the trailing windows, plus pairs pinned here) the
+artifact holds, under pairs["date1:date2"]:
+
+  taiex_slope          ^TWII % change (benchmark store)
+  bench_slope_us       QQQ % change, rounded to 2 decimals
+  explosive_threshold  bench_slope_us × 10
+  edge_slopes          [[us_slope, tw_slope], …] aligned with edges (null when missing)
+  type1                indexes into edges: explosive US parent, TW supplier down 15%+
+  type2                [[tw, tw_slope, [explosive US parents]], …] for TW slopes ≥ TAIEX
+
+Rows are in the order the route's dynamic join produces them, and slopes
+are rounded the way it rounds them. US slopes come from the slope matrix
+(rounded to the store's 4 decimals, like toPrice()), TW slopes from the
+adjusted TW cache with findClosestPrice rules.
+
+Everything else the route's response needs from the TW cache is stored too,
+so serving a precomputed pair never parses tw_price_cache.json:
+
+  tw  {data_source, latest_bar_source, taiex_latest_date, stocks_latest_date,
+       symbols: {tw: [name, sector, ma60, current_price]}}   (symbols in any pair's rows;
+                                                              MA60 as the route's calcMA60)
+
+The artifact records the US store's updated_at and the TW cache's
+updated_at; the route uses it only while the store it loaded and the cache
+file on disk (its leading updated_at field) still carry the same ones.
+
+Both updaters run the stage at the end (whichever market updated last
+rebuilds it). CLI:
+  python scripts/supply_chain_join.py                          # rebuild from the caches on disk
+  python scripts/supply_chain_join.py 2026-01-02:2026-03-31    # also pin a pair
+"""
+
+import argparse
+import json
+import math
+import os
+import re
+from bisect import bisect_right
+from datetime import date, datetime
+
+import numpy as np
+
+from benchmark_store import WINDOWS, load_benchmarks, slope as bench_slope
+from corporate_actions import adjust
+from price_store import DATA_DIR, Series
+from slope_matrix import MATRIX_PATH, MAX_GAP_DAYS
+from slope_scan import EXPLOSIVE_MULTIPLE, Matrix, cached_pair, pinned_pairs, write_json
+
+JOIN_PATH = os.path.join(DATA_DIR, "supply_chain_join.json")
+SUPPLY_CHAIN_TS = os.path.join(DATA_DIR, "supply-chain.ts")
+TW_CACHE_PATH = os.path.join(DATA_DIR, "tw_price_cache.json")
+US_BENCHMARK = "QQQ"
+TW_BENCHMARK = "^TWII"
+US_EXCLUDED = ("QQQ", "SPY", "IWM")
+TYPE1_MAX_TW_SLOPE = -15  # Type 1: supplier pulled back 15%+
+
+_ENTRY = re.compile(r"^\s*'([^']+)':\s*\[")
+_SUPPLIER = re.compile(r"\{\s*name:\s*'([^']*)'(?:,\s*ticker:\s*'([^']*)')?,\s*market:\s*'([^']*)',\s*role:\s*'([^']*)'")
+
+
+def _js_round(value: float, digits: int) -> float:
+    """Math.round(x * 10^d) / 10^d (halves round up, like the route)."""
+    scale = 10 ** digits
+    return math.floor(value * scale + 0.5) / scale
+
+
+def parse_supply_chain(path: str = SUPPLY_CHAIN_TS) -> list[list[str]]:
+    """TW supplier edges [us, tw, name, role] of supplyChainDB, in file order."""
+    edges = []
+    us = None
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            m = _ENTRY.match(line)
+            if m:
+                us = m.group(1)
+                continue
+            m = _SUPPLIER.search(line)
+            if m and us and m.group(3) == "TW" and m.group(2):
+                edges.append([us, m.group(2), m.group(1), m.group(4)])
+    return edges
+
+
+def graph_indexes(edges: list[list[str]]) -> tuple[dict[str, list[str]], dict[str, list[str]]]:
+    """(tw_suppliers, tw_parents) — both in edge order, as the routes build them."""
+    suppliers: dict[str, list[str]] = {}
+    parents: dict[str, list[str]] = {}
+    for us, tw, _, _ in edges:
+        suppliers.setdefault(us, []).append(tw.replace(".TW", "").replace(".TWO", ""))
+        parents.setdefault(tw, []).append(us)
+    return suppliers, parents
+
+
+def _close_on(series: Series, day: str) -> float | None:
+    """findClosestPrice(): the bar on or before `day` within MAX_GAP_DAYS, or the last bar past the end."""
+    i = bisect_right(series.dates, day) - 1
+    if i < 0:
+        return None
+    if (date.fromisoformat(day) - date.fromisoformat(series.dates[i])).days <= MAX_GAP_DAYS:
+        return series.closes[i]
+    return series.closes[i] if i == len(series.dates) - 1 else None
+
+
+def _adjusted(series: Series, events: list | None) -> Series:
+    """Adjusted closes as the route sees them: applyAdjustments() rounds them with toPrice()."""
+    if not events:
+        return series
+    return Series(series.dates, [_js_round(c, 4) for c in adjust(series, events).closes])
+
+
+def tw_slopes(prices: dict[str, Series], adjustments: dict[str, list],
+              pairs: list[tuple[str, str]]) -> list[dict[str, float]]:
+    """Per pair, {tw symbol: slope rounded to 2 decimals} in symbol order (symbols with no slope omitted)."""
+    out: list[dict[str, float]] = [{} for _ in pairs]
+    for sym in sorted(prices):
+        s = prices[sym]
+        if not len(s):
+            continue
+        s = _adjusted(s, adjustments.get(sym))
+        for k, (d1, d2) in enumerate(pairs):
+            p1, p2 = _close_on(s, d1), _close_on(s, d2)
+            if p1 is None or p2 is None or p1 == 0:
+                continue
+            out[k][sym] = _js_round((p2 - p1) / p1 * 100, 2)
+    return out
+
+
+def calc_ma60(series: Series, cutoff: str) -> list[float] | None:
+    """calcMA60() of the route: [ma60, current price] over the ≤ 60 bars up to cutoff (≥ 20 needed)."""
+    n = bisect_right(series.dates, cutoff)
+    if n < 20:
+        return None
+    total = 0.0
+    for c in reversed(series.closes[max(0, n - 60):n]):  # newest first, as the route sums
+        total += c
+    return [_js_round(total / min(n, 60), 2), series.closes[n - 1]]
+
+
+def us_slopes(matrix: Matrix, pairs: list[tuple[str, str]]) -> np.ndarray:
+    """(pairs × symbols) slopes from the matrix, closes rounded like toPrice(); NaN where missing."""
+    rows1 = np.array([matrix.row(d1) for d1, _ in pairs], dtype=np.int64)
+    rows2 = np.array([matrix.row(d2) for _, d2 in pairs], dtype=np.int64)
+    padded = np.vstack([matrix.closes, np.full((1, len(matrix.symbols)), np.nan, dtype=np.float32)])
+    p1 = np.floor(padded[rows1].astype(np.float64) * 10000 + 0.5) / 10000
+    p2 = np.floor(padded[rows2].astype(np.float64) * 10000 + 0.5) / 10000
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(p1 != 0, (p2 - p1) / p1 * 100, np.nan)
+
+
+def join_pair(edges: list[list[str]], parents: dict[str, list[str]], symbols: list[str],
+              us: np.ndarray, tw: dict[str, float], taiex_slope: float, qqq_slope: float | None) -> dict:
+    """One pairs[...] entry: per-edge slopes, Type 1 edge indexes and Type 2 rows."""
+    bench_slope_us = _js_round(qqq_slope, 2) if qqq_slope is not None else 0
+    threshold = bench_slope_us * EXPLOSIVE_MULTIPLE
+    explosive = {
+        sym: _js_round(float(us[i]), 2)
+        for i, sym in enumerate(symbols)
+        if sym not in US_EXCLUDED and np.isfinite(us[i]) and us[i] >= threshold
+    }
+    col = {sym: i for i, sym in enumerate(symbols)}
+
+    edge_slopes = []
+    for us_sym, tw_sym, _, _ in edges:
+        i = col.get(us_sym)
+        us_slope = _js_round(float(us[i]), 2) if i is not None and np.isfinite(us[i]) else None
+        edge_slopes.append([us_slope, tw.get(tw_sym)])
+
+    # Explosive parents in symbol order, each parent's suppliers in file order
+    by_parent: dict[str, list[int]] = {}
+    for k, (us_sym, _, _, _) in enumerate(edges):
+        by_parent.setdefault(us_sym, []).append(k)
+    type1, seen = [], set()
+    for us_sym in explosive:
+        for k in by_parent.get(us_sym, []):
+            tw_slope = edge_slopes[k][1]
+            key = (edges[k][1], us_sym)
+            if tw_slope is None or tw_slope > TYPE1_MAX_TW_SLOPE or key in seen:
+                continue
+            seen.add(key)
+            type1.append(k)
+
+    floor = _js_round(taiex_slope, 2)
+    type2 = [
+        [sym, slope, [p for p in parents.get(sym, []) if p in explosive]]
+        for sym, slope in tw.items() if slope >= floor
+    ]
+    return {
+        "taiex_slope": taiex_slope,
+        "bench_slope_us": bench_slope_us,
+        "explosive_threshold": threshold,
+        "edge_slopes": edge_slopes,
+        "type1": type1,
+        "type2": type2,
+    }
+
+
+def tw_info(metadata: dict[str, dict], taiex: list[dict], data_source: str, latest_bar_source: str) -> dict:
+    """The TW cache fields the route reads besides prices (run_join()'s `info`)."""
+    return {
+        "metadata": metadata,
+        "taiex_latest_date": max((t["date"] for t in taiex), default=None),
+        "data_source": data_source,
+        "latest_bar_source": latest_bar_source,
+    }
+
+
+def load_tw_cache(path: str = TW_CACHE_PATH) -> tuple[dict[str, Series], dict[str, list], str, dict]:
+    """(prices, adjustments, updated_at, info) of the TW cache on disk."""
+    with open(path, encoding="utf-8") as f:
+        cache = json.load(f)
+    prices = {
+        sym: Series([r["date"] for r in v], [r["close"] for r in v])
+        for sym, v in cache.get("prices", {}).items()
+    }
+    data_source = cache.get("data_source", "yfinance [temporary]")
+    info = tw_info(cache.get("metadata") or {}, cache.get("taiex") or [],
+                   data_source, cache.get("latest_bar_source", data_source))
+    return prices, cache.get("adjustments") or {}, cache.get("updated_at", ""), info
+
+
+def _pinned(path: str) -> list[tuple[str, str]]:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return [tuple(p.split(":", 1)) for p in json.load(f).get("pinned", [])]
+    except (OSError, ValueError):
+        return []
+
+
+def run_join(tw_prices: dict[str, Series], tw_adjustments: dict[str, list], tw_updated_at: str,
+             info: dict, pairs: list[tuple[str, str]] | None = None, matrix_path: str = MATRIX_PATH,
+             path: str = JOIN_PATH, windows=WINDOWS) -> dict:
+    """
+    Rebuild supply_chain_join.json for slope_scan's batch of pairs plus the
+    pairs pinned here (`pairs` are pinned from now on). `tw_prices` etc. are
+    the contents of the TW cache written at `tw_updated_at` (just written or
+    just read). Returns {"edges", "pairs", "skipped"} counts.
+    """
+    matrix = Matrix(matrix_path)
+    bench = load_benchmarks()
+    edges = parse_supply_chain()
+    suppliers, parents = graph_indexes(edges)
+
+    pinned = list(dict.fromkeys(_pinned(path) + list(pairs or [])))
+    primary = cached_pair()
+    batch = list(dict.fromkeys(([primary] if primary else []) + pinned_pairs() + pinned
+                               + matrix.trailing_pairs(windows)))
+
+    us = us_slopes(matrix, batch) if batch else np.empty((0, len(matrix.symbols)))
+    tw = tw_slopes(tw_prices, tw_adjustments, batch)
+    out, skipped = {}, 0
+    for k, (d1, d2) in enumerate(batch):
+        taiex = bench_slope(bench, TW_BENCHMARK, d1, d2)
+        if taiex is None:
+            # The route answers these itself (its TAIEX fallback or a 400)
+            skipped += 1
+            continue
+        qqq = bench_slope(bench, US_BENCHMARK, d1, d2)
+        out[f"{d1}:{d2}"] = join_pair(edges, parents, matrix.symbols, us[k], tw[k], taiex, qqq)
+
+    # Names, sectors and MA60 of every TW symbol a served pair can show
+    latest = [tw_prices[sym].dates[-1] for sym in sorted(tw_prices)[:50] if len(tw_prices[sym])]
+    stocks_latest_date = max(latest, default=None)
+    shown = sorted({edges[k][1] for p in out.values() for k in p["type1"]}
+                   | {row[0] for p in out.values() for row in p["type2"]})
+    symbols = {}
+    for sym in shown:
+        meta = info["metadata"].get(sym) or {}
+        series = tw_prices.get(sym)
+        ma60 = calc_ma60(_adjusted(series, tw_adjustments.get(sym)), stocks_latest_date) if series else None
+        symbols[sym] = [meta.get("name") or None, meta.get("sector") or None] + (ma60 or [None, None])
+
+    write_json(path, {
+        "updated_at": datetime.now().isoformat(),
+        "us_updated_at": matrix.updated_at,
+        "tw_updated_at": tw_updated_at,
+        "pinned": [f"{d1}:{d2}" for d1, d2 in pinned],
+        "edges": edges,
+        "tw_suppliers": suppliers,
+        "tw_parents": parents,
+        "pairs": out,
+        "tw": {
+            "data_source": info["data_source"],
+            "latest_bar_source": info["latest_bar_source"],
+            "taiex_latest_date": info["taiex_latest_date"],
+            "stocks_latest_date": stocks_latest_date,
+            "symbols": symbols,
+        },
+    })
+    return {"edges": len(edges), "pairs": len(out), "skipped": skipped}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute the US → TW supply-chain join")
+    parser.add_argument("pairs", nargs="*", metavar="DATE1:DATE2", help="date pairs to pin")
+    parser.add_argument("--windows", type=int, nargs="*", default=list(WINDOWS),
+                        help="trailing trading-day windows ending at the latest bar")
+    parser.add_argument("--matrix", default=MATRIX_PATH)
+    args = parser.parse_args()
+
+    t0 = datetime.now()
+    prices, adjustments, updated_at, info = load_tw_cache()
+    result = run_join(prices, adjustments, updated_at, info, [tuple(p.split(":", 1)) for p in args.pairs],
+                      args.matrix, windows=args.windows)
+    elapsed = (datetime.now() - t0).total_seconds()
+    print(f"{result['edges']} edges × {result['pairs']} pairs → {JOIN_PATH} in {elapsed:.2f}s"
+          + (f" ({result['skipped']} pairs without a TAIEX close)" if result["skipped"] else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+YFinanceProvider under concurrent batches.
+
+yf.download() collects each call's frames in module-level state
+(yfinance.shared._DFS), so two overlapping calls used to lose or swap
+tickers. FakeYFinance reproduces that shared state; the provider must
+still return exactly the tickers of each batch.
+
+  python -m pytest scripts/test_price_providers.py
+"""
+
+import sys
+import threading
+import time
+import types
+import unittest
+
+import pandas as pd
+
+from price_providers import YFinanceProvider
+
+
+class FakeYFinance(types.ModuleType):
+    """download() with yfinance's shared-state shape: reset, fill per ticker, build the frame."""
+
+    def __init__(self):
+        super().__init__("yfinance")
+        self._dfs: dict[str, pd.Series] = {}
+
+    def download(self, tickers, start=None, end=None, threads=True, **kwargs):
+        self._dfs.clear()
+        index = pd.date_range(start, periods=3, freq="B")
+        for k, sym in enumerate(tickers):
+            time.sleep(0.005)  # network latency: lets an overlapping call interleave
+            self._dfs[sym] = pd.Series([10.0 + k, 11.0 + k, 12.0 + k], index=index)
+        frame = pd.concat(self._dfs, axis=1)
+        frame.columns = pd.MultiIndex.from_product([["Close"], list(frame.columns)])
+        return frame
+
+
+class OverlappingBatchesTest(unittest.TestCase):
+    def setUp(self):
+        self._saved = sys.modules.get("yfinance")
+        sys.modules["yfinance"] = FakeYFinance()
+        self.provider = YFinanceProvider(requests_per_minute=1e6)
+
+    def tearDown(self):
+        if self._saved is None:
+            sys.modules.pop("yfinance", None)
+        else:
+            sys.modules["yfinance"] = self._saved
+
+    def test_no_tickers_lost_or_swapped(self):
+        batches = [[f"{n:04d}.TW" for n in range(1000, 1020)], [f"{n:04d}.TWO" for n in range(2000, 2020)]]
+        results: list[dict] = [{}, {}]
+        start = threading.Barrier(len(batches))
+
+        def run(k: int) -> None:
+            start.wait()
+            results[k] = self.provider.fetch(batches[k], "2026-10-01")
+
+        workers = [threading.Thread(target=run, args=(k,)) for k in range(len(batches))]
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+
+        for batch, got in zip(batches, results):
+            self.assertEqual(sorted(got), sorted(batch))
+            for sym, series in got.items():
+                self.assertEqual(len(series), 3, sym)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+台股回檔區段批次掃描（data/tw_pullback_scan.json）
+- 由 update_tw_slope_cache.py 在寫完 cache 後執行，也可單獨執行（讀 tw_price_cache.json）
+- 演算法與 /api/tw-pullback-scanner/detail 的 computePullback() 相同（JG 回檔狀態機）：
+  每支股票取最近 LOOKBACK 根 bar（已套用除權息因子），創新高即開新區段；
+  區段跌幅達 MIN_DROP_PCT 後反彈收復 REBOUND_RESET_PCT 的跌幅，也重新起算
+- 向量化：所有股票排成 (LOOKBACK × 股票數) 的矩陣（右對齊，不足補 NaN），
+  狀態機沿時間軸走 LOOKBACK 步，每一步以 numpy 一次更新全部股票
+- 輸出依目前回檔幅度分桶（15–20 … 35–40%），/api/tw-pullback-scanner 直接讀取；
+  與 MongoDB 路徑相同，只掃描最新交易日有 bar 的股票（totalScanned 為其支數），
+  symbol 保留 cache 的完整代號（2330.TW / 6488.TWO）
+- 回檔幅度是 computePullback() 的區段回檔，不是 ridingwave 掃描的 vs_high_pct，
+  兩條路徑的分桶成員因此可能不同
+
+用法：
+  python scripts/tw_pullback_scan.py
+"""
+
+import json
+import math
+import os
+from datetime import datetime
+
+import numpy as np
+
+from corporate_actions import adjust
+from price_store import DATA_DIR, Series
+
+PULLBACK_PATH = os.path.join(DATA_DIR, "tw_pullback_scan.json")
+TW_CACHE_PATH = os.path.join(DATA_DIR, "tw_price_cache.json")
+LOOKBACK = 250            # 與 detail route 相同：最近 250 個交易日
+REBOUND_RESET_PCT = 40    # 反彈收復跌幅的比例（%）達此值即重新起算區段
+MIN_DROP_PCT = 8          # 區段跌幅至少此值才適用反彈重置
+BUCKETS = [(15, 20), (20, 25), (25, 30), (30, 35), (35, 40)]
+
+
+def _r2(value) -> float:
+    """同 route 的 Math.round(x * 100) / 100（.5 進位）。"""
+    return math.floor(float(value) * 100 + 0.5) / 100
+
+
+def stack_closes(prices: dict[str, Series], adjustments: dict[str, list]) -> tuple[list[str], np.ndarray, np.ndarray, list[str]]:
+    """(股票代號, 收盤矩陣, 日期序號矩陣, 日期表)：每欄為一支股票最近 LOOKBACK 根調整後收盤，右對齊。"""
+    symbols = sorted(sym for sym, s in prices.items() if len(s))
+    closes = np.full((LOOKBACK, len(symbols)), np.nan)
+    day_idx = np.full((LOOKBACK, len(symbols)), -1, dtype=np.int64)
+    all_days = sorted({d for sym in symbols for d in prices[sym].dates[-LOOKBACK:]})
+    col = {d: i for i, d in enumerate(all_days)}
+    for j, sym in enumerate(symbols):
+        s = prices[sym]
+        tail = adjust(Series(s.dates[-LOOKBACK:], s.closes[-LOOKBACK:]), adjustments.get(sym))
+        n = len(tail.closes)
+        closes[LOOKBACK - n:, j] = tail.closes
+        day_idx[LOOKBACK - n:, j] = [col[d] for d in tail.dates]
+    return symbols, closes, day_idx, all_days
+
+
+def detect_segments(closes: np.ndarray) -> dict[str, np.ndarray]:
+    """computePullback() 的狀態機，沿時間軸一次推進所有股票；回傳各欄位（每支股票一個值）。"""
+    rows, m = closes.shape
+    seg_high = np.full(m, np.nan)
+    seg_low = np.full(m, np.nan)
+    high_at = np.full(m, -1, dtype=np.int64)
+    low_at = np.full(m, -1, dtype=np.int64)
+    max_dd = np.zeros(m)
+    last = np.full(m, np.nan)
+
+    def reset(mask, c, i):
+        seg_high[mask] = c[mask]
+        seg_low[mask] = c[mask]
+        high_at[mask] = i
+        low_at[mask] = i
+        max_dd[mask] = 0
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        for i in range(rows):
+            c = closes[i]
+            valid = ~np.isnan(c)
+            first = valid & np.isnan(seg_high)
+            reset(first, c, i)
+            rest = valid & ~first
+            new_high = rest & (c > seg_high)
+            reset(new_high, c, i)
+
+            other = rest & ~new_high
+            dd = (seg_high - c) / seg_high * 100
+            deeper = other & (dd > max_dd)
+            max_dd[deeper] = dd[deeper]
+            lower = other & (c < seg_low)
+            seg_low[lower] = c[lower]
+            low_at[lower] = i
+
+            rebound = c - seg_low
+            prev_drop = seg_high - seg_low
+            drop_pct = prev_drop / seg_high * 100
+            reset(other & (prev_drop > 0) & (drop_pct >= MIN_DROP_PCT)
+                  & (rebound / prev_drop * 100 >= REBOUND_RESET_PCT), c, i)
+            last[valid] = c[valid]
+
+        prev_drop = seg_high - seg_low
+        return {
+            "close": last,
+            "seg_high": seg_high,
+            "seg_low": seg_low,
+            "high_at": high_at,
+            "low_at": low_at,
+            "max_dd": max_dd,
+            "current_dd": (seg_high - last) / seg_high * 100,
+            "rebound": np.where(prev_drop > 0, (last - seg_low) / prev_drop * 100, 0.0),
+        }
+
+
+def run_pullback_scan(prices: dict[str, Series], adjustments: dict[str, list], metadata: dict[str, dict],
+                      source_updated_at: str = "", path: str = PULLBACK_PATH) -> dict:
+    """掃描全部股票並寫出分桶結果；回傳寫出的內容。"""
+    symbols, closes, day_idx, all_days = stack_closes(prices, adjustments)
+    seg = detect_segments(closes)
+    # 最後一列是各股最新一根 bar（右對齊）：只算最新交易日有收盤的股票
+    current = day_idx[-1] == len(all_days) - 1
+
+    buckets: dict[str, list] = {f"b{lo}_{hi}": [] for lo, hi in BUCKETS}
+    in_range = (seg["current_dd"] >= BUCKETS[0][0]) & (seg["current_dd"] < BUCKETS[-1][1])
+    for j in np.flatnonzero(current & in_range):
+        dd = float(seg["current_dd"][j])
+        lo, hi = next((lo, hi) for lo, hi in BUCKETS if lo <= dd < hi)
+        sym = symbols[j]
+        buckets[f"b{lo}_{hi}"].append({
+            "symbol": sym,
+            "name": metadata.get(sym, {}).get("name", sym),
+            "currentDrawdownPct": _r2(dd),
+            "segmentHigh": _r2(seg["seg_high"][j]),
+            "segmentHighDate": all_days[day_idx[seg["high_at"][j], j]],
+            "segmentLow": _r2(seg["seg_low"][j]),
+            "segmentLowDate": all_days[day_idx[seg["low_at"][j], j]],
+            "maxDrawdownPct": _r2(seg["max_dd"][j]),
+            "reboundPctFromLow": _r2(seg["rebound"][j]),
+            "close": _r2(seg["close"][j]),
+        })
+    for items in buckets.values():
+        items.sort(key=lambda s: s["currentDrawdownPct"])
+
+    result = {
+        "updated_at": datetime.now().isoformat(),
+        "source_updated_at": source_updated_at,
+        "date": all_days[-1] if all_days else "",
+        "totalScanned": int(current.sum()),
+        "lookback": LOOKBACK,
+        "buckets": buckets,
+    }
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp, path)
+    return result
+
+
+def main():
+    import time
+
+    with open(TW_CACHE_PATH, encoding="utf-8") as f:
+        cache = json.load(f)
+    prices = {
+        sym: Series([r["date"] for r in v], [r["close"] for r in v])
+        for sym, v in cache.get("prices", {}).items() if v
+    }
+    t0 = time.perf_counter()
+    result = run_pullback_scan(prices, cache.get("adjustments") or {}, cache.get("metadata") or {},
+                               cache.get("updated_at", ""))
+    counts = " ".join(f"{k}={len(v)}" for k, v in result["buckets"].items())
+    print(f"回檔掃描: {result['totalScanned']} 支，{result['date']}，{counts}"
+          f"（{time.perf_counter() - t0:.2f}s）→ {PULLBACK_PATH}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,65 +2,90 @@
 """
 Slope Scanner Data Updater (incremental, FMP-only, daily-refresh mode)
 
-Universe: S&P 500 + NASDAQ clean common stocks (market cap >$500M, US, non-ETF/fund)
-+ QQQ/SPY/IWM benchmarks
+Universe: S&P 500 + NASDAQ clean common stocks (market cap >$500M, US, non-ETF/fund),
+snapshotted in data/universe_snapshot.json and revalidated with ETag /
+If-Modified-Since after UNIVERSE_TTL_HOURS. Symbols that leave it are pruned.
 
 Daily refresh behaviour:
   - NEW symbols: fetch full 550-day history
-  - STALE symbols (latest date older than 3 days): fetch only recent data from last date
+  - STALE symbols (latest date older than 3 days): fetch from last date, re-reading OVERLAP_DAYS known bars
   - FRESH symbols (latest date within 3 days): skip (already up to date)
-
-Checkpoint: saves to price_cache.json every SAVE_EVERY symbols to survive SIGKILL.
+Stale symbols are served from bulk EOD requests where that is cheaper
+(plan_update_strategy()); the rest go per symbol through price_providers'
+router and fmp_client's rate-limited, retrying client.
+
+Storage: data/price_store.bin (price_store.py) holds raw closes plus the
+corporate-action factor table in its meta (corporate_actions.py); readers
+apply the factors. Uniformly rescaled overlap bars are recorded as one event,
+changed ones as "restated_bars". Each fetched symbol is journaled first, so
+a killed run resumes where it stopped.
+
+Outputs after the save:
+  - data/slope_matrix.bin and the slope scans (slope_matrix.py, slope_scan.py)
+  - data/indicators_us.json (indicators.py)
+  - data/supply_chain_join.json (supply_chain_join.py; needs the TW cache)
+The scans and the join need numpy and are skipped without it. Benchmarks
+(QQQ/SPY/IWM) live in data/benchmarks.json (benchmark_store.py).
+
+Options: --export-json also writes the legacy price_cache.json layout;
+--refresh-universe ignores the snapshot TTL.
 NO yfinance. FMP-only.
 """
 
+import argparse
 import json
 import os
-import time
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, date
 
-import requests
+from benchmark_store import US_BENCHMARKS, reference as benchmark_reference, update_benchmarks
+from corporate_actions import add_event, add_provider_events, detect_rebase, to_raw_basis
+from fmp_client import FMPClient
+from indicators import INDICATOR_PATHS, update_indicators
+from price_providers import build_router
+from price_store import (
+    JSON_PATH, STORE_PATH, Journal, PriceCache, Series, export_json, load_prices, merge_records, quantize,
+    save_store,
+)
+from rate_limit import AdaptiveThrottle, TokenBucket
+from slope_matrix import MATRIX_PATH, write_slope_matrix
 
-API_KEY = os.environ.get("FMP_API_KEY", "3c03eZvjdPpKONYydbgoAT9chCaQDnsp")
-BASE_URL = "https://financialmodelingprep.com"
 DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
-RATE_LIMIT_SLEEP = 0.07
-SAVE_EVERY = 100          # checkpoint every N symbols
+REQUESTS_PER_MINUTE = int(os.environ.get("FMP_RPM", "750"))  # ceiling; the throttle finds the real limit below it
+MAX_WORKERS = int(os.environ.get("FMP_WORKERS", "8"))        # max concurrent requests in flight
+SAVE_EVERY = 100          # fsync the journal every N symbols
 FRESH_DAYS = 3            # skip if latest date is within this many days of today
+BULK_REQUEST_COST = 25    # one eod-bulk call (whole-market payload) ≈ this many per-symbol calls
+UNIVERSE_PATH = os.path.join(DATA_DIR, "universe_snapshot.json")
+UNIVERSE_TTL_HOURS = float(os.environ.get("UNIVERSE_TTL_HOURS", "20"))  # reuse the snapshot within this age
+PRUNE_GUARD = 0.8         # don't prune when the universe shrank below this fraction of the last one
+OVERLAP_DAYS = 7          # per-symbol updates re-read this many days of known bars to catch restatements
+SPLIT_SUSPECT = 0.3       # bulk bar moving more than this vs the last close → re-check per-symbol
+
+limiter = TokenBucket(REQUESTS_PER_MINUTE, burst=MAX_WORKERS)
+throttle = AdaptiveThrottle(MAX_WORKERS)
+fmp = FMPClient(limiter=limiter, throttle=throttle, pool_size=MAX_WORKERS)
+providers = build_router("fmp", fmp)  # PRICE_PROVIDERS=fixture for offline runs
 
 
-def fetch_json(url: str) -> list | dict:
-    resp = requests.get(url, timeout=30)
-    resp.raise_for_status()
-    return resp.json()
+def load_universe_snapshot(path: str = UNIVERSE_PATH) -> dict | None:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
 
 
-def save_cache(cache: dict, path: str) -> None:
-    """Atomic write: temp file → rename."""
+def save_universe_snapshot(snapshot: dict, path: str = UNIVERSE_PATH) -> None:
     tmp = path + ".tmp"
     with open(tmp, "w") as f:
-        json.dump(cache, f)
+        json.dump(snapshot, f, indent=1)
     os.replace(tmp, path)
 
 
-def get_universe() -> tuple[set, set, set]:
-    """Returns (sp500, nasdaq_clean, all_with_benchmarks)."""
-    print("  Fetching S&P 500...", flush=True)
-    sp500_raw = fetch_json(f"{BASE_URL}/stable/sp500-constituent?apikey={API_KEY}")
-    sp500 = {x["symbol"] for x in sp500_raw if x.get("symbol")}
-    time.sleep(RATE_LIMIT_SLEEP)
-    print(f"    SP500: {len(sp500)}", flush=True)
-
-    print("  Fetching NASDAQ screener...", flush=True)
-    screener_url = (
-        f"{BASE_URL}/stable/company-screener"
-        f"?exchange=NASDAQ&isEtf=false&isFund=false"
-        f"&isActivelyTrading=true&marketCapMoreThan=500000000&limit=5000"
-        f"&apikey={API_KEY}"
-    )
-    raw = fetch_json(screener_url)
-    time.sleep(RATE_LIMIT_SLEEP)
-
+def clean_nasdaq(raw: list) -> set:
+    """Screener rows → US common stocks with a sector (no ETFs/funds, no dotted share classes)."""
     nasdaq: set = set()
     for x in raw:
         sym = x.get("symbol", "")
@@ -72,26 +97,75 @@ def get_universe() -> tuple[set, set, set]:
             and not x.get("isFund", False)
         ):
             nasdaq.add(sym)
-    print(f"    NASDAQ clean: {len(nasdaq)} (from {len(raw)} raw)", flush=True)
+    return nasdaq
+
+
+def get_universe(refresh: bool = False) -> tuple[set, set, set, set | None]:
+    """
+    Returns (sp500, nasdaq_clean, all, previous_all). Benchmarks are not part of
+    the universe; they live in the benchmark store.
+    previous_all is the universe from the last snapshot (None on first run).
+    A snapshot younger than UNIVERSE_TTL_HOURS is reused as is; an older one is
+    revalidated with conditional requests, so an unchanged list costs a 304.
+    """
+    snap = load_universe_snapshot()
+    prev_all = set(snap["sp500"]) | set(snap["nasdaq"]) if snap else None
+    if snap and not refresh:
+        age_h = (datetime.now() - datetime.fromisoformat(snap["fetched_at"])).total_seconds() / 3600
+        if age_h < UNIVERSE_TTL_HOURS:
+            sp500, nasdaq = set(snap["sp500"]), set(snap["nasdaq"])
+            print(f"  Reusing universe snapshot of {snap['date']} ({age_h:.1f}h old): "
+                  f"SP500 {len(sp500)}, NASDAQ clean {len(nasdaq)}", flush=True)
+            return sp500, nasdaq, sp500 | nasdaq, prev_all
+    validators = snap.get("validators", {}) if snap else {}
 
-    all_syms = sp500 | nasdaq | {"QQQ", "SPY", "IWM"}
+    print("  Fetching S&P 500...", flush=True)
+    sp500_raw, validators["sp500"] = fmp.get_json_conditional("/stable/sp500-constituent", validators.get("sp500"))
+    if sp500_raw is None:
+        sp500 = set(snap["sp500"])
+        print(f"    SP500: {len(sp500)} (not modified)", flush=True)
+    else:
+        sp500 = {x["symbol"] for x in sp500_raw if x.get("symbol")}
+        print(f"    SP500: {len(sp500)}", flush=True)
+
+    print("  Fetching NASDAQ screener...", flush=True)
+    raw, validators["nasdaq"] = fmp.get_json_conditional(
+        "/stable/company-screener", validators.get("nasdaq"),
+        exchange="NASDAQ", isEtf="false", isFund="false",
+        isActivelyTrading="true", marketCapMoreThan=500000000, limit=5000,
+    )
+    if raw is None:
+        nasdaq = set(snap["nasdaq"])
+        print(f"    NASDAQ clean: {len(nasdaq)} (not modified)", flush=True)
+    else:
+        nasdaq = clean_nasdaq(raw)
+        print(f"    NASDAQ clean: {len(nasdaq)} (from {len(raw)} raw)", flush=True)
+
+    save_universe_snapshot({
+        "date": date.today().isoformat(),
+        "fetched_at": datetime.now().isoformat(),
+        "sp500": sorted(sp500),
+        "nasdaq": sorted(nasdaq),
+        "validators": validators,
+    })
+    all_syms = sp500 | nasdaq
     print(f"  Universe total: {len(all_syms)}", flush=True)
-    return sp500, nasdaq, all_syms
+    return sp500, nasdaq, all_syms, prev_all
 
 
-def get_fetch_mode(sym: str, existing_prices: dict[str, list]) -> tuple[str, str]:
+def get_fetch_mode(sym: str, index: dict[str, dict]) -> tuple[str, str]:
     """
-    Returns (mode, from_date):
+    Returns (mode, from_date), from the per-symbol index only:
       ('skip', '')           - data is fresh, no fetch needed
       ('full', '2024-xx-xx') - new symbol, fetch full history
       ('update', '2026-xx-xx') - stale symbol, fetch from last date + 1
     """
-    records = existing_prices.get(sym)
-    if not records:
+    entry = index.get(sym)
+    if not entry:
         from_date = (datetime.now() - timedelta(days=550)).strftime("%Y-%m-%d")
         return "full", from_date
 
-    latest_str = max(r["date"] for r in records)
+    latest_str = entry["last"]
     latest = date.fromisoformat(latest_str)
     days_old = (date.today() - latest).days
 
@@ -103,61 +177,148 @@ def get_fetch_mode(sym: str, existing_prices: dict[str, list]) -> tuple[str, str
         return "update", next_day
 
 
-def fetch_symbol(sym: str, from_date: str) -> list:
-    url = (
-        f"{BASE_URL}/stable/historical-price-eod/full"
-        f"?symbol={sym}&from={from_date}&apikey={API_KEY}"
+def fetch_symbol(sym: str, from_date: str) -> Series:
+    """Ascending bars since from_date from the routed provider, quantized for the store."""
+    series = providers.fetch([sym], from_date).get(sym)
+    return Series(series.dates, quantize(series.closes)) if series else Series([], [])
+
+
+def weekdays_since(from_date: str, until: date) -> list[str]:
+    d = date.fromisoformat(from_date)
+    days = []
+    while d <= until:
+        if d.weekday() < 5:
+            days.append(d.isoformat())
+        d += timedelta(days=1)
+    return days
+
+
+def plan_update_strategy(update_list: list[tuple[str, str, str]]) -> tuple[str | None, int]:
+    """
+    Pick the cheapest split of the stale set between bulk EOD and per-symbol fetches.
+    Returns (bulk_from, est_requests): stale symbols with from_date >= bulk_from are
+    served by one bulk request per weekday since bulk_from, the older ones per symbol.
+    bulk_from is None when per-symbol fetching is cheaper for everything.
+    """
+    today = date.today()
+    froms = sorted(from_date for _, _, from_date in update_list)
+    best_from, best_cost = None, len(froms)
+    for i, from_date in enumerate(froms):
+        if i and from_date == froms[i - 1]:
+            continue
+        # symbols before i (older) go per symbol; the rest share the bulk days
+        cost = len(weekdays_since(from_date, today)) * BULK_REQUEST_COST + i
+        if cost < best_cost:
+            best_from, best_cost = from_date, cost
+    requests_needed = best_cost if best_from is None else (
+        len(weekdays_since(best_from, today)) + sum(1 for f in froms if f < best_from)
     )
-    data = fetch_json(url)
-    if isinstance(data, list):
-        return [
-            {"date": r["date"], "close": r["close"]}
-            for r in data
-            if "date" in r and "close" in r
-        ]
-    return []
+    return best_from, requests_needed
+
 
+def fetch_bulk_updates(
+    bulk_list: list[tuple[str, str, str]],
+) -> tuple[dict[str, Series], list[tuple[str, str, str]], int]:
+    """
+    Fill stale symbols from per-day bulk EOD payloads.
+    Returns (series by symbol, gap tasks for per-symbol fallback, days with bars).
+    A symbol is a gap when any trading day since its from_date is missing from the
+    bulk payload for it (or that day's request failed).
+    """
+    wanted = {sym for sym, _, _ in bulk_list}
+    days = weekdays_since(min(f for _, _, f in bulk_list), date.today())
 
-def merge_records(existing: list, new_records: list) -> list:
-    """Merge new records into existing, overwriting on date collision."""
-    date_map = {r["date"]: r for r in existing}
-    for r in new_records:
-        date_map[r["date"]] = r
-    return sorted(date_map.values(), key=lambda x: x["date"])
+    def fetch_day(day: str) -> tuple[str, dict | None]:
+        try:
+            return day, fmp.eod_bulk(day, wanted)
+        except Exception as e:
+            print(f"  WARN: eod-bulk {day}: {e}", flush=True)
+            return day, None
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        by_day = dict(pool.map(fetch_day, days))
+
+    failed_days = [d for d, rows in by_day.items() if rows is None]
+    trading_days = [d for d in days if by_day[d]]  # empty payload → holiday / not published yet
+    series: dict[str, Series] = {}
+    gaps: list[tuple[str, str, str]] = []
+    for sym, mode, from_date in bulk_list:
+        if any(d >= from_date for d in failed_days):
+            gaps.append((sym, mode, from_date))
+            continue
+        expected = [d for d in trading_days if d >= from_date]
+        rows = [by_day[d].get(sym) for d in expected]
+        if any(r is None for r in rows):
+            gaps.append((sym, mode, from_date))
+        elif rows:
+            series[sym] = Series(expected, quantize(r["close"] for r in rows))
+    return series, gaps, len(trading_days)
+
+
+def fetch_task(task: tuple[str, str, str]) -> tuple[str, str, Series | None, Exception | None]:
+    """Worker entry point: never raises, so one bad symbol can't stop the pool."""
+    sym, mode, from_date = task
+    if mode == "update":
+        # Same single request, a few more rows: lets merge_records() see vendor corrections
+        from_date = (date.fromisoformat(from_date) - timedelta(days=OVERLAP_DAYS)).isoformat()
+    try:
+        return sym, mode, fetch_symbol(sym, from_date), None
+    except Exception as e:
+        return sym, mode, None, e
 
 
 def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--export-json", action="store_true", help="also write legacy data/price_cache.json")
+    parser.add_argument("--refresh-universe", action="store_true", help="ignore the universe snapshot TTL")
+    args = parser.parse_args()
+
     os.makedirs(DATA_DIR, exist_ok=True)
-    price_path = os.path.join(DATA_DIR, "price_cache.json")
 
     print("=== Slope Cache Updater (daily-refresh, FMP-only) ===", flush=True)
-    print(f"Output: {price_path}", flush=True)
+    print(f"Output: {STORE_PATH}", flush=True)
 
     # 1. Build universe
     print("\n[1/2] Building universe...", flush=True)
-    sp500, nasdaq, all_syms = get_universe()
+    sp500, nasdaq, all_syms, prev_all = get_universe(args.refresh_universe)
+    added = sorted(all_syms - prev_all) if prev_all is not None else []
+    dropped = sorted(prev_all - all_syms) if prev_all is not None else []
+    if prev_all is not None:
+        print(f"  Diff vs previous snapshot: +{len(added)} {added[:10]} / -{len(dropped)} {dropped[:10]}", flush=True)
+
+    # Benchmarks — their own incremental store; earlier stores that still hold them prune them below
+    bench = update_benchmarks(providers, US_BENCHMARKS, "US")
 
     # 2. Load existing cache
     print("\n[2/2] Loading existing cache...", flush=True)
-    cache: dict = {"prices": {}, "symbols": []}
-    if os.path.exists(price_path):
-        try:
-            cache = json.load(open(price_path))
-            existing_count = len(cache.get("symbols", []))
-            print(f"  Existing: {existing_count} symbols", flush=True)
-        except Exception as e:
-            print(f"  WARN: could not load existing cache: {e}", flush=True)
-
-    existing_prices: dict = cache.get("prices", {})
+    cache = PriceCache()
+    try:
+        cache, replayed = load_prices()
+        print(f"  Existing: {len(cache.prices)} symbols", flush=True)
+        if replayed:
+            print(f"  Replayed {replayed} journal entries from an interrupted run", flush=True)
+    except Exception as e:
+        print(f"  WARN: could not load existing cache: {e}", flush=True)
+
+    # Prune symbols that left the universe, unless the universe looks truncated
+    pruned = sorted(set(cache.prices) - all_syms)
+    if pruned and prev_all and len(all_syms) < PRUNE_GUARD * len(prev_all):
+        print(f"  WARN: universe shrank {len(prev_all)} → {len(all_syms)}; keeping {len(pruned)} "
+              f"symbols not in it", flush=True)
+        pruned = []
+    for sym in pruned:
+        cache.drop(sym)
+    if pruned:
+        print(f"  Pruned {len(pruned)} symbols no longer in the universe: {pruned[:10]}", flush=True)
 
     # 3. Determine what to fetch for each symbol
     full_list, update_list, skip_list = [], [], []
     for sym in sorted(all_syms):
-        mode, from_date = get_fetch_mode(sym, existing_prices)
+        mode, from_date = get_fetch_mode(sym, cache.index)
         if mode == "full":
-            full_list.append((sym, from_date))
+            full_list.append((sym, mode, from_date))
         elif mode == "update":
-            update_list.append((sym, from_date))
+            update_list.append((sym, mode, from_date))
         else:
             skip_list.append(sym)
 
@@ -165,61 +326,184 @@ def main():
     print(f"  STALE symbols (update): {len(update_list)}", flush=True)
     print(f"  FRESH symbols (skip): {len(skip_list)}", flush=True)
 
-    # 4. Fetch
-    to_process = full_list + update_list  # process new first, then updates
+    # 4. Plan the update strategy (bulk EOD vs per-symbol) for the stale set
+    # Bulk EOD is an FMP endpoint; other providers take every stale symbol per-symbol
+    bulk_ok = "fmp" in providers.names and bool(update_list)
+    bulk_from, est_requests = plan_update_strategy(update_list) if bulk_ok else (None, 0)
+    bulk_list = [t for t in update_list if bulk_from is not None and t[2] >= bulk_from]
+    bulk_syms = {sym for sym, _, _ in bulk_list}
+    symbol_updates = [t for t in update_list if t[0] not in bulk_syms]
+    if bulk_list:
+        print(f"  Update strategy: bulk EOD since {bulk_from} for {len(bulk_list)} symbols, "
+              f"per-symbol for {len(symbol_updates)} (~{est_requests} requests)", flush=True)
+    elif update_list:
+        print(f"  Update strategy: per-symbol ({len(update_list)} requests)", flush=True)
+
+    # 5. Fetch — workers only do I/O; merging and checkpoints stay on this thread.
     failed: list = []
     empty: list = []
+    restated: dict[str, list[dict]] = {}  # vendor corrections to bars we already had
+    adjustments: dict[str, list] = cache.meta.setdefault("adjustments", {})
+    rebased: dict[str, list] = {}  # this run's new adjustment events
     processed = 0
-    total = len(to_process)
-
-    for i, (sym, from_date) in enumerate(to_process):
-        mode = "full" if (sym, from_date) in full_list else "update"
-        try:
-            new_records = fetch_symbol(sym, from_date)
-            if new_records:
-                if mode == "update" and existing_prices.get(sym):
-                    # Merge new records with existing
-                    existing_prices[sym] = merge_records(existing_prices[sym], new_records)
-                else:
-                    existing_prices[sym] = new_records
-                processed += 1
-            else:
-                empty.append(sym)
-            time.sleep(RATE_LIMIT_SLEEP)
-        except Exception as e:
-            print(f"  WARN: {sym}: {e}", flush=True)
+    applied = 0
+    total = len(full_list) + len(update_list)
+    journal = Journal()
+    journal_bytes = 0
+
+    def apply(sym: str, mode: str, new_series: Series | None, err: Exception | None) -> None:
+        nonlocal processed, applied, journal_bytes
+        if err is not None:
+            print(f"  WARN: {sym}: {err}", flush=True)
             failed.append(sym)
-            time.sleep(RATE_LIMIT_SLEEP)
+        elif new_series:
+            if mode == "update" and sym in cache.prices:
+                old_series = cache.prices[sym]
+                rebase = detect_rebase(old_series, adjustments.get(sym), new_series)
+                if rebase and add_event(adjustments, sym, *rebase, old_series.closes[-1]):
+                    # History was rebased, not corrected: keep our bars, append only unseen ones
+                    rebased[sym] = list(rebase)
+                    n = bisect_right(new_series.dates, old_series.dates[-1])
+                    new_series = Series(new_series.dates[n:], new_series.closes[n:])
+                add_provider_events(adjustments, sym, new_series, after=old_series.dates[-1])
+                # Re-read bars before an ex_date arrive adjusted; merge them on the raw basis
+                new_series = to_raw_basis(old_series, adjustments.get(sym), new_series)
+                # Merge new records with existing
+                changed: list[dict] = []
+                cache.put(sym, merge_records(old_series, new_series, changed))
+                if changed:
+                    restated[sym] = changed
+                journal.append(sym, "merge", new_series, adjustments.get(sym))
+            else:
+                # A full history is raw on the vendor's current split basis; its events come with it
+                adjustments.pop(sym, None)
+                add_provider_events(adjustments, sym, new_series)
+                cache.put(sym, new_series)
+                journal.append(sym, "replace", new_series, adjustments.get(sym))
+            processed += 1
+        else:
+            empty.append(sym)
 
-        if (i + 1) % 100 == 0:
-            pct = round((i + 1) / total * 100)
-            print(f"  [{i+1}/{total}] {pct}% done (ok={processed} fail={len(failed)} empty={len(empty)})", flush=True)
+        applied += 1
+        if applied % 100 == 0:
+            pct = round(applied / total * 100)
+            print(f"  [{applied}/{total}] {pct}% done (ok={processed} fail={len(failed)} empty={len(empty)})", flush=True)
 
         # Checkpoint
-        if (i + 1) % SAVE_EVERY == 0:
-            cache["prices"] = existing_prices
-            cache["symbols"] = sorted(existing_prices.keys())
-            cache["updated_at"] = datetime.now().isoformat()
-            save_cache(cache, price_path)
-            print(f"  [checkpoint] saved {len(cache['symbols'])} symbols", flush=True)
-
-    # 5. Final save
-    cache["prices"] = existing_prices
-    cache["symbols"] = sorted(existing_prices.keys())
-    cache["updated_at"] = datetime.now().isoformat()
-    cache["universe_source"] = "SP500 + NASDAQ screener (FMP, cap>500M, US, no ETF/fund)"
-    cache["universe_sp500"] = len(sp500)
-    cache["universe_nasdaq_clean"] = len(nasdaq)
-    cache["universe_total"] = len(all_syms)
-    cache["failed_symbols"] = failed
-    cache["empty_symbols"] = empty
-    save_cache(cache, price_path)
+        if applied % SAVE_EVERY == 0:
+            journal_bytes += journal.sync()
+            print(f"  [checkpoint] journal synced ({journal_bytes / 1024:.0f} KB so far)", flush=True)
+
+    bulk_series: dict[str, Series] = {}
+    if bulk_list:
+        bulk_series, gaps, trading_days = fetch_bulk_updates(bulk_list)
+        # A split shows up in bulk bars as a jump against the stored close; the
+        # per-symbol fetch re-reads overlap bars, which tells a split from a real move.
+        # A non-positive stored close has no ratio to check, so it is a suspect too.
+        def split_suspect(sym: str) -> bool:
+            last_close = cache.index[sym]["last_close"]
+            return last_close <= 0 or abs(bulk_series[sym].closes[0] / last_close - 1) > SPLIT_SUSPECT
+
+        suspects = [t for t in bulk_list if t[0] in bulk_series and split_suspect(t[0])]
+        for sym, _, _ in suspects:
+            del bulk_series[sym]
+        print(f"  Bulk EOD: {trading_days} trading days, {len(bulk_series)} symbols filled, "
+              f"{len(gaps)} gaps + {len(suspects)} split suspects → per-symbol", flush=True)
+        symbol_updates = symbol_updates + gaps + suspects
+
+    # pool.map yields in submission order, so new symbols are still applied first.
+    to_process = full_list + symbol_updates  # process new first, then updates
+    print(f"  Per-symbol fetches: {len(to_process)} "
+          f"(workers: {MAX_WORKERS}, quota: {REQUESTS_PER_MINUTE} req/min)", flush=True)
+    retry_queue: list[tuple[str, str, str]] = []
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        for task, result in zip(to_process, pool.map(fetch_task, to_process)):
+            if result[3] is not None:
+                print(f"  WARN: {task[0]}: {result[3]} — queued for retry", flush=True)
+                retry_queue.append(task)
+            else:
+                apply(*result)
+    for sym, new_series in bulk_series.items():
+        apply(sym, "update", new_series, None)
+
+    # Retry queue — the throttle has settled by now, so these run at the window it found
+    if retry_queue:
+        print(f"  Retrying {len(retry_queue)} symbols (window {int(throttle.limit)}/{MAX_WORKERS})", flush=True)
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+            for result in pool.map(fetch_task, retry_queue):
+                apply(*result)
+
+    # 6. Final save — compact the journal into the store
+    meta = cache.meta
+    meta["updated_at"] = datetime.now().isoformat()
+    meta["universe_source"] = "SP500 + NASDAQ screener (FMP, cap>500M, US, no ETF/fund)"
+    meta["universe_sp500"] = len(sp500)
+    meta["universe_nasdaq_clean"] = len(nasdaq)
+    meta["universe_total"] = len(all_syms)
+    meta["universe_added"] = added
+    meta["universe_dropped"] = dropped
+    meta["pruned_symbols"] = pruned
+    meta["failed_symbols"] = failed
+    meta["empty_symbols"] = empty
+    meta["restated_bars"] = restated
+    meta["rebased_symbols"] = rebased
+    meta["benchmarks"] = benchmark_reference(bench, US_BENCHMARKS)
+    journal.sync()
+    save_store(STORE_PATH, cache)
+    journal.discard()
+
+    # 7. Slope matrix — the scanners' forward-filled lookup table
+    matrix = write_slope_matrix(cache, MATRIX_PATH)
+    print(f"  Slope matrix: {len(matrix['symbols'])} symbols × {len(matrix['dates'])} days → {MATRIX_PATH}", flush=True)
+    try:
+        from slope_scan import SCANS_PATH, refresh as refresh_scans
+    except ImportError:
+        print("  Slope scans: skipped (numpy not installed)", flush=True)
+    else:
+        try:
+            scans = refresh_scans(MATRIX_PATH)
+            print(f"  Slope scans: {scans['scans']} precomputed → {SCANS_PATH} "
+                  f"(slope_cache.json: {scans['cache'] or 'no pair'})", flush=True)
+        except KeyError as e:
+            print(f"  Slope scans: skipped ({e})", flush=True)
+
+    # 8. Indicator table — SMA/ATR/range/drawdown at each symbol's latest bar
+    ind = update_indicators("US", cache.prices, adjustments, meta["updated_at"])
+    print(f"  Indicators: {ind['appended']} appended ({ind['bars']} bars), {ind['rebuilt']} rebuilt, "
+          f"{ind['unchanged']} unchanged, {ind['dropped']} dropped → {INDICATOR_PATHS['US']}", flush=True)
+
+    # 9. Supply-chain join — US explosive names × TW supplier slopes, per precomputed pair
+    try:
+        from supply_chain_join import JOIN_PATH, TW_CACHE_PATH, load_tw_cache, run_join
+    except ImportError:
+        print("  Supply-chain join: skipped (numpy not installed)", flush=True)
+    else:
+        if os.path.exists(TW_CACHE_PATH):
+            join = run_join(*load_tw_cache(), matrix_path=MATRIX_PATH)
+            print(f"  Supply-chain join: {join['edges']} edges × {join['pairs']} pairs → {JOIN_PATH}", flush=True)
+        else:
+            print("  Supply-chain join: skipped (no TW price cache)", flush=True)
+    if args.export_json:
+        export_json(JSON_PATH, cache)
+        print(f"  Exported legacy JSON: {JSON_PATH}", flush=True)
 
     print(f"\n=== Done ===", flush=True)
-    print(f"  Total in cache: {len(cache['symbols'])}", flush=True)
+    print(f"  Total in cache: {len(cache.prices)}", flush=True)
+    print(f"  Latest bar: {max((e['last'] for e in cache.index.values()), default='N/A')}", flush=True)
     print(f"  New: {len(full_list)}, Updated: {len(update_list)}, Skipped: {len(skip_list)}", flush=True)
-    print(f"  Failed: {len(failed)} — {failed[:10]}", flush=True)
+    print(f"  Failed: {len(failed)} — {failed[:10]} (after retrying {len(retry_queue)})", flush=True)
+    print(f"  Providers: {', '.join(providers.names)} — {providers.summary()}", flush=True)
+    print(f"  Throttled responses: {throttle.throttled}, retried requests: {fmp.retried}, "
+          f"final window: {int(throttle.limit)}/{MAX_WORKERS}", flush=True)
     print(f"  Empty: {len(empty)}", flush=True)
+    if restated:
+        n_bars = sum(len(v) for v in restated.values())
+        sym, diff = next(iter(restated.items()))
+        print(f"  Restated: {n_bars} bars across {len(restated)} symbols — e.g. {sym} {diff[0]}", flush=True)
+    if rebased:
+        sym, event = next(iter(rebased.items()))
+        print(f"  Adjustment events: {len(rebased)} symbols rebased — e.g. {sym} {event} "
+              f"({len(adjustments)} symbols with factors)", flush=True)
     print(f"  NOTE: short_interest.json NOT updated (yfinance excluded per policy)", flush=True)
 
 
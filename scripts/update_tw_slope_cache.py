@@ -1,10 +1,23 @@
 #!/usr/bin/env python3
 """
 台股斜率選股資料更新腳本 (v2)
-- TAIEX：FMP ^TWII
+- TAIEX：^TWII（FMP，失敗時 yfinance），增量存於 data/benchmarks.json
 - 台股價格：yfinance（TWSE + TPEx）[temporary source]
+- 除權息：原始收盤 + 調整因子表（adjustments），讀取時套用
+- 來源皆經 price_providers 的 router（PRICE_PROVIDERS=fixture 可離線測試）
 - 輸出：data/tw_price_cache.json
 
+流程：
+  1. 清單：TWSE + TPEx 當日收盤清單，快取於 data/tw_listing.json（條件式重新驗證）
+  2. 規劃：只讀 cache 內的 per-symbol index，分為新股票（全量 400 天）、
+     過期（重讀 OVERLAP_DAYS 天補尾段）、已是最新（略過）
+  3. 下載：yfinance 批次依序、批內多執行緒，失敗拆批重試；清單收盤直接接上最新 bar
+  4. merge 保護：不倒退；重讀的 bar 偵測分割，yfinance 回報的除息事件記入 adjustments
+  5. 輸出：串流原子寫入（updated_at 為第一個欄位），先以內容摘要 hard link 備份
+  6. 衍生檔：指標表、回檔掃描、供應鏈 join（後兩者需要 numpy，join 另需美股 slope matrix）
+
+選項：--force 全量更新；--daily 只用清單收盤接上一根 bar，缺口留給一般模式回補
+
 修正記錄 (2026-06-26):
   - 延長歷史至 400 天（約 250 個交易日）
   - 加入 merge 保護：新資料若比現有舊，保留現有資料
@@ -13,147 +26,468 @@
   - 加入 --force flag（強制全量更新）
 """
 
+import hashlib
 import json
 import os
+import shutil
 import sys
 import time
 import requests
 import warnings
+from bisect import bisect_left, bisect_right
+from collections import deque
 
 warnings.filterwarnings('ignore')
 
-try:
-    import yfinance as yf
-    import pandas as pd
-except ImportError:
-    print("缺少相依套件。請執行：pip install yfinance pandas")
-    sys.exit(1)
+from benchmark_store import TW_BENCHMARKS, reference as benchmark_reference, records as benchmark_records, update_benchmarks
+from corporate_actions import add_event, add_provider_events, detect_rebase, prune_events, reference_factor
+from fmp_client import FMPClient
+from indicators import INDICATOR_PATHS, update_indicators
+from price_providers import ProviderRouter, build_router
+from price_store import Series, index_entry
+from slope_matrix import MATRIX_PATH
 
 DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+YF_WORKERS = int(os.environ.get("YF_WORKERS", "4"))                     # 每批 yf.download 的執行緒數
+YF_TICKERS_PER_MINUTE = int(os.environ.get("YF_RPM", "2000"))           # yfinance 來源限速（ticker/分鐘）
+BACKUP_DIR = os.path.join(DATA_DIR, "tw_cache_backups")
+LISTING_PATH = os.path.join(DATA_DIR, "tw_listing.json")
+SECTOR_MAP_PATH = os.path.join(DATA_DIR, "tw_sector_map.json")
+LISTING_TTL_HOURS = float(os.environ.get("TW_LISTING_TTL_HOURS", "12"))  # 清單快取有效時間
+OVERLAP_DAYS = 7  # 過期股重讀的既有天數，用來偵測除權息調整
+PRICE_BASIS = "raw"  # cache 存原始收盤，除權息因子另記於 adjustments
+BACKUP_KEEP = 5
+
+fmp = FMPClient(timeout=20)
 
 # ─────────────────────────────────────────────────────────
-# TAIEX — FMP ^TWII（共用 FMP API key）
+# TAIEX — ^TWII，經 provider router（FMP 優先，失敗時改用 yfinance）
+#         增量存於 data/benchmarks.json（benchmark_store.py）
 # ─────────────────────────────────────────────────────────
-FMP_KEY = os.environ.get("FMP_API_KEY", "3c03eZvjdPpKONYydbgoAT9chCaQDnsp")
-
-def fetch_taiex_fmp(from_date: str = "2024-01-01") -> list[dict]:
-    """TAIEX 收盤指數，來自 FMP ^TWII"""
-    url = f"https://financialmodelingprep.com/stable/historical-price-eod/full?symbol=^TWII&from={from_date}&apikey={FMP_KEY}"
-    try:
-        r = requests.get(url, timeout=20)
-        data = r.json()
-        if isinstance(data, list) and data:
-            frames = sorted(
-                [{"date": d["date"], "close": d["close"]} for d in data if "date" in d and "close" in d],
-                key=lambda x: x["date"]
-            )
-            print(f"  TAIEX (FMP ^TWII): {len(frames)} 個交易日，最新={frames[-1]['date']}")
-            return frames
-    except Exception as e:
-        print(f"  TAIEX FMP 失敗: {e}")
-    return []
-
-
-def fetch_taiex(months: list[str]) -> list[dict]:
-    """Legacy TWSE fallback — now calls FMP instead."""
-    return fetch_taiex_fmp()
+def fetch_taiex(router: ProviderRouter) -> tuple[list[dict], dict]:
+    """TAIEX 收盤指數 ^TWII：只抓 benchmark store 最後一天之後（含重疊）的 bar"""
+    store = update_benchmarks(router, TW_BENCHMARKS, "TW")
+    taiex = benchmark_records(store, "^TWII")
+    if taiex:
+        print(f"  TAIEX (^TWII): {len(taiex)} 個交易日，最新={taiex[-1]['date']}（{router.summary()}）")
+    else:
+        print("  TAIEX 失敗：benchmark store 沒有 ^TWII")
+    return taiex, store
 
 
 # ─────────────────────────────────────────────────────────
 # 台股清單 — TWSE + TPEx
 # ─────────────────────────────────────────────────────────
-def fetch_stock_list() -> list[dict]:
-    stocks = []
+LISTING_SOURCES = {
+    "twse": {
+        "url": "https://openapi.twse.com.tw/v1/exchangeReport/STOCK_DAY_ALL",
+        "code": "Code", "name": "Name", "close": "ClosingPrice", "change": "Change",
+        "suffix": ".TW", "exchange": "TWSE", "label": "TWSE 上市", "verify": True,
+    },
+    "tpex": {
+        "url": "https://www.tpex.org.tw/openapi/v1/tpex_mainboard_quotes",
+        "code": "SecuritiesCompanyCode", "name": "CompanyName", "close": "Close", "change": "Change",
+        "suffix": ".TWO", "exchange": "TPEx", "label": "TPEx 上櫃", "verify": False,
+    },
+}
+
+
+def roc_to_iso(value: str) -> str | None:
+    """民國日期（1151016 或 115/10/16）→ 2026-10-16"""
+    digits = (value or "").replace("/", "").strip()
+    if not digits.isdigit() or len(digits) < 6:
+        return None
+    return f"{int(digits[:-4]) + 1911:04d}-{digits[-4:-2]}-{digits[-2:]}"
+
+
+def parse_price(value) -> float | None:
+    """交易所數字欄位（"1,234.50"、"+0.35"）→ float；"--"、"除息" 等 → None"""
+    try:
+        return float(str(value).replace(",", "").strip())
+    except ValueError:
+        return None
+
+
+def parse_listing(source: dict, rows: list) -> tuple[list[dict], dict[str, dict]]:
+    """
+    STOCK_DAY_ALL / tpex_mainboard_quotes → (股票清單, {symbol: 當日收盤 bar})。
+    bar 附上平盤參考價 ref = 收盤 − 漲跌（除權息日即除權息參考價）。
+    """
+    stocks, quotes = [], {}
+    for item in rows:
+        code = item.get(source["code"], "")
+        if not (code.isdigit() and len(code) == 4):
+            continue
+        symbol = f"{code}{source['suffix']}"
+        stocks.append({
+            "symbol": symbol,
+            "name": item.get(source["name"], code),
+            "sector": "",
+            "exchange": source["exchange"],
+        })
+        day = roc_to_iso(item.get("Date", ""))
+        close = parse_price(item.get(source["close"], ""))
+        if not day or not close or close <= 0:
+            continue  # 當日無成交（"--" / 空白）
+        quotes[symbol] = {"date": day, "close": close}
+        change = parse_price(item.get(source["change"], ""))
+        if change is not None:
+            quotes[symbol]["ref"] = round(close - change, 4)
+    return stocks, quotes
+
+
+def fetch_listing_source(source: dict, cached: dict | None) -> dict | None:
+    """
+    條件式請求（If-None-Match / If-Modified-Since）。304 → 沿用快取；
+    失敗 → None（呼叫端決定是否退回快取）。
+    """
+    headers = {}
+    validators = (cached or {}).get("validators", {})
+    if validators.get("etag"):
+        headers["If-None-Match"] = validators["etag"]
+    if validators.get("last_modified"):
+        headers["If-Modified-Since"] = validators["last_modified"]
+    r = requests.get(source["url"], headers=headers, timeout=20, verify=source["verify"])
+    if r.status_code == 304 and cached:
+        print(f"  {source['label']}: 未變更（304），沿用快取")
+        return cached
+    r.raise_for_status()
+    stocks, quotes = parse_listing(source, r.json())
+    fresh = {"etag": r.headers.get("ETag"), "last_modified": r.headers.get("Last-Modified")}
+    return {
+        "validators": {k: v for k, v in fresh.items() if v},
+        "stocks": stocks,
+        "quotes": quotes,
+    }
+
 
-    # TWSE 上市
+def load_sector_map() -> dict[str, str]:
     try:
-        r = requests.get(
-            "https://openapi.twse.com.tw/v1/exchangeReport/STOCK_DAY_ALL", timeout=20
-        )
-        for item in r.json():
-            code = item.get("Code", "")
-            if code.isdigit() and len(code) == 4:
-                stocks.append({
-                    "symbol": f"{code}.TW",
-                    "name": item.get("Name", code),
-                    "sector": "",
-                    "exchange": "TWSE",
-                })
-    except Exception as e:
-        print(f"  TWSE 清單失敗: {e}")
-
-    # TPEx 上櫃
+        with open(SECTOR_MAP_PATH, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def fetch_stock_list(refresh: bool = False) -> tuple[list[dict], dict[str, dict], bool]:
+    """
+    台股清單 + 當日收盤。清單存於 data/tw_listing.json：
+    TW_LISTING_TTL_HOURS 內直接沿用；過期則逐來源條件式重新驗證，
+    來源失敗時退回該來源的快取。產業別併入 data/tw_sector_map.json。
+    有來源失敗時不更新 fetched_at（下次執行重試），沒有快取的失敗來源也不存空清單。
+    回傳 (stocks, quotes, complete)；complete=False 表示有來源沒有清單。
+    """
+    from datetime import datetime
+
+    listing: dict = {}
     try:
-        r = requests.get(
-            "https://www.tpex.org.tw/openapi/v1/tpex_mainboard_quotes",
-            timeout=20, verify=False,
-        )
-        for item in r.json():
-            code = item.get("SecuritiesCompanyCode", "")
-            if code.isdigit() and len(code) == 4:
-                stocks.append({
-                    "symbol": f"{code}.TWO",
-                    "name": item.get("CompanyName", code),
-                    "sector": "",
-                    "exchange": "TPEx",
-                })
-    except Exception as e:
-        print(f"  TPEx 清單失敗: {e}")
-
-    print(f"  股票清單: {len(stocks)} 支 (TWSE+TPEx)")
-    return stocks
+        with open(LISTING_PATH, encoding="utf-8") as f:
+            listing = json.load(f)
+    except (OSError, ValueError):
+        pass
+
+    parts: dict = listing.get("sources", {})
+    age_h = None
+    if listing.get("fetched_at"):
+        age_h = (datetime.now() - datetime.fromisoformat(listing["fetched_at"])).total_seconds() / 3600
+    if refresh or age_h is None or age_h >= LISTING_TTL_HOURS or set(parts) != set(LISTING_SOURCES):
+        failed = []
+        for key, source in LISTING_SOURCES.items():
+            try:
+                part = fetch_listing_source(source, parts.get(key))
+            except Exception as e:
+                part = None
+                print(f"  {source['label']} 清單失敗: {e}")
+            if part is None:
+                failed.append(source["label"])
+                print(f"  {source['label']}: 退回快取清單" if key in parts else f"  {source['label']}: 沒有快取清單，本次清單不完整")
+                continue
+            parts[key] = part
+        # 有來源失敗就沿用舊的 fetched_at（或不寫），讓下次執行重新抓取
+        fetched_at = listing.get("fetched_at") if failed else datetime.now().isoformat()
+        listing = {"sources": parts}
+        if fetched_at:
+            listing["fetched_at"] = fetched_at
+        tmp = LISTING_PATH + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(listing, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp, LISTING_PATH)
+    else:
+        print(f"  沿用清單快取（{age_h:.1f} 小時前）")
+
+    sector_map = load_sector_map()
+    stocks, quotes = [], {}
+    for key in LISTING_SOURCES:
+        part = parts.get(key, {})
+        for s in part.get("stocks", []):
+            stocks.append({**s, "sector": sector_map.get(s["symbol"].split(".")[0], s.get("sector", ""))})
+        quotes.update(part.get("quotes", {}))
+
+    with_sector = sum(1 for s in stocks if s["sector"])
+    complete = all(key in parts for key in LISTING_SOURCES)
+    print(f"  股票清單: {len(stocks)} 支 (TWSE+TPEx)，產業別 {with_sector} 支，當日收盤 {len(quotes)} 支"
+          + ("" if complete else "（清單不完整）"))
+    return stocks, quotes, complete
+
+
+def apply_quotes(
+    prices: dict[str, Series],
+    index: dict[str, dict],
+    quotes: dict[str, dict],
+    trading_days: list[str],
+    start_date: str,
+    adjustments: dict[str, list],
+) -> list[str]:
+    """
+    用清單 payload 的當日收盤補最新一根 bar：只在該 bar 緊接現有最後一個交易日
+    （依 TAIEX 交易日曆）時才接上，否則留給 yfinance 補缺口。回傳補上的 symbol。
+    參考價與前一日收盤不同（除權息）時記一筆調整因子，不改寫既有 bar。
+    """
+    filled = []
+    for sym, q in quotes.items():
+        series = prices.get(sym)
+        if series is None or q["date"] <= index[sym]["last"]:
+            continue
+        last = index[sym]["last"]
+        i = bisect_right(trading_days, last)
+        next_day = trading_days[i] if i < len(trading_days) else None
+        if next_day != q["date"] and not (next_day is None and q["date"] > last):
+            continue
+        if "ref" in q:
+            prev_close = index[sym]["last_close"]
+            add_event(adjustments, sym, q["date"], reference_factor(prev_close, q["ref"]), prev_close)
+        index[sym] = append_tail(series, Series([q["date"]], [q["close"]]), 0, start_date)
+        prune_events(adjustments, sym, series.dates[0])
+        filled.append(sym)
+    return filled
+
+
+def append_tail(series: Series, new: Series, tail: int, start_date: str) -> dict:
+    """
+    原地接上 new[tail:]，並把開頭裁到 start_date（維持 400 天視窗）。
+    只搬動新 bar 與被裁掉的舊 bar，不複製整段歷史；回傳新的 index entry。
+    """
+    keep = bisect_left(series.dates, start_date)
+    if keep:
+        del series.dates[:keep], series.closes[:keep]
+    series.dates.extend(new.dates[tail:])
+    series.closes.extend(new.closes[tail:])
+    return index_entry(series.dates, series.closes)
+
+
+def merge_symbol(
+    sym: str,
+    old: Series | None,
+    entry: dict | None,
+    new: Series | None,
+    start_date: str,
+    adjustments: dict[str, list],
+) -> tuple[str, Series | None, dict | None]:
+    """
+    單支股票的 merge 保護，只看 index entry 與新資料的尾段：
+      updated  接上比 entry["last"] 新的 bar（或新股票）
+      kept     沒抓到 / 沒有更新的 bar，保留舊資料（防止意外倒退）
+      failed   新舊都沒有
+    重疊的 bar 只用來偵測 yfinance 的整段重算（分割，記成調整因子），不覆寫舊資料；
+    除息則來自 yfinance 回報的事件（Adj Close / Close 的跳動）。
+    回傳 (狀態, series, entry)
+    """
+    if not new:
+        return ("kept", old, entry) if old else ("failed", None, None)
+    if not old:
+        # 全量資料是原始收盤：調整因子表改為 yfinance 回報的除權息事件
+        adjustments.pop(sym, None)
+        add_provider_events(adjustments, sym, new)
+        return "updated", new, index_entry(new.dates, new.closes)  # yfinance 回傳已依日期排序
+    rebase = detect_rebase(old, adjustments.get(sym), new)
+    if rebase:
+        add_event(adjustments, sym, *rebase, old.closes[-1])
+    add_provider_events(adjustments, sym, new, after=entry["last"])
+    tail = bisect_right(new.dates, entry["last"])
+    if tail == len(new):
+        return "kept", old, entry
+    entry = append_tail(old, new, tail, start_date)
+    prune_events(adjustments, sym, old.dates[0])
+    return "updated", old, entry
 
 
 # ─────────────────────────────────────────────────────────
-# 批量下載價格 — yfinance
+# 批量下載價格 — provider router（預設 yfinance；批內多執行緒、失敗拆批重試）
 # ─────────────────────────────────────────────────────────
 def batch_download_prices(
+    router: ProviderRouter,
     tickers: list[str],
     start: str,
     end: str,
     batch_size: int = 100,
-) -> dict[str, list[dict]]:
-    all_prices: dict[str, list[dict]] = {}
+) -> dict[str, Series]:
+    """
+    批次依序下載：yf.download 會改寫 yfinance 的模組層級狀態，並行呼叫會互相覆蓋結果，
+    所以並行改由每批內的 YF_WORKERS 個執行緒負責；限速由各 provider 自己負責（YF_RPM）。
+    整批例外 → 拆成兩半重新排入，直到單一 ticker 才算失敗；
+    沒例外但缺資料的 ticker（常見於被限流）→ 合成一批重試一次，仍缺的列入回報。
+    """
+    all_prices: dict[str, Series] = {}
     total = len(tickers)
-
-    for i in range(0, total, batch_size):
-        batch = tickers[i : i + batch_size]
-        pct = (i + len(batch)) / total * 100
-        print(f"  下載 {i+1}-{i+len(batch)}/{total} ({pct:.0f}%)...", end="\r")
-
+    done = 0
+    timings: list[float] = []
+    failed_batches = 0
+    retried_missing = 0
+    failed: list[str] = []
+    missing_after_retry: list[str] = []
+
+    queue = deque((tickers[i : i + batch_size], False) for i in range(0, total, batch_size))
+    while queue:
+        batch, is_retry = queue.popleft()
+        t0 = time.perf_counter()
         try:
-            data = yf.download(batch, start=start, end=end, auto_adjust=True, progress=False)
-            if data.empty:
-                continue
-            if isinstance(data.columns, pd.MultiIndex):
-                close_df = data["Close"]
-            elif "Close" in data.columns:
-                close_df = data[["Close"]]
-                close_df.columns = batch[:1]
-            else:
-                continue
-
-            for ticker in batch:
-                if ticker in close_df.columns:
-                    series = close_df[ticker].dropna()
-                    if len(series) > 0:
-                        if hasattr(series.index, "tz") and series.index.tz is not None:
-                            series.index = series.index.tz_localize(None)
-                        records = [
-                            {"date": d.strftime("%Y-%m-%d"), "close": round(float(v), 2)}
-                            for d, v in zip(series.index, series.values)
-                        ]
-                        if records:
-                            all_prices[ticker] = records
+            prices = router.fetch(batch, start, end)
         except Exception as e:
-            pass  # skip failed batch silently
+            failed_batches += 1
+            if len(batch) > 1:
+                mid = len(batch) // 2
+                queue.append((batch[:mid], is_retry))
+                queue.append((batch[mid:], is_retry))
+            else:
+                failed.append(batch[0])
+                done += 1
+                print(f"\n  下載失敗 {batch[0]}: {e}")
+            continue
 
-        time.sleep(0.3)
+        timings.append(time.perf_counter() - t0)
+        all_prices.update(prices)
+        missing = [t for t in batch if t not in prices]
+        if missing and not is_retry:
+            retried_missing += len(missing)
+            queue.append((missing, True))
+            done += len(batch) - len(missing)
+        else:
+            missing_after_retry += missing
+            done += len(batch)
+        print(f"  下載 {done}/{total} ({done / total * 100:.0f}%)...", end="\r")
 
     print()
+    if timings:
+        print(f"  批次: {len(timings)} 個成功，平均 {sum(timings) / len(timings):.1f}s，最慢 {max(timings):.1f}s"
+              f" | 失敗批次: {failed_batches}（已拆批重試）| 缺資料重試: {retried_missing} 支"
+              f" | 最終失敗: {len(failed)} 支 | 重試後仍缺: {len(missing_after_retry)} 支（保留舊資料）")
+    if missing_after_retry:
+        print(f"  重試後仍缺資料: {missing_after_retry[:20]}{' …' if len(missing_after_retry) > 20 else ''}")
     return all_prices
 
 
+# ─────────────────────────────────────────────────────────
+# 增量規劃 — 新股票 / 過期 / 最新
+# ─────────────────────────────────────────────────────────
+def last_weekday(today) -> str:
+    """TAIEX 抓不到時的最新交易日估計：今天以前最近的平日"""
+    from datetime import timedelta
+
+    d = today - timedelta(days=1)
+    while d.weekday() >= 5:
+        d -= timedelta(days=1)
+    return d.strftime("%Y-%m-%d")
+
+
+def plan_fetches(
+    tickers: list[str],
+    index: dict[str, dict],
+    latest_trading_day: str,
+) -> tuple[list[str], dict[str, list[str]], list[str]]:
+    """
+    依各股最後日期規劃下載，只讀 index：
+      新股票（index 沒有）→ 全量
+      過期（last < 最新交易日）→ 從 last 前 OVERLAP_DAYS 天開始（重讀幾根既有 bar
+                                以偵測除權息調整），同一起始日的合併成一組
+      最新（last >= 最新交易日）→ 略過
+    回傳 (full, {from_date: [tickers]}, fresh)
+    """
+    from datetime import date, timedelta
+
+    full, fresh = [], []
+    stale: dict[str, list[str]] = {}
+    for sym in tickers:
+        entry = index.get(sym)
+        if not entry:
+            full.append(sym)
+        elif entry["last"] >= latest_trading_day:
+            fresh.append(sym)
+        else:
+            from_date = (date.fromisoformat(entry["last"]) - timedelta(days=OVERLAP_DAYS)).isoformat()
+            stale.setdefault(from_date, []).append(sym)
+    return full, stale, fresh
+
+
+# ─────────────────────────────────────────────────────────
+# 輸出 — 串流原子寫入 + content-addressed 備份
+# ─────────────────────────────────────────────────────────
+def cache_digest(index: dict[str, dict], taiex: list[dict], adjustments: dict | None = None) -> str:
+    """cache 內容摘要：由各股 index hash（與調整因子）組成，不必重讀整個檔案"""
+    h = hashlib.blake2b(digest_size=8)
+    for sym in sorted(index):
+        h.update(f"{sym}={index[sym]['hash']};".encode())
+    if taiex:
+        h.update(f"taiex={len(taiex)}:{taiex[-1]['date']}:{taiex[-1]['close']}".encode())
+    if adjustments:
+        h.update(json.dumps(adjustments, sort_keys=True).encode())
+    return h.hexdigest()
+
+
+def backup_cache(path: str, digest: str) -> str | None:
+    """
+    以內容摘要命名備份現有 cache（hard link，不複製資料；同內容只留一份），
+    只保留最近 BACKUP_KEEP 份。回傳備份路徑；沒有可備份的檔案則回傳 None。
+    """
+    if not os.path.exists(path):
+        return None
+    os.makedirs(BACKUP_DIR, exist_ok=True)
+    bak_path = os.path.join(BACKUP_DIR, f"tw_price_cache.{digest}.json")
+    if not os.path.exists(bak_path):
+        try:
+            os.link(path, bak_path)
+        except OSError:
+            shutil.copy2(path, bak_path)  # 不支援 hard link 的檔案系統
+    os.utime(bak_path)
+    backups = sorted(
+        (os.path.join(BACKUP_DIR, f) for f in os.listdir(BACKUP_DIR) if f.startswith("tw_price_cache.")),
+        key=os.path.getmtime,
+    )
+    for old_bak in backups[:-BACKUP_KEEP]:
+        os.remove(old_bak)
+    return bak_path
+
+
+def write_cache(path: str, head: dict, prices: dict[str, Series], tail: dict) -> int:
+    """
+    串流寫出 tw_price_cache.json：head 欄位 → prices（逐支股票寫入）→ tail 欄位，
+    寫到暫存檔、fsync 後 os.replace，讀取端永遠看到完整的舊檔或新檔。
+    不先組出整個 dict，也不逐筆 json 編碼。格式與舊版相同（緊湊分隔符）。
+    回傳寫入的位元組數。
+    """
+    def dumps(v) -> str:
+        return json.dumps(v, ensure_ascii=False, separators=(",", ":"))
+
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write("{")
+        for key, value in head.items():
+            f.write(f"{dumps(key)}:{dumps(value)},")
+        f.write('"prices":{')
+        for i, sym in enumerate(sorted(prices)):
+            s = prices[sym]
+            rows = ",".join(map('{{"date":"{}","close":{!r}}}'.format, s.dates, s.closes))
+            f.write(f'{"," if i else ""}{dumps(sym)}:[{rows}]')
+        f.write("}")
+        for key, value in tail.items():
+            f.write(f",{dumps(key)}:{dumps(value)}")
+        f.write("}")
+        f.flush()
+        os.fsync(f.fileno())
+        size = f.tell()
+    os.replace(tmp, path)
+    return size
+
+
 # ─────────────────────────────────────────────────────────
 # Main
 # ─────────────────────────────────────────────────────────
@@ -163,40 +497,38 @@ def main():
     print("=== 台股斜率快取更新 ===")
     os.makedirs(DATA_DIR, exist_ok=True)
 
-    import shutil
     import argparse
 
     parser = argparse.ArgumentParser()
     parser.add_argument('--force', action='store_true', help='強制全量更新，忽略現有 cache')
+    parser.add_argument('--daily', action='store_true',
+                        help='每日追加：只用 TWSE/TPEx 清單的當日收盤接上一根 bar，不呼叫 yfinance')
     args = parser.parse_args()
 
+    out_path = os.path.join(DATA_DIR, "tw_price_cache.json")
+    daily = args.daily and not args.force and os.path.exists(out_path)
+    if args.daily and not daily:
+        print("  沒有既有 cache（或指定 --force），改用一般模式回補")
+
     # 抓最近 400 天（約 250 個交易日）
     today = datetime.now()
     start_date = (today - timedelta(days=400)).strftime("%Y-%m-%d")
     end_date = (today + timedelta(days=1)).strftime("%Y-%m-%d")
 
-    # 產生需要的月份（TWSE API 按月抓）
-    months = []
-    d = today - timedelta(days=200)
-    while d <= today:
-        months.append(d.strftime("%Y%m01"))
-        # 往後推一個月（固定用1號避免月底日期溢出問題，如Jan31→Feb31）
-        if d.month == 12:
-            d = d.replace(year=d.year + 1, month=1, day=1)
-        else:
-            d = d.replace(month=d.month + 1, day=1)
-    months = list(dict.fromkeys(months))  # 去重
-    # 確保當月一定包含（月份跳躍邏輯可能跳過當月）
-    current_month = today.strftime("%Y%m01")
-    if current_month not in months:
-        months.append(current_month)
-    months.sort()
-
-    print(f"\n[1/3] 抓取 TAIEX ({len(months)} 個月)...")
-    taiex_data = fetch_taiex(months)
+    print("\n[1/3] 更新 TAIEX（benchmark store）...")
+    try:
+        index_router = build_router("fmp,yfinance", fmp, YF_TICKERS_PER_MINUTE, YF_WORKERS)
+        # daily 模式個股只來自清單 payload，yfinance 只用於回補與補缺口
+        stock_router = None if daily else build_router("yfinance", fmp, YF_TICKERS_PER_MINUTE, YF_WORKERS)
+    except ImportError:
+        print("缺少相依套件。請執行：pip install yfinance pandas")
+        sys.exit(1)
+    stock_names = ",".join(stock_router.names) if stock_router else "TWSE/TPEx 清單"
+    print(f"  Providers: TAIEX={','.join(index_router.names)} 個股={stock_names}")
+    taiex_data, bench_store = fetch_taiex(index_router)
 
     print("\n[2/3] 抓取台股清單...")
-    stocks = fetch_stock_list()
+    stocks, quotes, listing_complete = fetch_stock_list(refresh=daily)
 
     # 建立 metadata
     metadata: dict[str, dict] = {}
@@ -210,104 +542,191 @@ def main():
     tickers = [s["symbol"] for s in stocks]
 
     # 載入既有 cache（用於 merge 保護）
-    out_path = os.path.join(DATA_DIR, "tw_price_cache.json")
-    existing_prices: dict[str, list] = {}
+    existing_prices: dict[str, Series] = {}
+    old_index: dict[str, dict] = {}
+    old_meta: dict[str, dict] = {}
+    old_taiex: list[dict] = []
+    old_latest_bar_source = ""
+    old_basis = ""
+    adjustments: dict[str, list] = {}  # {symbol: [[除權息日, 因子], …]}，讀取時才套用
     if os.path.exists(out_path) and not args.force:
         try:
             with open(out_path, "r", encoding="utf-8") as f:
                 old = json.load(f)
-            existing_prices = old.get("prices", {})
-            old_latest = max(
-                (max(r["date"] for r in v) for v in existing_prices.values() if v),
-                default="N/A"
-            )
+            existing_prices = {
+                sym: Series([r["date"] for r in v], [r["close"] for r in v])
+                for sym, v in old.get("prices", {}).items() if v
+            }
+            # 舊版 cache 沒有 index（或缺部分）：只補建缺少的
+            old_index = old.get("index") or {}
+            for sym, v in existing_prices.items():
+                if sym not in old_index:
+                    old_index[sym] = index_entry(v.dates, v.closes)
+            old_meta = old.get("metadata") or {}
+            old_taiex = old.get("taiex") or []
+            old_latest_bar_source = old.get("latest_bar_source") or old.get("data_source", "")
+            adjustments = old.get("adjustments") or {}
+            old_basis = old.get("price_basis", "")
+            del old  # 之後只用 Series / index，不保留整份 JSON
+            old_latest = max((e["last"] for e in old_index.values()), default="N/A")
             print(f"  既有 cache 最新個股日期: {old_latest}")
-            # Backup before overwrite
-            bak_path = out_path + ".bak"
-            shutil.copy2(out_path, bak_path)
-            print(f"  備份至 {bak_path}")
         except Exception as e:
             print(f"  載入既有 cache 失敗，全量更新: {e}")
             existing_prices = {}
-
-    print(f"\n[3/3] 批量下載價格 ({len(tickers)} 支，約需 5-8 分鐘)...")
-    print(f"  [temporary source: yfinance]")
-    new_prices = batch_download_prices(tickers, start_date, end_date)
-    print(f"  成功下載: {len(new_prices)}/{len(tickers)} 支")
-
-    # Merge 保護：若 yfinance 回傳日期 < 現有，保留現有
-    merged_prices: dict[str, list] = {}
-    updated_count = 0
-    kept_old_count = 0
+    old_digest = cache_digest(old_index, old_taiex, adjustments) if existing_prices else ""
+
+    # 清單不完整（來源失敗且沒有快取）：保留 cache 裡已有的股票，不因清單缺漏而被移除
+    if not listing_complete:
+        listed = set(tickers)
+        kept_from_cache = [sym for sym in sorted(existing_prices) if sym not in listed]
+        tickers += kept_from_cache
+        print(f"  清單不完整，沿用 cache 既有股票 {len(kept_from_cache)} 支")
+
+    # 清單 payload 的當日收盤直接接上最新一根 bar，這些股票不必再個別下載
+    trading_days = [t["date"] for t in taiex_data]
+    quote_filled = apply_quotes(existing_prices, old_index, quotes, trading_days, start_date, adjustments)
+    if quote_filled:
+        print(f"  清單當日收盤補上最新 bar: {len(quote_filled)} 支")
+
+    # 增量規劃：依各股 index 的最後日期分為 新股票 / 過期 / 最新
+    latest_trading_day = max(
+        taiex_data[-1]["date"] if taiex_data else last_weekday(today),
+        max((q["date"] for q in quotes.values()), default=""),
+    )
+    # 舊版 cache 存的是 yfinance 的還原收盤：一般模式全部重抓一次原始收盤，
+    # 抓不到的股票保留舊資料
+    rebasing = bool(existing_prices) and old_basis != PRICE_BASIS and not daily
+    if rebasing:
+        print(f"  cache 價格基準為「{old_basis or '還原收盤'}」，全量重抓原始收盤")
+    full_list, stale_groups, fresh_list = plan_fetches(
+        tickers, old_index if existing_prices and not rebasing else {}, latest_trading_day,
+    )
+    stale_count = sum(len(g) for g in stale_groups.values())
+    print(f"\n  最新交易日: {latest_trading_day}")
+    print(f"  新股票（全量 400 天）: {len(full_list)} 支")
+    print(f"  過期（只補尾段）: {stale_count} 支，{len(stale_groups)} 組起始日")
+    print(f"  已是最新（略過）: {len(fresh_list)} 支")
+
+    new_prices: dict[str, Series] = {}
+    deferred: list[str] = []
+    if daily:
+        # 不下載：新股票與有缺口的股票留給下次一般模式回補
+        deferred = full_list + [sym for group in stale_groups.values() for sym in group]
+        print(f"\n[3/3] daily 模式：不呼叫 yfinance，待回補 {len(deferred)} 支")
+        if deferred:
+            print(f"  待回補範例: {deferred[:10]}（執行一般模式補缺口）")
+    else:
+        print(f"\n[3/3] 批量下載價格 ({len(full_list) + stale_count} 支)...")
+        print(f"  [temporary source: yfinance]")
+        if full_list:
+            new_prices.update(batch_download_prices(stock_router, full_list, start_date, end_date))
+        for from_date, group in sorted(stale_groups.items()):
+            new_prices.update(batch_download_prices(stock_router, group, from_date, end_date))
+        print(f"  成功下載: {len(new_prices)}/{len(full_list) + stale_count} 支（{stock_router.summary()}）")
+
+    # Merge 保護：一次走完所有股票，同時完成分類、index 與統計
+    merged_prices: dict[str, Series] = {}
+    merged_index: dict[str, dict] = {}
+    fresh_set = set(fresh_list)
+    deferred_set = set(deferred)
+    counts = {"updated": 0, "kept": 0}
     failed_symbols = []
     skipped_symbols = []
-
-    all_tickers = set(tickers)
-    fetched_tickers = set(new_prices.keys())
-    missing_tickers = all_tickers - fetched_tickers
+    latest_stock_date = ""
 
     for sym in tickers:
-        new_data = new_prices.get(sym, [])
-        old_data = existing_prices.get(sym, [])
+        old_data = existing_prices.get(sym)
+        if sym in fresh_set or sym in deferred_set:
+            # 已是最新，或 daily 模式的缺口：原樣保留，不算失敗
+            status, series, entry = "fresh", old_data, old_index.get(sym)
+        else:
+            new = new_prices.get(sym)
+            if rebasing and new:
+                old_data = None  # 全量原始收盤整段取代舊基準的資料
+            status, series, entry = merge_symbol(
+                sym, old_data, old_index.get(sym), new, start_date, adjustments,
+            )
 
-        if not new_data and not old_data:
+        if status == "failed":
             failed_symbols.append(sym)
             continue
-
-        if not new_data:
-            # yfinance 沒抓到，保留舊資料
-            merged_prices[sym] = old_data
-            skipped_symbols.append(sym)
-            kept_old_count += 1
-            continue
-
-        new_latest = max(r["date"] for r in new_data)
-        old_latest = max(r["date"] for r in old_data) if old_data else "0000-00-00"
-
-        if new_latest >= old_latest:
-            merged_prices[sym] = new_data
-            updated_count += 1
-        else:
-            # 新資料比舊資料舊，保留舊資料（防止意外倒退）
-            merged_prices[sym] = old_data
-            kept_old_count += 1
+        if status == "kept":
             skipped_symbols.append(sym)
+        if status in counts:
+            counts[status] += 1
+        if series is not None:
+            merged_prices[sym] = series
+            merged_index[sym] = entry
+            if entry["last"] > latest_stock_date:
+                latest_stock_date = entry["last"]
 
     # 合併新 metadata（保留既有）
-    if existing_prices:
-        old_meta = old.get("metadata", {}) if 'old' in dir() else {}
-        for sym, meta in old_meta.items():
-            if sym not in metadata:
-                metadata[sym] = meta
+    for sym, meta in old_meta.items():
+        if sym not in metadata:
+            metadata[sym] = meta
 
-    # 組合輸出
-    cache = {
+    # 輸出：先以內容摘要備份既有 cache，再串流寫入暫存檔並原子替換
+    if existing_prices:
+        bak_path = backup_cache(out_path, old_digest)
+        print(f"  備份至 {bak_path}")
+
+    # 歷史 bar 來自 yfinance；最新 bar 記錄本次實際接上的來源（清單收盤 / yfinance），
+    # 本次沒有新 bar 則沿用上次的記錄
+    bar_sources = [name for name, used in (("TWSE/TPEx daily quotes", quote_filled),
+                                           ("yfinance [temporary]", new_prices)) if used]
+    t0 = time.perf_counter()
+    head = {
+        # updated_at 必須是第一個欄位：路由只讀檔頭就能比對衍生檔的來源版本
         "updated_at": datetime.now().isoformat(),
         "data_source": "yfinance [temporary]",
+        "latest_bar_source": " + ".join(bar_sources) or old_latest_bar_source or "yfinance [temporary]",
+        "price_basis": old_basis if daily and existing_prices else PRICE_BASIS,
         "taiex": taiex_data,
+        "benchmarks": benchmark_reference(bench_store, TW_BENCHMARKS),
         "symbols": sorted(merged_prices.keys()),
-        "prices": merged_prices,
-        "metadata": metadata,
     }
-
-    with open(out_path, "w", encoding="utf-8") as f:
-        json.dump(cache, f, ensure_ascii=False)
-
-    size_mb = os.path.getsize(out_path) / 1024 / 1024
-
-    # 回報最新個股日期
-    if merged_prices:
-        latest_stock_date = max(
-            (max(r["date"] for r in v) for v in merged_prices.values() if v),
-            default="N/A"
-        )
+    adjustments = {sym: adjustments[sym] for sym in sorted(adjustments) if sym in merged_prices}
+    size = write_cache(out_path, head, merged_prices, {
+        "index": merged_index,
+        "metadata": metadata,
+        "adjustments": adjustments,
+    })
+    size_mb = size / 1024 / 1024
+    write_secs = time.perf_counter() - t0
+
+    # 指標表：新 bar 逐根推進狀態（O(1)），調整因子或重讀 bar 有變動才重建
+    ind = update_indicators("TW", merged_prices, adjustments, head["updated_at"])
+    # 回檔區段掃描：全市場向量化，結果分桶寫出供 /api/tw-pullback-scanner 讀取
+    try:
+        from tw_pullback_scan import PULLBACK_PATH, run_pullback_scan
+    except ImportError:
+        pullback_msg = "略過（未安裝 numpy）"
+    else:
+        pullback = run_pullback_scan(merged_prices, adjustments, metadata, head["updated_at"])
+        pullback_msg = (f"{pullback['totalScanned']} 支，15–40% 區間 "
+                        f"{sum(len(v) for v in pullback['buckets'].values())} 支 → {PULLBACK_PATH}")
+    # 供應鏈 join：美股爆賺股 × 台股供應商斜率（需要美股 slope matrix）
+    try:
+        from supply_chain_join import JOIN_PATH, run_join, tw_info
+    except ImportError:
+        join_msg = "略過（未安裝 numpy）"
     else:
-        latest_stock_date = "N/A"
+        if os.path.exists(MATRIX_PATH):
+            info = tw_info(metadata, taiex_data, head["data_source"], head["latest_bar_source"])
+            join = run_join(merged_prices, adjustments, head["updated_at"], info)
+            join_msg = f"{join['edges']} 條供應關係 × {join['pairs']} 組日期 → {JOIN_PATH}"
+        else:
+            join_msg = "略過（沒有美股 slope_matrix.bin）"
 
-    print(f"\n✅ 儲存完成：{out_path} ({size_mb:.1f} MB)")
+    print(f"\n✅ 儲存完成：{out_path} ({size_mb:.1f} MB，寫入 {write_secs:.2f}s)")
     print(f"   TAIEX: {len(taiex_data)} 交易日，最新={taiex_data[-1]['date'] if taiex_data else 'N/A'}")
-    print(f"   台股個股最新日期: {latest_stock_date}")
-    print(f"   更新: {updated_count} 支 | 保留舊資料: {kept_old_count} 支 | 失敗: {len(failed_symbols)} 支")
+    print(f"   台股個股最新日期: {latest_stock_date or 'N/A'}（歷史: {head['data_source']}，最新 bar: {head['latest_bar_source']}）")
+    print(f"   指標表: 追加 {ind['appended']} 支（{ind['bars']} 根 bar），重建 {ind['rebuilt']} 支，"
+          f"未變動 {ind['unchanged']} 支，移除 {ind['dropped']} 支 → {INDICATOR_PATHS['TW']}")
+    print(f"   回檔掃描: {pullback_msg}")
+    print(f"   供應鏈 join: {join_msg}")
+    print(f"   除權息調整因子: {len(adjustments)} 支，{sum(len(v) for v in adjustments.values())} 筆（讀取時套用）")
+    print(f"   更新: {counts['updated']} 支 | 清單收盤補上: {len(quote_filled)} 支 | 待回補: {len(deferred)} 支 | 已是最新: {len(fresh_list)} 支 | 保留舊資料: {counts['kept']} 支 | 失敗: {len(failed_symbols)} 支")
     if failed_symbols:
         print(f"   Failed ({len(failed_symbols)}): {failed_symbols[:20]}{'...' if len(failed_symbols)>20 else ''}")
     if skipped_symbols[:5]: